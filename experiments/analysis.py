@@ -2,6 +2,7 @@
 import pathlib
 import asyncio
 import argparse
+import contextlib
 import json
 import os
 import traceback
@@ -11,11 +12,11 @@ from pprint import pprint
 from tqdm.asyncio import tarange
 from asyncstdlib import zip as azip
 
-from introspect.client import clients
+from introspect.client import clients, BalancedClient, AdaptiveConcurrency, TokenBudget, PromptValidator
 from introspect.dataset import datasets
 from introspect.model import models
 from introspect.tasks import tasks
-from introspect.util import AsyncMap, generate_experiment_id, default_model_id, default_model_type, default_system_message
+from introspect.util import AsyncMap, generate_experiment_id, default_model_id, default_model_type, default_system_message, parse_shard, MetricsExporter
 from introspect.database import result_databases, GenerationCache
 from introspect.types import TaskCategories, DatasetSplits, SystemMessage, GenerateError
 
@@ -27,9 +28,15 @@ parser.add_argument('--persistent-dir',
                     help='Directory where all persistent data will be stored')
 parser.add_argument('--endpoint',
                     action='store',
-                    default='http://127.0.0.1:20002',
+                    nargs='+',
+                    default=['http://127.0.0.1:20002'],
                     type=str,
-                    help='The TGI endpoint for this model')
+                    help='The TGI endpoint for this model. If multiple endpoints are provided, requests are balanced between them')
+parser.add_argument('--supervisor-state',
+                    action='store',
+                    default=os.environ.get('SUPERVISOR_STATE_FILE'),
+                    type=pathlib.Path,
+                    help='State file of the server supervisor, requests are paused while the server restarts. Only used with a single endpoint')
 parser.add_argument('--client',
                     action='store',
                     default='Offline' if 'RUN_OFFLINE' in os.environ else 'TGI',
@@ -82,16 +89,89 @@ parser.add_argument('--task-config',
                     default=[],
                     type=str,
                     help='List of configuration options for selected task')
+parser.add_argument('--variant',
+                    action='append',
+                    nargs='+',
+                    default=None,
+                    type=str,
+                    metavar='TASK [TASK_CONFIG ...]',
+                    help='Run a task with a task config, can be repeated to run several variants in one pass over '
+                         'the dataset with a shared client. Each variant is saved as its own experiment. Overrides --task and --task-config')
 parser.add_argument('--seed',
                     action='store',
                     default=0,
                     type=int,
                     help='Seed used for generation')
+parser.add_argument('--shard',
+                    action='store',
+                    default=None,
+                    type=parse_shard,
+                    help='Only process a shard of the split, formatted as "index/count" with a zero-based index')
 parser.add_argument('--max-workers',
                     action='store',
                     default=50,
                     type=int,
                     help='Max number of parallel async tasks')
+parser.add_argument('--adaptive-concurrency',
+                    action=argparse.BooleanOptionalAction,
+                    default=False,
+                    type=bool,
+                    help='Adapt the number of in-flight requests to the server load, between --min-workers and --max-workers')
+parser.add_argument('--min-workers',
+                    action='store',
+                    default=1,
+                    type=int,
+                    help='Min number of in-flight requests, when using --adaptive-concurrency')
+parser.add_argument('--stream',
+                    action=argparse.BooleanOptionalAction,
+                    default=False,
+                    type=bool,
+                    help='Stream generations, such that yes/no answers can be stopped once they are definitive')
+parser.add_argument('--validate-prompts',
+                    action=argparse.BooleanOptionalAction,
+                    default=False,
+                    type=bool,
+                    help='Check the prompt length with a local tokenizer, before sending the prompt. Requires transformers')
+parser.add_argument('--truncate-prompts',
+                    action=argparse.BooleanOptionalAction,
+                    default=False,
+                    type=bool,
+                    help='Truncate over-length prompts instead of rejecting them, when using --validate-prompts')
+parser.add_argument('--token-budget',
+                    action=argparse.BooleanOptionalAction,
+                    default=False,
+                    type=bool,
+                    help='Limit the estimated number of in-flight tokens, admitting the cheapest requests first')
+parser.add_argument('--max-batch-tokens',
+                    action='store',
+                    default=None,
+                    type=int,
+                    help='The token budget, when using --token-budget. Defaults to max_batch_total_tokens from the server')
+parser.add_argument('--memory-cache-entries',
+                    action='store',
+                    default=None,
+                    type=int,
+                    help='Max number of generations to keep in an in-memory cache, in front of the database cache')
+parser.add_argument('--memory-cache-mb',
+                    action='store',
+                    default=None,
+                    type=int,
+                    help='Max size in MB of the in-memory cache, in front of the database cache')
+parser.add_argument('--metrics-port',
+                    action='store',
+                    default=None,
+                    type=int,
+                    help='Serve progress metrics in the Prometheus format on this port, at /metrics')
+parser.add_argument('--metrics-textfile',
+                    action='store',
+                    default=None,
+                    type=pathlib.Path,
+                    help='Periodically write progress metrics in the Prometheus format to this file')
+parser.add_argument('--metrics-interval',
+                    action='store',
+                    default=15,
+                    type=float,
+                    help='How often the --metrics-textfile is written, in seconds')
 parser.add_argument('--debug',
                     action=argparse.BooleanOptionalAction,
                     default=False,
@@ -102,6 +182,11 @@ parser.add_argument('--clean-cache',
                     default=False,
                     type=bool,
                     help='Remove cache')
+parser.add_argument('--resume',
+                    action=argparse.BooleanOptionalAction,
+                    default=False,
+                    type=bool,
+                    help='Keep the existing results and only process the missing observations')
 parser.add_argument('--dry',
                     action=argparse.BooleanOptionalAction,
                     default=False,
@@ -109,6 +194,33 @@ parser.add_argument('--dry',
                     help='Don\'t modify files')
 
 
+def parse_variants(args: argparse.Namespace) -> list[tuple[TaskCategories, list[str]]]:
+    if args.variant is None:
+        return [(args.task, args.task_config)]
+
+    variants = []
+    for task, *task_config in args.variant:
+        try:
+            variants.append((TaskCategories(task), task_config))
+        except ValueError:
+            parser.error(f'invalid task in --variant: {task}, choose from {", ".join(TaskCategories)}')
+    return variants
+
+def make_experiment_id(args: argparse.Namespace, task: TaskCategories, task_config: list[str], shard=None) -> str:
+    return generate_experiment_id(
+        'analysis',
+        model=args.model_name, system_message=args.system_message,
+        dataset=args.dataset, split=args.split,
+        task=task, task_config=task_config,
+        seed=args.seed, shard=shard)
+
+def args_to_json(args: argparse.Namespace) -> dict:
+    """The arguments that are saved with the results, paths are saved as strings"""
+    return {
+        name: str(value) if isinstance(value, pathlib.Path) else value
+        for name, value in vars(args).items() if name not in ('persistent_dir', 'variant')
+    }
+
 async def main():
     durations = {}
     setup_time_start = timer()
@@ -117,31 +229,39 @@ async def main():
     args.model_id = default_model_id(args)
     args.model_type = default_model_type(args)
     args.system_message = default_system_message(args)
-    experiment_id = generate_experiment_id(
-        'analysis',
-        model=args.model_name, system_message=args.system_message,
-        dataset=args.dataset, split=args.split,
-        task=args.task, task_config=args.task_config,
-        seed=args.seed)
+    variants = parse_variants(args)
+    experiment_ids = [
+        make_experiment_id(args, task, task_config, shard=args.shard)
+        for task, task_config in variants
+    ]
 
     # connect to inference server
     print('Answerable experiment:')
-    print(f' - Endpoint: {args.endpoint}')
+    print(f' - Endpoint: [{", ".join(args.endpoint)}]')
     print(f' - Client: {args.client}')
     print(f' - Maximum number of workers: {args.max_workers}')
+    print(f' - Adaptive concurrency: {args.adaptive_concurrency} (min workers: {args.min_workers})')
+    print(f' - Stream: {args.stream}')
+    print(f' - Validate prompts: {args.validate_prompts} (truncate: {args.truncate_prompts})')
+    print(f' - Token budget: {args.token_budget} (max batch tokens: {args.max_batch_tokens})')
     print('')
     print(f' - Model name: {args.model_name}')
     print(f' - Model type: {args.model_type}')
     print(f' - Model id: {args.model_id}')
     print(f' - System message: {args.system_message}')
-    print(f' - Task: {args.task}')
-    print(f' - Task config: [{", ".join(args.task_config)}]')
+    for task, task_config in variants:
+        print(f' - Task: {task}')
+        print(f' - Task config: [{", ".join(task_config)}]')
     print(f' - Dataset: {args.dataset}')
     print(f' - Split: {args.split}')
     print(f' - Seed: {args.seed}')
+    print(f' - Shard: {args.shard}')
     print('')
     print(f' - Debug: {args.debug}')
+    print(f' - Metrics: port {args.metrics_port}, textfile {args.metrics_textfile}')
     print(f' - Clean cache: {args.clean_cache}')
+    print(f' - Resume: {args.resume}')
+    print(f' - Memory cache: {args.memory_cache_entries} entries, {args.memory_cache_mb} MB')
     print('')
 
     # Create directories
@@ -149,34 +269,60 @@ async def main():
     os.makedirs(args.persistent_dir / 'results' / 'analysis', exist_ok=True)
 
     # setup database
-    database = result_databases[args.task](
-        (args.persistent_dir / 'results' / 'analysis' / experiment_id).with_suffix('.sqlite')
-    )
-    cache_deps = []
-    if args.task != TaskCategories.CLASSIFY:
-        cache_deps.append(
-            generate_experiment_id('analysis',
-                                model=args.model_name, system_message=args.system_message,
-                                dataset=args.dataset, split=args.split,
-                                task='classify', task_config=list(set(args.task_config) & set([
-                                    'm-removed', 'c-no-redacted', 'c-persona-human', 'c-persona-you'
-                                ])),
-                                seed=args.seed)
-        )
-    cache = GenerationCache(experiment_id, cache_dir=args.persistent_dir / 'database', deps=cache_deps)
+    databases = [
+        result_databases[task]((args.persistent_dir / 'results' / 'analysis' / experiment_id).with_suffix('.sqlite'))
+        for (task, _), experiment_id in zip(variants, experiment_ids)
+    ]
+    # All variants share one client, and therefore one cache. This is the cache of the
+    # first variant, which is bootstrapped from the caches of all variants. After the
+    # evaluation, it is copied to the caches of the other variants.
+    cache_deps = list(experiment_ids)
+    for task, task_config in variants:
+        if task != TaskCategories.CLASSIFY:
+            # the classify experiment may have been run either as a whole or with the same sharding
+            for shard in ([None] if args.shard is None else [None, args.shard]):
+                cache_deps.append(make_experiment_id(args, TaskCategories.CLASSIFY, list(set(task_config) & set([
+                    'm-removed', 'c-no-redacted', 'c-persona-human', 'c-persona-you'
+                ])), shard=shard))
+    cache = GenerationCache(experiment_ids[0], cache_dir=args.persistent_dir / 'database', deps=cache_deps,
+                            model_id=args.model_id,
+                            memory_max_entries=args.memory_cache_entries,
+                            memory_max_bytes=None if args.memory_cache_mb is None else args.memory_cache_mb * 1024 * 1024)
 
     # setup task
-    client = clients[args.client](args.endpoint, cache)
+    concurrency = None
+    if args.adaptive_concurrency:
+        concurrency = AdaptiveConcurrency(min_limit=args.min_workers, max_limit=args.max_workers)
+    token_budget = None
+    if args.token_budget:
+        token_budget = TokenBudget(max_tokens=args.max_batch_tokens)
+    validator = None
+    if args.validate_prompts:
+        validator = PromptValidator.from_pretrained(args.model_id, truncate=args.truncate_prompts)
+    if len(args.endpoint) == 1:
+        client = clients[args.client](args.endpoint[0], cache, max_connections=args.max_workers,
+                                      concurrency=concurrency, token_budget=token_budget, stream=args.stream,
+                                      validator=validator, supervisor_state=args.supervisor_state)
+    else:
+        client = BalancedClient([
+            clients[args.client](endpoint, max_connections=args.max_workers) for endpoint in args.endpoint
+        ], cache, max_connections=args.max_workers, concurrency=concurrency, token_budget=token_budget,
+           stream=args.stream, validator=validator)
     dataset = datasets[args.dataset](persistent_dir=args.persistent_dir, seed=args.seed)
     model = models[args.model_type](client, system_message=args.system_message, debug=args.debug, config={'seed': args.seed})
-    task = tasks[dataset.category, args.task](model, config=args.task_config)
+    all_tasks = [
+        tasks[dataset.category, task](model, config=task_config)
+        for task, task_config in variants
+    ]
     durations['setup'] = timer() - setup_time_start
 
     # cleanup old database
-    if not args.dry:
-        database.remove()
+    if not args.dry and not args.resume:
+        for database in databases:
+            database.remove()
     if args.clean_cache and not args.dry:
-        cache.remove()
+        for experiment_id in experiment_ids:
+            GenerationCache(experiment_id, cache_dir=args.persistent_dir / 'database').remove()
 
     # connect to inference server
     print('Waiting for connection ...')
@@ -185,9 +331,14 @@ async def main():
     pprint(await client.info())
 
     # Process observations
-    results = {}
-    async with cache, database as db:
-        async def worker(obs):
+    all_results = []
+    # the client is closed before the cache, as it may still be writing to the cache
+    async with cache, client, contextlib.AsyncExitStack() as stack:
+        dbs = [await stack.enter_async_context(database) for database in databases]
+
+        # The variants of an observation are processed concurrently. Identical prompts,
+        # such as the classification of the paragraph, are generated once by the client.
+        async def run_variant(task, db, obs):
             try:
                 answer = await task(obs)
             except GenerateError as error:
@@ -196,30 +347,69 @@ async def main():
                 await db.put(args.split, obs['idx'], answer)
             return answer
 
+        async def worker(obs):
+            return await asyncio.gather(*(
+                run_variant(task, db, obs) if obs['idx'] not in completed else asyncio.sleep(0)
+                for task, db, completed in zip(all_tasks, dbs, all_completed)
+            ))
+
+        # restore completed observations
+        aggregators = [task.make_aggregator() for task in all_tasks]
+        all_completed = [set() for _ in variants]
+        if args.resume:
+            for db, aggregator, completed in zip(dbs, aggregators, all_completed):
+                async for idx, answer in db.items(args.split):
+                    completed.add(idx)
+                    aggregator.add_answer(answer)
+            print(f'Resuming with {", ".join(str(len(completed)) for completed in all_completed)} completed observations')
+        fully_completed = set.intersection(*all_completed)
+
         # process train split
-        aggregator = task.make_aggregator()
-        async for _, answer in azip(
-            pbar := tarange(dataset.num_examples(args.split), desc=aggregator.progress_description),
-            AsyncMap(worker, dataset.split(args.split), max_tasks=args.max_workers)
-        ):
-            if isinstance(answer, GenerateError):
-                traceback.print_exception(answer)
+        # the client is shared by the variants, so its metrics are labeled by the first variant
+        exporter = MetricsExporter(client, dict(zip(experiment_ids, aggregators)), labels={'run': experiment_ids[0]},
+                                   port=args.metrics_port, textfile=args.metrics_textfile,
+                                   interval_sec=args.metrics_interval)
+        async with exporter:
+            async for _, answers in azip(
+                pbar := tarange(len(fully_completed), dataset.num_examples(args.split, shard=args.shard),
+                                desc=' | '.join(aggregator.progress_description for aggregator in aggregators)),
+                AsyncMap(worker, (
+                    obs for obs in dataset.split(args.split, shard=args.shard) if obs['idx'] not in fully_completed
+                ), max_tasks=args.max_workers)
+            ):
+                for answer, aggregator in zip(answers, aggregators):
+                    # variants that had already completed the observation
+                    if answer is None:
+                        continue
+                    if isinstance(answer, GenerateError):
+                        traceback.print_exception(answer)
 
-            aggregator.add_answer(answer)
-            pbar.set_description(aggregator.progress_description)
+                    aggregator.add_answer(answer)
+                pbar.set_description(' | '.join(aggregator.progress_description for aggregator in aggregators))
 
         # save accumulated results
-        results = aggregator.results
-        durations['eval'] = aggregator.total_duration
+        for aggregator in aggregators:
+            all_results.append((aggregator.results, aggregator.total_duration))
+        durations['client'] = client.metrics.snapshot()
 
     # save results
     if not args.dry:
-        with open((args.persistent_dir / 'results' / 'analysis' / experiment_id).with_suffix('.json'), 'w') as fp:
-            json.dump({
-                'args': { name: value for name, value in vars(args).items() if name != 'persistent_dir' },
-                'results': results,
-                'durations': durations
-            }, fp)
+        for experiment_id in experiment_ids[1:]:
+            async with GenerationCache(experiment_id, cache_dir=args.persistent_dir / 'database',
+                                       deps=[experiment_ids[0]], model_id=args.model_id):
+                pass
+
+        for (task, task_config), experiment_id, (results, eval_duration) in zip(variants, experiment_ids, all_results):
+            with open((args.persistent_dir / 'results' / 'analysis' / experiment_id).with_suffix('.json'), 'w') as fp:
+                json.dump({
+                    'args': {
+                        **args_to_json(args),
+                        'task': task,
+                        'task_config': task_config
+                    },
+                    'results': results,
+                    'durations': { **durations, 'eval': eval_duration }
+                }, fp)
 
 if __name__ == '__main__':
     asyncio.run(main())
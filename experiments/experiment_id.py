@@ -1,7 +1,7 @@
 
 import pathlib
 import argparse
-from introspect.util import generate_experiment_id, default_model_id, default_model_type, default_system_message
+from introspect.util import generate_experiment_id, parse_shard, default_model_id, default_model_type, default_system_message
 
 parser = argparse.ArgumentParser()
 parser.add_argument('scriptpath',
@@ -54,6 +54,11 @@ parser.add_argument('--seed',
                     default=None,
                     type=int,
                     help='Seed used for generation')
+parser.add_argument('--shard',
+                    action='store',
+                    default=None,
+                    type=parse_shard,
+                    help='Only process a shard of the dataset split, the format is "index/count"')
 
 def main():
     args, _ = parser.parse_known_args()
@@ -66,7 +71,7 @@ def main():
         model=args.model_name, system_message=args.system_message,
         dataset=args.dataset, split=args.split,
         task=args.task, task_config=args.task_config,
-        seed=args.seed)
+        seed=args.seed, shard=args.shard)
     print(experiment_id)
 
 if __name__ == '__main__':
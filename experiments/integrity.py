@@ -118,7 +118,7 @@ async def main():
     )
     cache = GenerationCache(
         generate_experiment_id('cache', args.model_name, args.system_message, args.dataset, args.seed),
-        persistent_dir=args.persistent_dir)
+        cache_dir=args.persistent_dir / 'database', model_id=args.model_id)
 
     # setup task
     client = OfflineClient(cache=cache)
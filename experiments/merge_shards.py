@@ -0,0 +1,152 @@
+import pathlib
+import asyncio
+import argparse
+import json
+import os
+
+from introspect.client import OfflineClient, ClientMetrics
+from introspect.dataset import datasets
+from introspect.model import models
+from introspect.tasks import tasks
+from introspect.util import generate_experiment_id, default_model_id, default_model_type, default_system_message
+from introspect.database import result_databases, GenerationCache
+from introspect.types import TaskCategories, DatasetSplits, SystemMessage
+
+parser = argparse.ArgumentParser(
+    description='Merge the results and caches of an analysis experiment that was run with --shard'
+)
+parser.add_argument('--persistent-dir',
+                    action='store',
+                    default=pathlib.Path(__file__).absolute().parent.parent,
+                    type=pathlib.Path,
+                    help='Directory where all persistent data will be stored')
+parser.add_argument('--model-name',
+                    action='store',
+                    default=None,
+                    type=str,
+                    help='Model name')
+parser.add_argument('--model-type',
+                    action='store',
+                    default=None,
+                    type=str,
+                    choices=models.keys(),
+                    help='Model type')
+parser.add_argument('--model-id',
+                    action='store',
+                    default=None,
+                    type=str,
+                    help='Model id')
+parser.add_argument('--system-message',
+                    action='store',
+                    default=None,
+                    type=SystemMessage,
+                    choices=list(SystemMessage),
+                    help='Use a system message')
+parser.add_argument('--dataset',
+                    action='store',
+                    default='IMDB',
+                    type=str,
+                    choices=datasets.keys(),
+                    help='The dataset to fine-tune on')
+parser.add_argument('--split',
+                    action='store',
+                    default=DatasetSplits.TRAIN,
+                    type=DatasetSplits,
+                    choices=list(DatasetSplits),
+                    help='The dataset split to evaluate on')
+parser.add_argument('--task',
+                    action='store',
+                    default=TaskCategories.ANSWERABLE,
+                    type=TaskCategories,
+                    choices=list(TaskCategories),
+                    help='Which task to run')
+parser.add_argument('--task-config',
+                    action='store',
+                    nargs='*',
+                    default=[],
+                    type=str,
+                    help='List of configuration options for selected task')
+parser.add_argument('--seed',
+                    action='store',
+                    default=0,
+                    type=int,
+                    help='Seed used for generation')
+parser.add_argument('--num-shards',
+                    action='store',
+                    required=True,
+                    type=int,
+                    help='The number of shards the experiment was split into')
+
+async def main():
+    args = parser.parse_args()
+    args.model_id = default_model_id(args)
+    args.model_type = default_model_type(args)
+    args.system_message = default_system_message(args)
+
+    def experiment_id_for(shard: tuple[int, int]|None) -> str:
+        return generate_experiment_id(
+            'analysis',
+            model=args.model_name, system_message=args.system_message,
+            dataset=args.dataset, split=args.split,
+            task=args.task, task_config=args.task_config,
+            seed=args.seed, shard=shard)
+
+    experiment_id = experiment_id_for(None)
+    shard_ids = [experiment_id_for((index, args.num_shards)) for index in range(args.num_shards)]
+    results_dir = args.persistent_dir / 'results' / 'analysis'
+
+    print('Merge shards:')
+    print(f' - Experiment: {experiment_id}')
+    print(f' - Number of shards: {args.num_shards}')
+    print('')
+
+    # Check that all shards have completed
+    missing = [shard_id for shard_id in shard_ids if not (results_dir / shard_id).with_suffix('.json').exists()]
+    if len(missing) > 0:
+        raise FileNotFoundError(f'The following shards have not completed: {", ".join(missing)}')
+
+    shard_outputs = []
+    for shard_id in shard_ids:
+        with open((results_dir / shard_id).with_suffix('.json'), 'r') as fp:
+            shard_outputs.append(json.load(fp))
+
+    # setup task, only used to aggregate the results
+    model = models[args.model_type](OfflineClient(''), system_message=args.system_message, config={'seed': args.seed})
+    task = tasks[datasets[args.dataset].category, args.task](model, config=args.task_config)
+    aggregator = task.make_aggregator()
+
+    # merge results database
+    database = result_databases[args.task]((results_dir / experiment_id).with_suffix('.sqlite'))
+    database.remove()
+    async with database as db:
+        for shard_id in shard_ids:
+            shard_database = result_databases[args.task]((results_dir / shard_id).with_suffix('.sqlite'))
+            async with shard_database as shard_db:
+                entries = []
+                async for idx, answer in shard_db.items(args.split):
+                    entries.append((idx, answer))
+                    aggregator.add_answer(answer)
+                await db.put_many(args.split, entries)
+            print(f'Merged {len(entries)} observations from {shard_id}')
+
+    # merge generation caches, the shard caches are bootstrapped as dependencies
+    os.makedirs(args.persistent_dir / 'database', exist_ok=True)
+    async with GenerationCache(experiment_id, cache_dir=args.persistent_dir / 'database',
+                               deps=shard_ids, model_id=args.model_id):
+        pass
+
+    # save results
+    with open((results_dir / experiment_id).with_suffix('.json'), 'w') as fp:
+        json.dump({
+            'args': { **shard_outputs[0]['args'], 'shard': None },
+            'results': aggregator.results,
+            'durations': {
+                'setup': max(output['durations']['setup'] for output in shard_outputs),
+                # the shards are comparable with an unsharded run, by summing the client metrics
+                'client': ClientMetrics.from_snapshots(output['durations']['client'] for output in shard_outputs).snapshot(),
+                'eval': aggregator.total_duration
+            }
+        }, fp)
+
+if __name__ == '__main__':
+    asyncio.run(main())
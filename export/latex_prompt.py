@@ -91,22 +91,17 @@ async def main():
         raise ValueError(f'cache "{experiment_id}" does not exist')
 
     # setup task
-    cache = GenerationCache(experiment_id, cache_dir=args.persistent_dir / 'database')
+    cache = GenerationCache(experiment_id, cache_dir=args.persistent_dir / 'database',
+                            model_id='meta-llama/Llama-2-70b-chat-hf')
     client = clients[args.client](args.endpoint, cache, record=True)
     dataset = datasets[args.dataset](persistent_dir=args.persistent_dir, seed=args.seed)
     model = Llama2Model(client, system_message=args.system_message, config={'seed': args.seed})
     task = tasks[dataset.category, args.task](model, config=args.task_config)
 
     message_pairs = []
-    obs: Observation|None = None
     evalulation: FaithfulResult|None = None
-    async with cache:
-        for scan_obs in dataset.split(args.split):
-            if scan_obs['idx'] == args.idx:
-                obs = scan_obs
-                break
-        if obs is None:
-            raise ValueError(f'Could not find observation with idx {args.idx}')
+    async with cache, client:
+        obs: Observation = dataset.get(args.split, args.idx)
         evalulation = await task(obs) # populates the test-client logs
         if evalulation is None:
             raise ValueError('Unreachable')
@@ -1,13 +1,18 @@
 
-__all__ = ['TGIClient', 'VLLMClient', 'OfflineClient', 'AbstractClient', 'clients']
+__all__ = ['TGIClient', 'VLLMClient', 'OfflineClient', 'BalancedClient', 'AbstractClient', 'AdaptiveConcurrency', 'TokenBudget', 'PromptValidator', 'PromptTooLongError', 'ClientMetrics', 'clients']
 
 from typing import Type
 
 from .tgi import TGIClient
 from .vllm import VLLMClient
 from .offline import OfflineClient
+from .balanced import BalancedClient
 from .test import TestClient
 from ._abstract_client import AbstractClient
+from ._concurrency import AdaptiveConcurrency
+from ._token_budget import TokenBudget
+from ._prompt_validator import PromptValidator, PromptTooLongError
+from ._metrics import ClientMetrics
 
 clients: dict[str, Type[AbstractClient]] = {
     'TGI': TGIClient,
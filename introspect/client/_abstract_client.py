@@ -1,21 +1,50 @@
 from abc import ABCMeta, abstractmethod
 import asyncio
+import json
+import pathlib
 import time
-from typing import TypedDict, Generic, TypeVar, Iterable
+from timeit import default_timer as timer
+from typing import TypedDict, Generic, TypeVar, Iterable, Self, Callable, AsyncIterator
+
+import aiohttp
 
 from ..types import GenerateConfig, GenerateResponse, GenerateError, OfflineError
 from ..database import GenerationCache
+from ._concurrency import AdaptiveConcurrency
+from ._token_budget import TokenBudget
+from ._prompt_validator import PromptValidator, PromptTooLongError
+from ._metrics import ClientMetrics
+from ._circuit_breaker import CircuitBreaker, backoff_delay
+from ..supervisor import read_supervisor_state
 
 InfoType = TypeVar('InfoType', bound=TypedDict)
+EarlyStop = Callable[[str], bool]
 
 class RetryRequest(Exception):
     pass
 
+def _remove_stop_sequence(text: str, stop: list[str]) -> str:
+    for stop_sequence in stop:
+        if text.endswith(stop_sequence):
+            return text.removesuffix(stop_sequence)
+    return text
+
+def _ends_with_partial_stop_sequence(text: str, stop: list[str]) -> bool:
+    return any(
+        text.endswith(stop_sequence[:length])
+        for stop_sequence in stop for length in range(1, len(stop_sequence))
+    )
+
 class AbstractClient(Generic[InfoType], metaclass=ABCMeta):
     _record: list[tuple[str, GenerateResponse]]
+    _session: aiohttp.ClientSession|None
+    _inflight: dict[tuple[str, str, EarlyStop|None], asyncio.Task[GenerateResponse]]
 
     def __init__(self, base_url: str, cache: GenerationCache|None = None,
-                 connect_timeout_sec: int=60*60, max_reconnects: int=5,
+                 connect_timeout_sec: int=60*60, max_reconnects: int=5, max_request_retries: int=5,
+                 max_connections: int=100, concurrency: AdaptiveConcurrency|None = None,
+                 token_budget: TokenBudget|None = None, stream: bool=False,
+                 validator: PromptValidator|None = None, supervisor_state: pathlib.Path|None = None,
                  record=False) -> None:
         """Create a client that can be used to run a generative inference
 
@@ -27,7 +56,23 @@ class AbstractClient(Generic[InfoType], metaclass=ABCMeta):
             base_url (str): The url to the endpoint. For example: "http://localhost:8080"
             cache (GenerationCache | None, optional): Cache where generation outputs are stored. Defaults to None.
             connect_timeout_sec (int, optional): How long to wait for the server to start. Defaults to 30*60.
-            max_reconnects (int, optional): The number of times the connection can be lost. Default to 3.
+            max_reconnects (int, optional): The number of times the connection can be lost. Default to 5.
+            max_request_retries (int, optional): The number of times a request is retried, when the
+                connection is lost. Default to 5.
+            max_connections (int, optional): The size of the keep-alive connection pool. This should
+                match the number of parallel workers. Defaults to 100.
+            concurrency (AdaptiveConcurrency | None, optional): Limits the number of in-flight requests
+                to the server, adapting the limit to the server load. Cached responses are not limited.
+                Defaults to None (no limit).
+            token_budget (TokenBudget | None, optional): Limits the estimated number of in-flight tokens.
+                If the budget has no max_tokens, it is set from the server when connecting. Defaults to None.
+            stream (bool, optional): Stream the generated tokens, such that generation can be stopped early
+                when `generate` is called with an `early_stop` predicate. Defaults to False.
+            validator (PromptValidator | None, optional): Checks the prompt length before a request is sent.
+                Limits that are not set, are set from the server when connecting. Defaults to None.
+            supervisor_state (pathlib.Path | None, optional): The state file of the supervisor running the
+                server, see `introspect.supervisor`. While the server is restarting, requests are paused
+                instead of being sent and retried. Defaults to None.
             record (bool, optional). Record inputs and outputs, this is only useful for testing or debugging. Default False.
         """
         self._base_url = base_url
@@ -35,7 +80,20 @@ class AbstractClient(Generic[InfoType], metaclass=ABCMeta):
         self._cache = cache
         self._is_connected = False
         self._on_connection = None
-        self._remaning_reconnects = max_reconnects
+        self._max_request_retries = max_request_retries
+        self._breaker = CircuitBreaker(self._probe, max_backoff_sec=60,
+                                       max_opens=max_reconnects, timeout_sec=connect_timeout_sec)
+        self._max_connections = max_connections
+        self._concurrency = concurrency
+        self._token_budget = token_budget
+        self._stream = stream
+        self._validator = validator
+        self._supervisor_state = supervisor_state
+        self._supervisor_checked_at = None
+        self._supervisor_status = None
+        self.metrics = ClientMetrics()
+        self._session = None
+        self._inflight = {}
 
         self._record_enabled = record
         self._record = []
@@ -85,15 +143,19 @@ class AbstractClient(Generic[InfoType], metaclass=ABCMeta):
 
         return (response for prompt, response in self._record)
 
-    async def _get_cache(self, prompt) -> None|GenerateResponse|GenerateError:
+    async def _get_cache(self, prompt: str, config: GenerateConfig) -> None|GenerateResponse|GenerateError:
         if self._cache is None:
             return None
-        return await self._cache.get(prompt)
 
-    async def _put_cache(self, prompt, answer: GenerateResponse|GenerateError) -> None:
+        lookup_start_time = timer()
+        answer = await self._cache.get(prompt, config)
+        self.metrics.cache_lookup.observe(timer() - lookup_start_time)
+        return answer
+
+    async def _put_cache(self, prompt: str, config: GenerateConfig, answer: GenerateResponse|GenerateError) -> None:
         if self._cache is None:
             return
-        await self._cache.put(prompt, answer)
+        await self._cache.put(prompt, config, answer)
 
     @abstractmethod
     async def _try_connect(self) -> bool:
@@ -107,30 +169,150 @@ class AbstractClient(Generic[InfoType], metaclass=ABCMeta):
     async def _generate(self, prompt: str, config: GenerateConfig) -> GenerateResponse:
         ...
 
-    async def _await_connection(self, presleep=0):
+    async def _generate_stream(self, prompt: str, config: GenerateConfig) -> AsyncIterator[str]:
+        """Generate the response as a stream of text chunks
+
+        Clients that do not support streaming return the entire response as one chunk.
+        """
+        answer = await self._generate(prompt, config)
+        yield answer['response']
+
+    def _can_stream(self) -> bool:
+        """True if the client implements `_generate_stream`, instead of generating the response as one chunk"""
+        return type(self)._generate_stream is not AbstractClient._generate_stream
+
+    async def _max_batch_tokens(self) -> int|None:
+        """The number of tokens the server can process in parallel, if known"""
+        return None
+
+    async def _input_limits(self) -> tuple[int|None, int|None]:
+        """The maximum number of prompt tokens and total tokens the server accepts, if known"""
+        return (None, None)
+
+    def estimate_tokens(self, prompt: str, config: GenerateConfig) -> int:
+        """Estimate the number of prompt and generated tokens of a request
+
+        If a validator is used, the prompt tokens are counted with its tokenizer.
+        Otherwise, the prompt is assumed to use four characters per token.
+
+        Args:
+            prompt (str): The prompt to generate from.
+            config (GenerateConfig): The configuration, including default values.
+
+        Returns:
+            int: The estimated number of tokens.
+        """
+        return self._count_tokens(prompt) + config.get('max_new_tokens', 0)
+
+    def _count_tokens(self, text: str) -> int:
+        if self._validator is not None:
+            return self._validator.count_tokens(text)
+        return len(text) // 4
+
+    def _server_status(self) -> str|None:
+        """The state published by the supervisor, if a supervisor is used
+
+        The state file is read at most once per second.
+        """
+        if self._supervisor_state is None:
+            return None
+
+        now = timer()
+        if self._supervisor_checked_at is None or now - self._supervisor_checked_at >= 1:
+            state = read_supervisor_state(self._supervisor_state)
+            self._supervisor_status = None if state is None else state['state']
+            self._supervisor_checked_at = now
+        return self._supervisor_status
+
+    async def _probe(self) -> bool:
+        """Check if the server has recovered, used by the circuit breaker"""
+        if self._server_status() not in (None, 'ready'):
+            return False
+        return await self._try_connect()
+
+    def _pause_if_restarting(self) -> None:
+        """Open the circuit, if the supervisor reports that the server is not ready
+
+        Raises:
+            IOError: if the supervisor has stopped the server.
+        """
+        match self._server_status():
+            case 'stopped' | 'failed':
+                raise IOError(f'The supervisor of {self._base_url} has stopped the server')
+            case 'starting' | 'restarting' if self._breaker.state == 'closed':
+                # A planned (re)start is not a lost connection, so it does not count toward max_reconnects.
+                # A crash is already counted by the requests that failed.
+                if self._breaker.failure(count=False):
+                    self.metrics.reconnects += 1
+
+    def _open_session(self) -> aiohttp.ClientSession:
+        """Create the shared HTTP session, if it does not already exist.
+
+        All requests made by the client share this session, such that TCP connections
+        and DNS lookups are reused between requests.
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._max_connections, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(self._connect_timeout_sec)
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Close the shared HTTP session
+
+        Generations that are still running are cancelled, such that they do not use the
+        session or cache after they are closed.
+
+        Likely this should not be used directly. Instead, use `async with`.
+        """
+        inflight = list(self._inflight.values())
+        for task in inflight:
+            task.cancel()
+        await asyncio.gather(*inflight, return_exceptions=True)
+
+        self._breaker.close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._is_connected = False
+        self._on_connection = None
+
+    async def __aenter__(self) -> Self:
+        self._open_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    async def _await_connection(self):
         """This future returns when a connection is establed.
 
         The function tries to connect to the server several times, until
         `_connect_timeout_sec` has expired. Each connnection attempt is
-        handled by `_try_connect.
-
-        Args:
-            presleep (int, optional): Time to sleep before first connection attempt. Defaults to 0.
+        handled by `_try_connect`, with exponential backoff between attempts.
 
         Raises:
             IOError: raises if the allowed time expired.
         """
         start_time = time.time()
 
-        if presleep > 0:
-            await asyncio.sleep(presleep)
-
+        attempt = 0
         while time.time() < start_time + self._connect_timeout_sec:
             if await self._try_connect():
+                if self._token_budget is not None and self._token_budget.max_tokens is None:
+                    self._token_budget.max_tokens = await self._max_batch_tokens()
+                if self._validator is not None:
+                    max_input_length, max_total_tokens = await self._input_limits()
+                    if self._validator.max_input_length is None:
+                        self._validator.max_input_length = max_input_length
+                    if self._validator.max_total_tokens is None:
+                        self._validator.max_total_tokens = max_total_tokens
                 self._is_connected = True
                 return
 
-            await asyncio.sleep(10)
+            await asyncio.sleep(backoff_delay(attempt, 1, 10))
+            attempt += 1
 
         raise IOError(f'Could not connect to {self._base_url}')
 
@@ -141,17 +323,6 @@ class AbstractClient(Generic[InfoType], metaclass=ABCMeta):
             self._on_connection = asyncio.create_task(self._await_connection())
         await self._on_connection
 
-    def _handle_disconnect(self):
-        """Renew state assuming the connection is lost
-        """
-        if self._remaning_reconnects <= 0:
-            raise IOError('Exhaused all allowed reconnection attempts')
-
-        if self._is_connected:
-            self._is_connected = False
-            self._remaning_reconnects -= 1
-            self._on_connection = asyncio.create_task(self._await_connection(presleep=10))
-
     async def info(self) -> InfoType:
         """Get info about server
         """
@@ -160,18 +331,19 @@ class AbstractClient(Generic[InfoType], metaclass=ABCMeta):
 
         return await self._info()
 
-    async def generate(self, prompt: str, config: GenerateConfig) -> GenerateResponse:
-        """Run inference on the generative model.
+    def config_with_defaults(self, config: GenerateConfig) -> GenerateConfig:
+        """Fill in the default values of a generation config
+
+        This is the effective config, which is sent to the server and used
+        to identify the response in the cache.
 
         Args:
-            prompt (str): The prompt to generate from.
-            config (GenerateConfig): The configuration which controls the generative algorithm
-                (e.g. beam-search) and the response format.
+            config (GenerateConfig): The partial configuration
 
         Returns:
-            Response: The generated content, including optional details.
+            GenerateConfig: The configuration, including default values.
         """
-        config_with_defaults: GenerateConfig = {
+        return {
             **config,
             'max_new_tokens': config.get('max_new_tokens', 20),
             'best_of': config.get('best_of', 1),
@@ -182,39 +354,222 @@ class AbstractClient(Generic[InfoType], metaclass=ABCMeta):
             'repetition_penalty': config.get('repetition_penalty', 1)
         }
 
+    async def stream(self, prompt: str, config: GenerateConfig) -> AsyncIterator[str]:
+        """Run inference on the generative model, and stream the generated text.
+
+        The response is not cached. Stopping the iteration stops the generation.
+
+        Args:
+            prompt (str): The prompt to generate from.
+            config (GenerateConfig): The configuration which controls the generative algorithm.
+
+        Returns:
+            AsyncIterator[str]: The generated text chunks.
+        """
+        if not self._is_connected:
+            await self.connect()
+
+        async for chunk in self._generate_stream(prompt, self.config_with_defaults(config)):
+            yield chunk
+
+    async def generate(self, prompt: str, config: GenerateConfig, early_stop: EarlyStop|None = None) -> GenerateResponse:
+        """Run inference on the generative model.
+
+        Args:
+            prompt (str): The prompt to generate from.
+            config (GenerateConfig): The configuration which controls the generative algorithm
+                (e.g. beam-search) and the response format.
+            early_stop (EarlyStop | None, optional): If streaming is enabled, the generation is
+                stopped when early_stop(generated_text) returns True. The predicate should only return
+                True when more generated text can not change how the response is interpreted.
+                Defaults to None.
+
+        Returns:
+            Response: The generated content, including optional details.
+        """
+        if not self._stream:
+            early_stop = None
+        self.metrics.requests += 1
+
         # Query a resonse and manage the record if recording is enabled
-        response = await self._read_cache_or_generate(prompt, config_with_defaults)
+        response = await self._read_cache_or_generate(prompt, self.config_with_defaults(config), early_stop)
         if self._record_enabled:
             self._record.append((prompt, response))
         return response
 
-    async def _read_cache_or_generate(self, prompt: str, config: GenerateConfig) -> GenerateResponse:
+    async def _read_cache_or_generate(self, prompt: str, config: GenerateConfig,
+                                      early_stop: EarlyStop|None = None) -> GenerateResponse:
+        # Concurrent requests for the same prompt and config share one generation.
+        # The shared task is shielded, such that cancelling one caller does not
+        # cancel the generation for the other callers.
+        # Requests with different early_stop predicates may stop at different points, so are not shared.
+        key = (prompt, json.dumps(config, sort_keys=True), early_stop)
+        if key not in self._inflight:
+            task = asyncio.create_task(self._read_cache_or_generate_uncoalesced(prompt, config, early_stop))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self._inflight[key] = task
+        else:
+            self.metrics.coalesced += 1
+
+        return await asyncio.shield(self._inflight[key])
+
+    async def _generate_until(self, prompt: str, config: GenerateConfig,
+                              early_stop: EarlyStop|None, wait_start_time: float) -> tuple[GenerateResponse, bool]:
+        """Generate a response, optionally stopping early, and record the metrics
+
+        Returns:
+            tuple[GenerateResponse, bool]: The response and if it was stopped early
+        """
+        request_start_time = timer()
+        self.metrics.client_wait.observe(request_start_time - wait_start_time)
+        self.metrics.generated += 1
+        self.metrics.inflight += 1
+        try:
+            answer, stopped_early = await self._generate_or_stream(prompt, config, early_stop)
+        finally:
+            self.metrics.inflight -= 1
+
+        latency = timer() - request_start_time
+        self.metrics.latency.observe(latency)
+        self.metrics.inference_time.observe(answer['duration'])
+        self.metrics.queue_time.observe(max(latency - answer['duration'], 0))
+        if latency > 0:
+            self.metrics.tokens_per_sec.observe(self._count_tokens(answer['response']) / latency)
+        if stopped_early:
+            self.metrics.early_stops += 1
+
+        return (answer, stopped_early)
+
+    async def _generate_or_stream(self, prompt: str, config: GenerateConfig,
+                                  early_stop: EarlyStop|None) -> tuple[GenerateResponse, bool]:
+        if early_stop is None or not self._can_stream():
+            return (await self._generate(prompt, config), False)
+
+        stop = config.get('stop', [])
+        first_chunk_time = None
+        generated_text = ''
+        stopped_early = False
+        stream = self._generate_stream(prompt, config)
+        try:
+            async for chunk in stream:
+                if first_chunk_time is None:
+                    first_chunk_time = timer()
+                generated_text = _remove_stop_sequence(generated_text + chunk, stop)
+                # The text may be the start of a stop sequence, which is not part of the response
+                if _ends_with_partial_stop_sequence(generated_text, stop):
+                    continue
+                if early_stop(generated_text):
+                    stopped_early = True
+                    break
+        finally:
+            # closing the stream, closes the connection and stops the generation
+            await stream.aclose()
+
+        # The server does not report the inference time of a stream. The time until the first
+        # chunk includes the queue time, so the inference time is measured from the first chunk.
+        return ({
+            'response': generated_text,
+            'duration': 0 if first_chunk_time is None else timer() - first_chunk_time
+        }, stopped_early)
+
+    async def _generate_with_limits(self, prompt: str, config: GenerateConfig,
+                                    early_stop: EarlyStop|None = None) -> tuple[GenerateResponse, bool]:
+        wait_start_time = timer()
+        if self._token_budget is None:
+            return await self._generate_with_concurrency(prompt, config, early_stop, wait_start_time)
+
+        cost = self.estimate_tokens(prompt, config)
+        await self._token_budget.acquire(cost)
+        try:
+            return await self._generate_with_concurrency(prompt, config, early_stop, wait_start_time)
+        finally:
+            self._token_budget.release(cost)
+
+    async def _generate_with_concurrency(self, prompt: str, config: GenerateConfig,
+                                         early_stop: EarlyStop|None, wait_start_time: float) -> tuple[GenerateResponse, bool]:
+        if self._concurrency is None:
+            return await self._generate_until(prompt, config, early_stop, wait_start_time)
+
+        await self._concurrency.acquire()
+        try:
+            request_start_time = timer()
+            answer, stopped_early = await self._generate_until(prompt, config, early_stop, wait_start_time)
+            self._concurrency.observe(timer() - request_start_time, answer['duration'])
+            return (answer, stopped_early)
+        except RetryRequest:
+            self._concurrency.observe_overload()
+            raise
+        finally:
+            await self._concurrency.release()
+
+    async def _read_cache_or_generate_uncoalesced(self, prompt: str, config: GenerateConfig,
+                                                  early_stop: EarlyStop|None = None) -> GenerateResponse:
+        # Responses that were stopped early are cached separately, such that they
+        # are only used when the caller accepts an early stopped response.
+        early_stop_config: GenerateConfig = { **config, 'early_stop': True } # type: ignore
+
         # Return valid response from cache, if it exists
-        cached_answer = await self._get_cache(prompt)
+        cached_answer = await self._get_cache(prompt, config)
         if cached_answer is not None and not isinstance(cached_answer, GenerateError):
+            self.metrics.cache_hits += 1
             return cached_answer
+        if early_stop is not None:
+            cached_early_stop_answer = await self._get_cache(prompt, early_stop_config)
+            if cached_early_stop_answer is not None and not isinstance(cached_early_stop_answer, GenerateError):
+                self.metrics.cache_hits += 1
+                return cached_early_stop_answer
+        self.metrics.cache_misses += 1
 
         # No valid response in cache (might not exists, might be an previous error).
         # Attempt to compute response.
         if not self._is_connected:
             await self.connect()
 
+        # Check the prompt length before sending it. A prompt that is too long raises a
+        # PromptTooLongError, which is cached like a GenerateError from the server.
+        # A truncated prompt uses a different config.
+        if self._validator is not None:
+            try:
+                validated_config = self._validator.validate(prompt, config)
+            except PromptTooLongError as error:
+                self.metrics.errors += 1
+                await self._put_cache(prompt, config, error)
+                raise
+            if validated_config != config:
+                return await self._read_cache_or_generate_uncoalesced(prompt, validated_config, early_stop)
+
         # compute response
-        try:
-            computed_answer = await self._generate(prompt, config)
-        except GenerateError as error:
-            # A GenerateError is often because the prompt is too long for the model.
-            # These are are errors that do not indicate an issue with the server and
-            # should not crash the client.
-            computed_answer: GenerateResponse|GenerateError = error
-        except RetryRequest as error:
-            # A RetryRequest indicates that the server crashed, maybe due to a OOM bug.
-            # Such errors are handled by a server wrapper, which will restart the server.
-            # The RetryRequest request indicates that the server is disconnected, and we
-            # need to wait until the server has restarted.
-            self._handle_disconnect()
-            # Retry this function. This will wait until the server has restarted.
-            return await self.generate(prompt, config)
+        stopped_early = False
+        for _ in range(self._max_request_retries + 1):
+            # Wait while the server is down, see CircuitBreaker. If a supervisor reports
+            # that the server is restarting, wait without sending a request that would fail.
+            self._pause_if_restarting()
+            await self._breaker.acquire()
+            try:
+                computed_answer, stopped_early = await self._generate_with_limits(prompt, config, early_stop)
+            except GenerateError as error:
+                # A GenerateError is often because the prompt is too long for the model.
+                # These are are errors that do not indicate an issue with the server and
+                # should not crash the client.
+                self._breaker.success()
+                computed_answer: GenerateResponse|GenerateError = error
+                self.metrics.errors += 1
+                break
+            except RetryRequest:
+                # A RetryRequest indicates that the server crashed, maybe due to a OOM bug.
+                # Such errors are handled by a server wrapper, which will restart the server.
+                # The circuit breaker waits until the server has restarted, then the request is retried.
+                self.metrics.retries += 1
+                if self._breaker.failure():
+                    self.metrics.reconnects += 1
+            except BaseException:
+                self._breaker.abort()
+                raise
+            else:
+                self._breaker.success()
+                break
+        else:
+            raise IOError(f'The request failed after {self._max_request_retries} retries')
 
         match computed_answer:
             case OfflineError():
@@ -223,10 +578,10 @@ class AbstractClient(Generic[InfoType], metaclass=ABCMeta):
 
             case GenerateError():
                 # Save a GenerateError to the cache, such it can be relayed if an Offlineclient is used.
-                await self._put_cache(prompt, computed_answer)
+                await self._put_cache(prompt, config, computed_answer)
                 raise computed_answer
 
             case _:
                 # There were no error, update the cache and return the regular response
-                await self._put_cache(prompt, computed_answer)
+                await self._put_cache(prompt, early_stop_config if stopped_early else config, computed_answer)
                 return computed_answer
@@ -0,0 +1,170 @@
+
+from typing import Callable, Awaitable, Literal
+import asyncio
+import random
+import time
+
+CircuitState = Literal['closed', 'open', 'half-open']
+
+def backoff_delay(attempt: int, min_delay_sec: float, max_delay_sec: float, jitter: float=0.5) -> float:
+    """Exponential backoff with jitter
+
+    The delay doubles for each attempt, up to max_delay_sec. The jitter is the
+    fraction of the delay which is randomized, such that clients that failed at
+    the same time do not retry at the same time.
+
+    Args:
+        attempt (int): The zero-based attempt number.
+        min_delay_sec (float): The delay of the first attempt.
+        max_delay_sec (float): The maximum delay.
+        jitter (float, optional): The randomized fraction of the delay. Defaults to 0.5.
+
+    Returns:
+        float: the delay in seconds
+    """
+    delay = min(min_delay_sec * 2 ** attempt, max_delay_sec)
+    return delay * (1 - jitter) + random.uniform(0, delay * jitter)
+
+class CircuitBreaker:
+    """Stops requests to a server that is down, until it has recovered
+
+    The circuit starts closed, where requests are allowed. When a request fails
+    because the server is down, the circuit opens and requests wait. While open,
+    the server is probed with exponential backoff and jitter. When the probe
+    succeeds, the circuit becomes half-open, where exactly one request is allowed.
+    If that request succeeds the circuit closes, otherwise it opens again.
+    """
+    _state: CircuitState
+    _error: Exception|None
+
+    def __init__(self, probe: Callable[[], Awaitable[bool]],
+                 min_backoff_sec: float=1, max_backoff_sec: float=60, jitter: float=0.5,
+                 max_opens: int|None = None, timeout_sec: float|None = None) -> None:
+        """Create a circuit breaker
+
+        Args:
+            probe (Callable[[], Awaitable[bool]]): Checks if the server is available, for example a health check.
+            min_backoff_sec (float, optional): The delay before the first probe. Defaults to 1.
+            max_backoff_sec (float, optional): The maximum delay between probes. Defaults to 60.
+            jitter (float, optional): The randomized fraction of the delay. Defaults to 0.5.
+            max_opens (int | None, optional): The number of times the circuit can open, before
+                all requests fail with an IOError. Defaults to None (unlimited).
+            timeout_sec (float | None, optional): How long the circuit can be open, before all
+                requests fail with an IOError. Defaults to None (unlimited).
+        """
+        self._probe = probe
+        self._min_backoff_sec = min_backoff_sec
+        self._max_backoff_sec = max_backoff_sec
+        self._jitter = jitter
+        self._max_opens = max_opens
+        self._timeout_sec = timeout_sec
+
+        self._state = 'closed'
+        self._opens = 0
+        self._failed_probes = 0
+        self._probe_taken = False
+        self._error = None
+        self._recover_task = None
+        self._changed = asyncio.Event()
+
+    @property
+    def state(self) -> CircuitState:
+        return self._state
+
+    @property
+    def opens(self) -> int:
+        """The number of times the circuit has opened"""
+        return self._opens
+
+    def _is_allowed(self) -> bool:
+        return self._error is not None or self._state == 'closed' or \
+            (self._state == 'half-open' and not self._probe_taken)
+
+    async def acquire(self) -> None:
+        """Wait until a request is allowed
+
+        After the request, either `success`, `failure`, or `abort` must be called.
+
+        Raises:
+            IOError: if the server did not recover.
+        """
+        while not self._is_allowed():
+            await self._changed.wait()
+        if self._error is not None:
+            raise self._error
+        if self._state == 'half-open':
+            self._probe_taken = True
+
+    def _set_state(self, state: CircuitState) -> None:
+        self._state = state
+        self._probe_taken = False
+        self._notify()
+
+    def _notify(self) -> None:
+        # wake all waiting requests, requests that wait after this wait for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def success(self) -> None:
+        """The request reached the server"""
+        if self._state == 'half-open':
+            self._failed_probes = 0
+            self._set_state('closed')
+
+    def failure(self, count: bool=True) -> bool:
+        """The request failed, because the server is down
+
+        Args:
+            count (bool, optional): If opening the circuit counts toward max_opens. Defaults to True.
+
+        Returns:
+            bool: True if this failure opened the circuit.
+        """
+        if self._state == 'open':
+            # other requests, that were sent before the circuit opened, are also failing
+            return False
+
+        if self._state == 'closed' and count:
+            self._opens += 1
+        self._set_state('open')
+
+        if self._max_opens is not None and self._opens > self._max_opens:
+            self._fail(IOError('Exhaused all allowed reconnection attempts'))
+        else:
+            self._recover_task = asyncio.create_task(self._recover())
+        return True
+
+    def abort(self) -> None:
+        """The request was cancelled, before it was known if the server is down"""
+        if self._state == 'half-open' and self._probe_taken:
+            self._set_state('half-open')
+
+    def _fail(self, error: Exception) -> None:
+        self._error = error
+        self._notify()
+
+    async def _recover(self) -> None:
+        open_time = time.time()
+        while True:
+            await asyncio.sleep(backoff_delay(self._failed_probes, self._min_backoff_sec, self._max_backoff_sec, self._jitter))
+            self._failed_probes += 1
+
+            try:
+                is_up = await self._probe()
+            except Exception:
+                # for example, the server disconnected while restarting
+                is_up = False
+
+            if is_up:
+                self._set_state('half-open')
+                return
+
+            if self._timeout_sec is not None and time.time() - open_time > self._timeout_sec:
+                self._fail(IOError('The server did not recover'))
+                return
+
+    def close(self) -> None:
+        """Cancel the recovery"""
+        if self._recover_task is not None:
+            self._recover_task.cancel()
+            self._recover_task = None
@@ -0,0 +1,92 @@
+
+import asyncio
+
+class AdaptiveConcurrency:
+    """Limits the number of in-flight requests, adapting the limit to the server load
+
+    The limit is controlled using additive-increase/multiplicative-decrease (AIMD).
+    A request that completes without queueing increases the limit, by one per
+    request during slow-start and otherwise by one per `limit` requests. A request
+    that was queued on the server for too long, or which failed due to the server
+    crashing, decreases the limit multiplicatively.
+
+    The queue time is the request latency minus the inference duration reported
+    by the server. For TGI, this corresponds to the X-Queue-Time header plus
+    network overhead.
+    """
+    def __init__(self, min_limit: int=1, max_limit: int=256, initial_limit: int|None = None,
+                 max_queue_time_sec: float=1.0, backoff: float=0.9) -> None:
+        """Create a concurrency limiter
+
+        Args:
+            min_limit (int, optional): The lowest allowed limit. Defaults to 1.
+            max_limit (int, optional): The highest allowed limit. Defaults to 256.
+            initial_limit (int | None, optional): The initial limit. Defaults to min_limit.
+            max_queue_time_sec (float, optional): Requests that are queued for longer than this
+                indicate an overloaded server. Defaults to 1.0.
+            backoff (float, optional): The multiplicative factor used to decrease the limit
+                when the server is overloaded. Defaults to 0.9.
+        """
+        if not (1 <= min_limit <= max_limit):
+            raise ValueError('the limits must satisfy 1 <= min_limit <= max_limit')
+
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._max_queue_time_sec = max_queue_time_sec
+        self._backoff = backoff
+
+        self._limit = float(min_limit if initial_limit is None else min(max(initial_limit, min_limit), max_limit))
+        self._slow_start = True
+        self._inflight = 0
+        self._condition = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        """The current number of allowed in-flight requests"""
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        """The current number of in-flight requests"""
+        return self._inflight
+
+    async def acquire(self) -> None:
+        """Wait until a request is allowed, and reserve it"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._inflight < self.limit)
+            self._inflight += 1
+
+    async def release(self) -> None:
+        """Release a reservation made with acquire"""
+        async with self._condition:
+            self._inflight -= 1
+            self._condition.notify_all()
+
+    def observe(self, latency: float, duration: float) -> None:
+        """Update the limit based on a completed request
+
+        This should be called before the request is released, such that waiting
+        requests see the new limit.
+
+        Args:
+            latency (float): The total time of the request, as observed by the client.
+            duration (float): The inference time, as reported by the server.
+        """
+        queue_time = max(latency - duration, 0)
+        if queue_time > self._max_queue_time_sec:
+            self.observe_overload()
+        elif self._inflight < self.limit:
+            # the limit was not reached, so there is no evidence that a higher limit is possible
+            return
+        elif self._slow_start:
+            self._set_limit(self._limit + 1)
+        else:
+            self._set_limit(self._limit + 1 / self._limit)
+
+    def observe_overload(self) -> None:
+        """Decrease the limit, because the server is overloaded or crashed"""
+        self._slow_start = False
+        self._set_limit(self._limit * self._backoff)
+
+    def _set_limit(self, limit: float) -> None:
+        self._limit = min(max(limit, self._min_limit), self._max_limit)
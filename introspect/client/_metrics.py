@@ -0,0 +1,194 @@
+
+from typing import TypedDict, Required, Iterable, Self
+import bisect
+import math
+
+def _exponential_buckets(start: float, factor: float, count: int) -> tuple[float, ...]:
+    return tuple(start * factor ** i for i in range(count))
+
+# 1ms to ~9 hours for durations, 0.1 to ~50k for tokens/sec
+DURATION_BUCKETS = _exponential_buckets(0.001, 2, 25)
+THROUGHPUT_BUCKETS = _exponential_buckets(0.1, 2, 20)
+
+class HistogramSnapshot(TypedDict):
+    count: Required[int]
+    sum: Required[float]
+    mean: Required[float|None]
+    min: Required[float|None]
+    max: Required[float|None]
+    p50: Required[float|None]
+    p90: Required[float|None]
+    p99: Required[float|None]
+    bucket_counts: Required[list[int]]
+
+class Histogram:
+    """Histogram with fixed buckets, which allows approximate quantiles in constant memory"""
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        """Create a histogram
+
+        Args:
+            buckets (tuple[float, ...]): The sorted upper bounds of the buckets. Values
+                above the last upper bound are counted in an overflow bucket.
+        """
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_snapshot(self, snapshot: HistogramSnapshot) -> None:
+        """Add the observations of a snapshot, from a histogram with the same buckets"""
+        if len(snapshot['bucket_counts']) != len(self.bucket_counts):
+            raise ValueError('the snapshot has different buckets')
+
+        self.bucket_counts = [a + b for a, b in zip(self.bucket_counts, snapshot['bucket_counts'])]
+        self.count += snapshot['count']
+        self.sum += snapshot['sum']
+        if snapshot['min'] is not None:
+            self.min = min(self.min, snapshot['min'])
+        if snapshot['max'] is not None:
+            self.max = max(self.max, snapshot['max'])
+
+    def quantile(self, q: float) -> float|None:
+        """Approximate quantile, using the upper bound of the bucket containing it
+
+        The estimate is clipped to the observed min and max values.
+        """
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for upper_bound, bucket_count in zip(self.buckets + (self.max, ), self.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank and bucket_count > 0:
+                return min(max(upper_bound, self.min), self.max)
+        return self.max
+
+    def snapshot(self) -> HistogramSnapshot:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count > 0 else None,
+            'min': self.min if self.count > 0 else None,
+            'max': self.max if self.count > 0 else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'bucket_counts': list(self.bucket_counts)
+        }
+
+class ClientMetricsSnapshot(TypedDict):
+    requests: Required[int]
+    cache_hits: Required[int]
+    cache_misses: Required[int]
+    cache_hit_ratio: Required[float|None]
+    coalesced: Required[int]
+    generated: Required[int]
+    early_stops: Required[int]
+    errors: Required[int]
+    retries: Required[int]
+    reconnects: Required[int]
+    inflight: Required[int]
+    cache_lookup: Required[HistogramSnapshot]
+    client_wait: Required[HistogramSnapshot]
+    queue_time: Required[HistogramSnapshot]
+    inference_time: Required[HistogramSnapshot]
+    latency: Required[HistogramSnapshot]
+    tokens_per_sec: Required[HistogramSnapshot]
+
+class ClientMetrics:
+    """Latency and throughput metrics recorded by a client
+
+    Attributes:
+        requests: Number of calls to generate.
+        cache_hits: Requests answered by the cache.
+        cache_misses: Requests that were not in the cache.
+        coalesced: Requests that shared the generation of a concurrent identical request.
+        generated: Requests sent to the server.
+        early_stops: Generations that were stopped early.
+        errors: Generations that failed with a GenerateError.
+        retries: Generations that failed because the server disconnected, and were retried.
+        reconnects: Number of times the connection was lost.
+        inflight: Number of requests currently sent to the server.
+        cache_lookup: Time spent reading the cache.
+        client_wait: Time spent waiting for the concurrency limit and token budget.
+        queue_time: Time from sending the request until the server started the inference,
+            computed as the latency minus the inference time reported by the server.
+        inference_time: The inference time reported by the server.
+        latency: Time from sending the request until the response is received.
+        tokens_per_sec: Generated tokens per second of latency. The tokens are counted with
+            the client's prompt validator, otherwise four characters per token is assumed.
+    """
+    def __init__(self) -> None:
+        self.requests = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.coalesced = 0
+        self.generated = 0
+        self.early_stops = 0
+        self.errors = 0
+        self.retries = 0
+        self.reconnects = 0
+        self.inflight = 0
+
+        self.cache_lookup = Histogram(DURATION_BUCKETS)
+        self.client_wait = Histogram(DURATION_BUCKETS)
+        self.queue_time = Histogram(DURATION_BUCKETS)
+        self.inference_time = Histogram(DURATION_BUCKETS)
+        self.latency = Histogram(DURATION_BUCKETS)
+        self.tokens_per_sec = Histogram(THROUGHPUT_BUCKETS)
+
+    @classmethod
+    def from_snapshots(cls, snapshots: Iterable[ClientMetricsSnapshot]) -> Self:
+        """Combine the metrics of several clients, for example from the shards of an experiment
+
+        Args:
+            snapshots (Iterable[ClientMetricsSnapshot]): The snapshots of each client.
+
+        Returns:
+            ClientMetrics: The sum of the counters and histograms.
+        """
+        metrics = cls()
+        for snapshot in snapshots:
+            for name in ['requests', 'cache_hits', 'cache_misses', 'coalesced', 'generated',
+                         'early_stops', 'errors', 'retries', 'reconnects', 'inflight']:
+                setattr(metrics, name, getattr(metrics, name) + snapshot[name])
+            for name in ['cache_lookup', 'client_wait', 'queue_time', 'inference_time', 'latency', 'tokens_per_sec']:
+                getattr(metrics, name).add_snapshot(snapshot[name])
+        return metrics
+
+    @property
+    def cache_hit_ratio(self) -> float|None:
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups > 0 else None
+
+    def snapshot(self) -> ClientMetricsSnapshot:
+        """A JSON serializable copy of the current metrics"""
+        return {
+            'requests': self.requests,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_ratio': self.cache_hit_ratio,
+            'coalesced': self.coalesced,
+            'generated': self.generated,
+            'early_stops': self.early_stops,
+            'errors': self.errors,
+            'retries': self.retries,
+            'reconnects': self.reconnects,
+            'inflight': self.inflight,
+            'cache_lookup': self.cache_lookup.snapshot(),
+            'client_wait': self.client_wait.snapshot(),
+            'queue_time': self.queue_time.snapshot(),
+            'inference_time': self.inference_time.snapshot(),
+            'latency': self.latency.snapshot(),
+            'tokens_per_sec': self.tokens_per_sec.snapshot()
+        }
@@ -0,0 +1,108 @@
+
+from typing import Callable
+
+from ..types import GenerateConfig, GenerateError
+from ..database._memory_cache import MemoryCache
+
+class PromptTooLongError(GenerateError):
+    pass
+
+class PromptValidator:
+    """Validates the prompt length before a request is sent to the server
+
+    The prompts are tokenized locally, and the token counts are cached per prompt.
+    A prompt that exceeds the input limits of the server is either rejected with
+    a PromptTooLongError or truncated using the `truncate` generation parameter.
+    """
+    _counts: MemoryCache[str, int]
+
+    def __init__(self, count_tokens: Callable[[str], int],
+                 max_input_length: int|None = None, max_total_tokens: int|None = None,
+                 truncate: bool=False, max_cache_entries: int|None = 100_000) -> None:
+        """Create a prompt validator
+
+        Args:
+            count_tokens (Callable[[str], int]): Function which returns the number of tokens in a prompt.
+            max_input_length (int | None, optional): The maximum number of prompt tokens. If None, it is set
+                from the server when the client connects. Defaults to None.
+            max_total_tokens (int | None, optional): The maximum number of prompt and generated tokens. If None,
+                it is set from the server when the client connects. Defaults to None.
+            truncate (bool, optional): Truncate over-length prompts, instead of rejecting them. Defaults to False.
+            max_cache_entries (int | None, optional): The number of token counts to cache. Defaults to 100_000.
+        """
+        self._count_tokens = count_tokens
+        self.max_input_length = max_input_length
+        self.max_total_tokens = max_total_tokens
+        self._truncate = truncate
+        self._counts = MemoryCache(max_entries=max_cache_entries)
+
+    @classmethod
+    def from_pretrained(cls, model_id: str, **kwargs) -> 'PromptValidator':
+        """Create a prompt validator using the huggingface tokenizer of a model
+
+        This requires the optional `transformers` dependency.
+
+        Args:
+            model_id (str): The huggingface model id, for example "meta-llama/Llama-2-7b-chat-hf".
+            **kwargs: Additional arguments passed to PromptValidator.
+        """
+        try:
+            from transformers import AutoTokenizer
+        except ImportError as err:
+            raise ImportError('transformers must be installed to validate prompts with a tokenizer') from err
+
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
+        return cls(lambda prompt: len(tokenizer(prompt)['input_ids']), **kwargs)
+
+    def count_tokens(self, prompt: str) -> int:
+        """Number of tokens in the prompt
+
+        Args:
+            prompt (str): The prompt
+
+        Returns:
+            int: The number of tokens
+        """
+        count = self._counts.get(prompt)
+        if count is None:
+            count = self._count_tokens(prompt)
+            self._counts.put(prompt, count, 1)
+        return count
+
+    def max_prompt_tokens(self, config: GenerateConfig) -> int|None:
+        """The maximum number of prompt tokens, given the generation config"""
+        limits = []
+        if self.max_input_length is not None:
+            limits.append(self.max_input_length)
+        if self.max_total_tokens is not None:
+            limits.append(self.max_total_tokens - config.get('max_new_tokens', 0))
+
+        if len(limits) == 0:
+            return None
+        return min(limits)
+
+    def validate(self, prompt: str, config: GenerateConfig) -> GenerateConfig:
+        """Check the prompt length
+
+        Args:
+            prompt (str): The prompt
+            config (GenerateConfig): The configuration, including default values.
+
+        Raises:
+            PromptTooLongError: If the prompt is too long, and truncation is not enabled.
+
+        Returns:
+            GenerateConfig: The configuration, which truncates the prompt if needed.
+        """
+        max_prompt_tokens = self.max_prompt_tokens(config)
+        if max_prompt_tokens is None:
+            return config
+
+        num_tokens = self.count_tokens(prompt)
+        if num_tokens <= max_prompt_tokens:
+            return config
+
+        if self._truncate and max_prompt_tokens > 0:
+            return { **config, 'truncate': max_prompt_tokens } # type: ignore
+
+        raise PromptTooLongError(f'The prompt has {num_tokens} tokens, but at most {max_prompt_tokens} tokens are allowed')
@@ -0,0 +1,98 @@
+
+import asyncio
+import heapq
+
+class TokenBudget:
+    """Admits requests against a budget of in-flight tokens
+
+    Each request has a cost, which is the estimated number of prompt and
+    generated tokens. A request is admitted when the total cost of the in-flight
+    requests stays within the budget. A request is always admitted when nothing
+    else is in-flight, such that a request larger than the budget can not block.
+
+    Waiting requests are admitted in order of cost, cheapest first. This prevents
+    a burst of long requests from starving short requests.
+    """
+    _waiting: list[tuple[int, int, int, asyncio.Future[None]]]
+
+    def __init__(self, max_tokens: int|None = None, order_by_cost: bool=True) -> None:
+        """Create a token budget
+
+        Args:
+            max_tokens (int | None, optional): The maximum total cost of in-flight requests. If None,
+                all requests are admitted until the budget is set. Defaults to None.
+            order_by_cost (bool, optional): Admit the cheapest waiting requests first, otherwise
+                the waiting requests are admitted in order of arrival. Defaults to True.
+        """
+        self._max_tokens = max_tokens
+        self._order_by_cost = order_by_cost
+        self._used_tokens = 0
+        self._waiting = []
+        self._sequence = 0
+
+    @property
+    def max_tokens(self) -> int|None:
+        """The maximum total cost of in-flight requests"""
+        return self._max_tokens
+
+    @max_tokens.setter
+    def max_tokens(self, max_tokens: int|None) -> None:
+        self._max_tokens = max_tokens
+        self._admit_waiting()
+
+    @property
+    def used_tokens(self) -> int:
+        """The total cost of the in-flight requests"""
+        return self._used_tokens
+
+    @property
+    def num_waiting(self) -> int:
+        """The number of requests waiting to be admitted"""
+        return sum(not future.done() for _, _, _, future in self._waiting)
+
+    def _fits(self, cost: int) -> bool:
+        return self._max_tokens is None or self._used_tokens == 0 or self._used_tokens + cost <= self._max_tokens
+
+    async def acquire(self, cost: int) -> None:
+        """Wait until the request fits in the budget, and reserve it
+
+        Args:
+            cost (int): The estimated number of tokens of the request
+        """
+        if len(self._waiting) == 0 and self._fits(cost):
+            self._used_tokens += cost
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (cost if self._order_by_cost else 0, self._sequence, cost, future))
+        self._sequence += 1
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # the request was admitted, but cancelled before it could run
+            if future.done() and not future.cancelled():
+                self.release(cost)
+            raise
+
+    def release(self, cost: int) -> None:
+        """Release a reservation made with acquire
+
+        Args:
+            cost (int): The cost used in acquire
+        """
+        self._used_tokens -= cost
+        self._admit_waiting()
+
+    def _admit_waiting(self) -> None:
+        while len(self._waiting) > 0:
+            _, _, cost, future = self._waiting[0]
+            if future.done():
+                heapq.heappop(self._waiting)
+                continue
+            if not self._fits(cost):
+                break
+
+            heapq.heappop(self._waiting)
+            self._used_tokens += cost
+            future.set_result(None)
@@ -0,0 +1,193 @@
+
+from typing import TypedDict, Required, Any, Sequence, AsyncIterator
+import asyncio
+
+from ..database import GenerationCache
+from ..types import GenerateConfig, GenerateResponse
+from ._abstract_client import AbstractClient, RetryRequest
+
+class BalancedEndpointInfo(TypedDict):
+    base_url: Required[str]
+    healthy: Required[bool]
+    outstanding_requests: Required[int]
+    info: Required[Any]
+
+class BalancedInfo(TypedDict):
+    endpoints: Required[list[BalancedEndpointInfo]]
+
+class BalancedClient(AbstractClient[BalancedInfo]):
+    """This client distributes requests over multiple backend clients
+
+    Each request is routed to the healthy endpoint with the fewest outstanding
+    requests (ties are broken by the fewest outstanding tokens). An endpoint that
+    fails a request is ejected and health-checked in the background, using
+    `_try_connect` of the backend client, until it recovers.
+
+    The backends are only used for connecting and generating. The cache,
+    request coalescing, and reconnect handling is done by the BalancedClient.
+    """
+    _backends: list[AbstractClient]
+    _on_recover: dict[int, asyncio.Task[None]]
+
+    def __init__(self, backends: Sequence[AbstractClient], cache: GenerationCache|None = None,
+                 health_check_interval_sec: float=10, **kwargs) -> None:
+        """Create a client that balances requests between multiple endpoints
+
+        Args:
+            backends (Sequence[AbstractClient]): The clients for each endpoint. These should
+                not have a cache, as caching is done by the BalancedClient.
+            cache (GenerationCache | None, optional): Cache where generation outputs are stored. Defaults to None.
+            health_check_interval_sec (float, optional): How often an ejected endpoint is checked. Defaults to 10.
+            **kwargs: Additional arguments passed to AbstractClient.
+        """
+        if len(backends) == 0:
+            raise ValueError('at least one backend is required')
+
+        super().__init__(', '.join(backend._base_url for backend in backends), cache, **kwargs)
+        self._backends = list(backends)
+        self._health_check_interval_sec = health_check_interval_sec
+        self._healthy = [False] * len(backends)
+        self._outstanding_requests = [0] * len(backends)
+        self._outstanding_tokens = [0] * len(backends)
+        self._on_recover = {}
+
+    @property
+    def healthy(self) -> list[bool]:
+        """The health status of each endpoint"""
+        return list(self._healthy)
+
+    @property
+    def outstanding_requests(self) -> list[int]:
+        """The number of requests currently being processed by each endpoint"""
+        return list(self._outstanding_requests)
+
+    async def _try_connect(self) -> bool:
+        is_connected = await asyncio.gather(*(backend._try_connect() for backend in self._backends))
+        for index, backend_is_connected in enumerate(is_connected):
+            # ejected endpoints are re-admitted by the health check
+            if backend_is_connected and index not in self._on_recover:
+                self._healthy[index] = True
+        return any(self._healthy)
+
+    async def _info(self) -> BalancedInfo:
+        return {
+            'endpoints': [
+                {
+                    'base_url': backend._base_url,
+                    'healthy': healthy,
+                    'outstanding_requests': outstanding_requests,
+                    'info': await backend._info() if healthy else None
+                }
+                for backend, healthy, outstanding_requests
+                in zip(self._backends, self._healthy, self._outstanding_requests)
+            ]
+        }
+
+    async def _max_batch_tokens(self) -> int|None:
+        max_batch_tokens = [
+            await backend._max_batch_tokens()
+            for backend, healthy in zip(self._backends, self._healthy) if healthy
+        ]
+        if len(max_batch_tokens) == 0 or None in max_batch_tokens:
+            return None
+        return sum(max_batch_tokens) # type: ignore
+
+    async def _input_limits(self) -> tuple[int|None, int|None]:
+        limits = [
+            await backend._input_limits()
+            for backend, healthy in zip(self._backends, self._healthy) if healthy
+        ]
+        max_input_length = [limit for limit, _ in limits if limit is not None]
+        max_total_tokens = [limit for _, limit in limits if limit is not None]
+        return (
+            min(max_input_length) if len(max_input_length) > 0 else None,
+            min(max_total_tokens) if len(max_total_tokens) > 0 else None
+        )
+
+    async def close(self) -> None:
+        for task in self._on_recover.values():
+            task.cancel()
+        self._on_recover = {}
+        self._healthy = [False] * len(self._backends)
+
+        await asyncio.gather(*(backend.close() for backend in self._backends))
+        await super().close()
+
+    def _select_backend(self) -> int:
+        """Select the healthy endpoint with the least outstanding work
+
+        Raises:
+            RetryRequest: if no endpoint is healthy.
+
+        Returns:
+            int: index of the endpoint
+        """
+        candidates = [index for index, healthy in enumerate(self._healthy) if healthy]
+        if len(candidates) == 0:
+            raise RetryRequest('No healthy endpoints')
+
+        return min(candidates, key=lambda index: (self._outstanding_requests[index], self._outstanding_tokens[index]))
+
+    def _eject(self, index: int) -> None:
+        """Remove an endpoint from the pool, until it passes a health check
+
+        Args:
+            index (int): index of the endpoint
+        """
+        self._healthy[index] = False
+        if index not in self._on_recover:
+            self._on_recover[index] = asyncio.create_task(self._recover(index))
+
+    async def _recover(self, index: int) -> None:
+        backend = self._backends[index]
+        try:
+            while True:
+                # the endpoint is likely restarting, so wait before the first check
+                await asyncio.sleep(self._health_check_interval_sec)
+                if await backend._try_connect():
+                    self._healthy[index] = True
+                    return
+        finally:
+            self._on_recover.pop(index, None)
+
+    async def _generate(self, prompt: str, config: GenerateConfig) -> GenerateResponse:
+        tokens = self.estimate_tokens(prompt, config)
+
+        # Retry on other endpoints, until no endpoints are healthy. At that point
+        # _select_backend raises RetryRequest, which is handled by AbstractClient.
+        while True:
+            index = self._select_backend()
+            self._outstanding_requests[index] += 1
+            self._outstanding_tokens[index] += tokens
+            try:
+                return await self._backends[index]._generate(prompt, config)
+            except RetryRequest:
+                self._eject(index)
+            finally:
+                self._outstanding_requests[index] -= 1
+                self._outstanding_tokens[index] -= tokens
+
+    def _can_stream(self) -> bool:
+        return all(backend._can_stream() for backend in self._backends)
+
+    async def _generate_stream(self, prompt: str, config: GenerateConfig) -> AsyncIterator[str]:
+        tokens = self.estimate_tokens(prompt, config)
+
+        # A stream can only be retried on another endpoint, if nothing has been generated yet
+        while True:
+            index = self._select_backend()
+            self._outstanding_requests[index] += 1
+            self._outstanding_tokens[index] += tokens
+            has_generated = False
+            try:
+                async for chunk in self._backends[index]._generate_stream(prompt, config):
+                    has_generated = True
+                    yield chunk
+                return
+            except RetryRequest:
+                self._eject(index)
+                if has_generated:
+                    raise
+            finally:
+                self._outstanding_requests[index] -= 1
+                self._outstanding_tokens[index] -= tokens
@@ -23,7 +23,7 @@ class TestClient(AbstractClient[TestInfo]):
     _response: Callable[[str], Awaitable[str|None]]
 
     def __init__(self, response: Callable[[str], Awaitable[str|None]]|dict[str, str|None] = {},
-                       cache: GenerationCache | None = None) -> None:
+                       cache: GenerationCache | None = None, **kwargs) -> None:
         """Creates a TestClient used for mocking a server.
 
         Args:
@@ -31,6 +31,7 @@ class TestClient(AbstractClient[TestInfo]):
                 This can either be an async function (prompt: str) -> response: str. Or,
                 it can be a dict[prompt, response]. Defaults to {}.
             cache (GenerationCache | None, optional): _description_. Defaults to None.
+            **kwargs: Additional arguments passed to AbstractClient.
         """
         self.log = []
 
@@ -38,7 +39,7 @@ class TestClient(AbstractClient[TestInfo]):
             self._response = _dict_to_callable(response)
         else:
             self._response = response
-        super().__init__('http://127.0.0.0:0', cache, record=True)
+        super().__init__('http://127.0.0.0:0', cache, record=True, **kwargs)
 
     async def _try_connect(self) -> bool:
         return True
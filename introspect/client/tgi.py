@@ -1,6 +1,7 @@
 
-from typing import TypedDict, Literal, Required, NotRequired
+from typing import TypedDict, Literal, Required, NotRequired, AsyncIterator
 
+import json
 import aiohttp
 import asyncio
 import traceback
@@ -83,7 +84,7 @@ class TGIGenerateConfig(GenerateConfig):
 class TGIGeneratePayload(TypedDict):
     inputs: Required[str]
     parameters: NotRequired[TGIGenerateConfig]
-    stream: Literal[False]
+    stream: bool
 
 class TGIClient(AbstractClient[TGIInfo]):
     """This client connects to a TGI server
@@ -92,20 +93,27 @@ class TGIClient(AbstractClient[TGIInfo]):
     https://huggingface.co/docs/text-generation-inference/en/index
     """
     async def _try_connect(self) -> bool:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(60)) as session:
-            try:
-                async with session.get(f'{self._base_url}/health') as response:
-                    return response.status == 200
-            except (aiohttp.ClientOSError, asyncio.TimeoutError):
-                return False
+        session = self._open_session()
+        try:
+            async with session.get(f'{self._base_url}/health', timeout=aiohttp.ClientTimeout(60)) as response:
+                return response.status == 200
+        except (aiohttp.ClientOSError, asyncio.TimeoutError):
+            return False
 
     async def _info(self) -> TGIInfo:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(60)) as session:
-            async with session.get(f'{self._base_url}/info') as response:
-                if response.status != 200:
-                    raise RuntimeError(f'unexpected status code {response.status}')
+        session = self._open_session()
+        async with session.get(f'{self._base_url}/info', timeout=aiohttp.ClientTimeout(60)) as response:
+            if response.status != 200:
+                raise RuntimeError(f'unexpected status code {response.status}')
+
+            return await response.json()
+
+    async def _max_batch_tokens(self) -> int|None:
+        return (await self._info())['max_batch_total_tokens']
 
-                return await response.json()
+    async def _input_limits(self) -> tuple[int|None, int|None]:
+        info = await self._info()
+        return (info['max_input_length'], info['max_total_tokens'])
 
     async def _generate(self, prompt, config) -> GenerateResponse:
         payload: TGIGeneratePayload = {
@@ -117,25 +125,58 @@ class TGIClient(AbstractClient[TGIInfo]):
             'stream': False
         }
 
+        session = self._open_session()
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(self._connect_timeout_sec)) as session:
-                async with session.post(self._base_url, json=payload) as response:
-                    answer = await response.json()
-
-                    if response.status != 200:
-                        raise parse_error(response.status, answer)
-
-                    generated_text = answer[0]['generated_text']
-                    # remove stop tokens
-                    for stop_token in config['stop']:
-                        if generated_text.endswith(stop_token):
-                            generated_text = generated_text.removesuffix(stop_token)
-                            break
-
-                    return {
-                        'response': generated_text,
-                        'duration': float(response.headers['X-Inference-Time'])
-                    }
+            async with session.post(self._base_url, json=payload) as response:
+                answer = await response.json()
+
+                if response.status != 200:
+                    raise parse_error(response.status, answer)
+
+                generated_text = answer[0]['generated_text']
+                # remove stop tokens
+                for stop_token in config['stop']:
+                    if generated_text.endswith(stop_token):
+                        generated_text = generated_text.removesuffix(stop_token)
+                        break
+
+                return {
+                    'response': generated_text,
+                    'duration': float(response.headers['X-Inference-Time'])
+                }
+
+        except ValidationError as err:
+            raise GenerateError('LLM generate failed') from err
+        except (asyncio.TimeoutError, aiohttp.ClientOSError, aiohttp.ServerDisconnectedError, GenerationError) as err:
+            traceback.print_exception(err)
+            raise RetryRequest('Connection error') from err
+
+    async def _generate_stream(self, prompt, config) -> AsyncIterator[str]:
+        payload: TGIGeneratePayload = {
+            'inputs': prompt,
+            'parameters': {
+                'return_full_text': False,
+                **config
+            },
+            'stream': True
+        }
+
+        session = self._open_session()
+        try:
+            async with session.post(f'{self._base_url}/generate_stream', json=payload) as response:
+                if response.status != 200:
+                    raise parse_error(response.status, await response.json())
+
+                # The response is server-sent events, each event is a line starting with "data:"
+                async for line in response.content:
+                    if not line.startswith(b'data:'):
+                        continue
+
+                    event = json.loads(line.removeprefix(b'data:'))
+                    if 'error' in event:
+                        raise parse_error(response.status, event)
+                    if not event['token']['special']:
+                        yield event['token']['text']
 
         except ValidationError as err:
             raise GenerateError('LLM generate failed') from err
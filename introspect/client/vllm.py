@@ -101,12 +101,12 @@ class VLLMClient(AbstractClient[VLLMInfo]):
             'top_p': 1
         }
 
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(60)) as session:
-            try:
-                async with session.post(f'{self._base_url}/generate', json=payload) as response:
-                    return response.status == 200
-            except (aiohttp.ClientOSError, asyncio.TimeoutError):
-                return False
+        session = self._open_session()
+        try:
+            async with session.post(f'{self._base_url}/generate', json=payload, timeout=aiohttp.ClientTimeout(60)) as response:
+                return response.status == 200
+        except (aiohttp.ClientOSError, asyncio.TimeoutError):
+            return False
 
     async def _info(self) -> VLLMInfo:
         return {}
@@ -124,21 +124,21 @@ class VLLMClient(AbstractClient[VLLMInfo]):
             'presence_penalty': config.get('repetition_penalty', 0) - 1
         }
 
+        session = self._open_session()
         try:
             request_start_time = timer()
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(self._connect_timeout_sec)) as session:
-                async with session.post(f'{self._base_url}/generate', json=payload) as response:
-                    answer = await response.json()
-
-                    if response.status != 200:
-                        raise VLLMError(f'unexpected status code {response.status}')
-
-                    response = answer['text'][0][len(prompt):]
-                    durration = timer() - request_start_time
-                    return {
-                        'response': response,
-                        'duration': durration
-                    }
+            async with session.post(f'{self._base_url}/generate', json=payload) as response:
+                answer = await response.json()
+
+                if response.status != 200:
+                    raise VLLMError(f'unexpected status code {response.status}')
+
+                response = answer['text'][0][len(prompt):]
+                durration = timer() - request_start_time
+                return {
+                    'response': response,
+                    'duration': durration
+                }
 
         except (VLLMError, asyncio.TimeoutError) as err:
             raise GenerateError('LLM generate failed') from err
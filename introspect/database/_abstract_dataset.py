@@ -1,15 +1,22 @@
 
 import pathlib
-from typing import Self
+from typing import Self, Any, Sequence
 from abc import ABCMeta
+from itertools import groupby
 import os
 import asyncio
 
 import aiosqlite as sql
 
+# Older versions of SQLite allow at most 999 variables in a query
+_MAX_VARIABLES = 500
+
 class AbstractDatabase(metaclass=ABCMeta):
     _setup_sql: str
     _con: sql.Connection
+    _write_queue: list[tuple[str, dict[str, Any]|tuple]]
+    _write_task: asyncio.Task[None]|None
+    _flushing: asyncio.Task[None]|None
 
     def __init__(self, filepath: pathlib.Path|str, min_commit_transactions: int=100) -> None:
         """Create Database
@@ -23,6 +30,63 @@ class AbstractDatabase(metaclass=ABCMeta):
         self._min_commit_transactions = min_commit_transactions
         self._transactions_queued = 0
         self._commit_task = None
+        self._write_queue = []
+        self._write_task = None
+        self._flushing = None
+
+    async def _write(self, writes: Sequence[tuple[str, dict[str, Any]|tuple]]) -> None:
+        """Queue writes and wait for them to be executed
+
+        Writes that are queued concurrently, for example from several AsyncMap workers,
+        are executed together. Consecutive writes using the same SQL statement are
+        executed with a single `executemany` call.
+
+        Args:
+            writes (Sequence[tuple[str, dict[str, Any] | tuple]]): List of (sql, parameters) pairs.
+        """
+        if len(writes) == 0:
+            return
+
+        self._write_queue.extend(writes)
+        if self._write_task is None:
+            self._write_task = asyncio.create_task(self._flush_writes(self._flushing))
+            # the latest batch, it completes after all previous batches
+            self._flushing = self._write_task
+        await asyncio.shield(self._write_task)
+
+    async def _flush_writes(self, previous: asyncio.Task[None]|None) -> None:
+        # allow concurrent writers to join this batch
+        await asyncio.sleep(0)
+        writes, self._write_queue = self._write_queue, []
+        # writes queued from now on, are part of the next batch
+        self._write_task = None
+
+        # batches are executed in the order they were queued
+        if previous is not None:
+            await asyncio.wait([previous])
+
+        for query, group in groupby(writes, key=lambda write: write[0]):
+            await self._con.executemany(query, [parameters for _, parameters in group])
+
+        self._transactions_queued += len(writes)
+        self._maybe_commit()
+
+    async def _select_in(self, query: str, keys: Sequence[Any]) -> list[tuple]:
+        """Execute a query with an `IN ({})` clause, in chunks of keys
+
+        Args:
+            query (str): Query where `{}` is replaced with the placeholders for the keys.
+            keys (Sequence[Any]): Keys to query for.
+
+        Returns:
+            list[tuple]: All rows from all chunks.
+        """
+        rows = []
+        for start in range(0, len(keys), _MAX_VARIABLES):
+            chunk = keys[start:start + _MAX_VARIABLES]
+            cursor = await self._con.execute(query.format(', '.join('?' * len(chunk))), chunk)
+            rows.extend(await cursor.fetchall())
+        return rows
 
     def _schedule_commit(self):
         if self._commit_task is None:
@@ -43,7 +107,13 @@ class AbstractDatabase(metaclass=ABCMeta):
         if self._transactions_queued >= self._min_commit_transactions:
             self._schedule_commit()
 
+    async def _wait_for_writes(self) -> None:
+        if self._flushing is not None:
+            # failed writes are raised to the writer, not here
+            await asyncio.wait([self._flushing])
+
     async def _ensure_commit(self):
+        await self._wait_for_writes()
         if self._commit_task is not None:
             await self._commit_task
         await self._schedule_commit()
@@ -63,11 +133,19 @@ class AbstractDatabase(metaclass=ABCMeta):
             await self._con.execute('PRAGMA journal_mode = WAL;')
             await self._con.execute('PRAGMA synchronous = NORMAL;')
 
+        await self._migrate()
         await self._con.execute(self._setup_sql)
         await self._ensure_commit()
 
         return is_new
 
+    async def _migrate(self) -> None:
+        """Upgrade the database layout of an existing database
+
+        This is called before the `_setup_sql` is executed. By default, there is nothing to migrate.
+        """
+        pass
+
     async def commit(self) -> None:
         """Commits  connection
         """
@@ -78,6 +156,7 @@ class AbstractDatabase(metaclass=ABCMeta):
 
         Likely this should not be used directly. Instead, use `async with`.
         """
+        await self._wait_for_writes()
         await self._con.close()
         del self._con
 
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from typing import Generic, TypeVar, Hashable
+
+KeyType = TypeVar('KeyType', bound=Hashable)
+ValueType = TypeVar('ValueType')
+
+class MemoryCache(Generic[KeyType, ValueType]):
+    _entries: OrderedDict[KeyType, tuple[ValueType, int]]
+
+    def __init__(self, max_entries: int|None = None, max_bytes: int|None = None) -> None:
+        """Bounded in-process least-recently-used cache
+
+        Args:
+            max_entries (int | None, optional): The maximum number of entries. Defaults to None (unbounded).
+            max_bytes (int | None, optional): The maximum total size of the entries. The size of
+                each entry is provided by the caller. Defaults to None (unbounded).
+        """
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._num_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def num_entries(self) -> int:
+        """Number of entries currently stored"""
+        return len(self._entries)
+
+    @property
+    def num_bytes(self) -> int:
+        """Total size of the entries currently stored"""
+        return self._num_bytes
+
+    def __contains__(self, key: KeyType) -> bool:
+        return key in self._entries
+
+    def get(self, key: KeyType) -> ValueType|None:
+        """Get entry and mark it as recently used
+
+        Args:
+            key (KeyType): The entry key
+
+        Returns:
+            ValueType|None: The entry if it exists, otherwise None.
+        """
+        if key not in self._entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        value, _ = self._entries[key]
+        return value
+
+    def put(self, key: KeyType, value: ValueType, size: int) -> None:
+        """Add or update an entry, and evict the least recently used entries if the cache is full
+
+        Args:
+            key (KeyType): The entry key
+            value (ValueType): The entry value
+            size (int): The size of the entry, used for the max_bytes limit
+        """
+        # an outdated value must not be served, even if the new value is not stored
+        self._remove(key)
+        if self._max_bytes is not None and size > self._max_bytes:
+            return
+
+        self._entries[key] = (value, size)
+        self._num_bytes += size
+
+        while (self._max_entries is not None and len(self._entries) > self._max_entries) or \
+              (self._max_bytes is not None and self._num_bytes > self._max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._num_bytes -= evicted_size
+            self.evictions += 1
+
+    def _remove(self, key: KeyType) -> None:
+        if key in self._entries:
+            _, size = self._entries.pop(key)
+            self._num_bytes -= size
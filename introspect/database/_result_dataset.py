@@ -1,7 +1,7 @@
 
 from traceback import format_exception
 from pathlib import Path
-from typing import Generic, TypeVar, Type
+from typing import Generic, TypeVar, Type, Sequence, Any, AsyncIterator
 import pickle
 import inspect
 import typing
@@ -122,24 +122,17 @@ class ResultDatabase(AbstractDatabase, Generic[TaskResultType]):
             f'VALUES (:rowid, :idx, :split, {sql_values})'
         )
 
-    async def put(self, split: DatasetSplits, idx: int, data: TaskResultType|GenerateError) -> None:
-        """Add or update an entry to the database
-
-        Args:
-            split (DatasetSplits): Dataset split
-            idx (int): Observation index
-            data (TaskResultType): data to add, input is a dictionary.
-                The index of the observation is identified by the idx property.
-        """
+    def _make_put_write(self, split: DatasetSplits, idx: int,
+                        data: TaskResultType|GenerateError) -> tuple[str, dict[str, Any]]|None:
         rowid = _idx_split_to_rowid(split, idx)
 
         match data:
             case OfflineError():
                 # There is information value in saving an OfflineError
-                return
+                return None
 
             case GenerateError():
-                await self._con.execute(self._put_error_sql, {
+                return (self._put_error_sql, {
                     'error': pickle.dumps(data),
                     'traceback': ''.join(format_exception(data)),
                     'split': _split_to_id[split],
@@ -153,19 +146,44 @@ class ResultDatabase(AbstractDatabase, Generic[TaskResultType]):
                 ) from data['error'] # type:ignore
 
             case _:
-                await self._con.execute(self._put_obs_sql, {
+                return (self._put_obs_sql, {
                     **data,
                     'split': _split_to_id[split],
                     'idx': idx,
                     'rowid': rowid
                 })
 
-        self._transactions_queued += 1
-        self._maybe_commit()
+    async def put(self, split: DatasetSplits, idx: int, data: TaskResultType|GenerateError) -> None:
+        """Add or update an entry to the database
+
+        Concurrent calls to `put` are written to the database as one batch.
+
+        Args:
+            split (DatasetSplits): Dataset split
+            idx (int): Observation index
+            data (TaskResultType): data to add, input is a dictionary.
+                The index of the observation is identified by the idx property.
+        """
+        await self.put_many(split, [(idx, data)])
+
+    async def put_many(self, split: DatasetSplits, entries: Sequence[tuple[int, TaskResultType|GenerateError]]) -> None:
+        """Add or update multiple entries to the database
+
+        Args:
+            split (DatasetSplits): Dataset split
+            entries (Sequence[tuple[int, TaskResultType|GenerateError]]): List of (idx, data) tuples.
+        """
+        writes = []
+        for idx, data in entries:
+            write = self._make_put_write(split, idx, data)
+            if write is not None:
+                writes.append(write)
+
+        await self._write(writes)
 
     @cached_property
     def _has_sql(self):
-        return f'SELECT EXISTS(SELECT 1 FROM {self._table_name} WHERE id = ?)'
+        return f'SELECT id FROM {self._table_name} WHERE id IN ({{}})'
 
     async def has(self, split: DatasetSplits, idx: int) -> bool:
         """Check if observation exists
@@ -177,18 +195,30 @@ class ResultDatabase(AbstractDatabase, Generic[TaskResultType]):
         Returns:
             bool: True if the observation exists.
         """
-        rowid = _idx_split_to_rowid(split, idx)
-        cursor = await self._con.execute(self._has_sql, (rowid, ))
-        exists, = await cursor.fetchone() # type: ignore
-        return exists == 1
+        exists, = await self.has_many(split, [idx])
+        return exists
+
+    async def has_many(self, split: DatasetSplits, idxs: Sequence[int]) -> list[bool]:
+        """Check if multiple observations exists
+
+        Args:
+            split (DatasetSplits): Dataset split
+            idxs (Sequence[int]): Observation indices
+
+        Returns:
+            list[bool]: For each index, True if the observation exists.
+        """
+        rowids = [_idx_split_to_rowid(split, idx) for idx in idxs]
+        found_rowids = set(rowid for rowid, in await self._select_in(self._has_sql, rowids))
+        return [rowid in found_rowids for rowid in rowids]
 
     @cached_property
     def _get_sql(self) -> str:
         sql_columns = ', '.join((*self._table_def.keys(), 'error'))
         return (
-            f'SELECT {sql_columns}\n'
+            f'SELECT id, {sql_columns}\n'
             f'FROM {self._table_name}\n'
-            f'WHERE id = ?'
+            f'WHERE id IN ({{}})'
         )
 
     async def get(self, split: DatasetSplits, idx: int) -> TaskResultType|GenerateError|None:
@@ -202,12 +232,50 @@ class ResultDatabase(AbstractDatabase, Generic[TaskResultType]):
             TaskResultType|None: Returns the entry if it exists.
                 Otherwise, return None.
         """
-        rowid = _idx_split_to_rowid(split, idx)
-        cursor = await self._con.execute(self._get_sql, (rowid, ))
-        results = await cursor.fetchone()
-        if results is None:
-            return None
+        result, = await self.get_many(split, [idx])
+        return result
+
+    async def get_many(self, split: DatasetSplits, idxs: Sequence[int]) -> list[TaskResultType|GenerateError|None]:
+        """Get multiple entries by index
+
+        Args:
+            split (DatasetSplits): Dataset split
+            idxs (Sequence[int]): Observation indices
+
+        Returns:
+            list[TaskResultType|GenerateError|None]: For each index, the entry if it exists.
+                Otherwise, None.
+        """
+        rowids = [_idx_split_to_rowid(split, idx) for idx in idxs]
+        results = {
+            rowid: self._unpack_results(values)
+            for rowid, *values in await self._select_in(self._get_sql, rowids)
+        }
+        return [results.get(rowid) for rowid in rowids]
+
+    @cached_property
+    def _items_sql(self) -> str:
+        sql_columns = ', '.join((*self._table_def.keys(), 'error'))
+        return (
+            f'SELECT idx, {sql_columns}\n'
+            f'FROM {self._table_name}\n'
+            f'WHERE split = ?'
+        )
+
+    async def items(self, split: DatasetSplits) -> AsyncIterator[tuple[int, TaskResultType|GenerateError]]:
+        """Iterate over all entries of a split
+
+        Args:
+            split (DatasetSplits): Dataset split
+
+        Yields:
+            tuple[int, TaskResultType|GenerateError]: (idx, entry) tuples.
+        """
+        cursor = await self._con.execute(self._items_sql, (_split_to_id[split], ))
+        async for idx, *values in cursor:
+            yield (idx, self._unpack_results(values))
 
+    def _unpack_results(self, results: Sequence[Any]) -> TaskResultType|GenerateError:
         # error is set
         if results[-1] is not None:
             return pickle.loads(results[-1])
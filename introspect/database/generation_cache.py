@@ -1,11 +1,15 @@
-
 from pathlib import Path
+import hashlib
+import json
 import pickle
+import uuid
+import zlib
 from traceback import format_exception
-from typing import AsyncIterator, overload
+from typing import AsyncIterator, Sequence, overload
 
 from ._abstract_dataset import AbstractDatabase
-from ..types import GenerateResponse, GenerateError
+from ._memory_cache import MemoryCache
+from ..types import GenerateConfig, GenerateResponse, GenerateError
 
 @overload
 def _database_to_filepath(database: str, directory: Path) -> Path:
@@ -22,37 +26,151 @@ def _database_to_filepath(database, directory):
         filepath = (directory / database).with_suffix('.sqlite')
     return filepath
 
+def _normalize_config(config: GenerateConfig) -> str:
+    # Floats with an integer value are stored as integers, such that
+    # {"temperature": 1} and {"temperature": 1.0} are the same config.
+    return json.dumps({
+        name: int(value) if isinstance(value, float) and value.is_integer() else value
+        for name, value in config.items()
+    }, sort_keys=True, separators=(',', ':'))
+
+def _cache_key(prompt: str, config: str|None, model_id: str|None) -> bytes:
+    return hashlib.blake2b(
+        json.dumps([prompt, config, model_id], separators=(',', ':')).encode('utf-8'),
+        digest_size=16
+    ).digest()
+
+def _compress(content: str|None) -> bytes|None:
+    if content is None:
+        return None
+    return zlib.compress(content.encode('utf-8'))
+
+def _decompress(content: bytes|None) -> str|None:
+    if content is None:
+        return None
+    return zlib.decompress(content).decode('utf-8')
+
+def _answer_size(answer: GenerateResponse|GenerateError) -> int:
+    # Approximate memory usage, including a fixed overhead for the objects
+    match answer:
+        case GenerateError():
+            return len(str(answer)) + 256
+        case _:
+            return len(answer['response']) + 256
+
 class GenerationCache(AbstractDatabase):
+    # Version 0 (no version) used the prompt as the key and did not store the config.
+    _version = 1
     _setup_sql = '''
-        CREATE TABLE IF NOT EXISTS Cache (
-            prompt TEXT NOT NULL PRIMARY KEY,
-            response TEXT,
+        CREATE TABLE IF NOT EXISTS Generation (
+            -- AUTOINCREMENT never reuses an id, such that a replaced row is copied to dependents
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            key BLOB NOT NULL UNIQUE,
+            prompt BLOB NOT NULL,
+            config TEXT,
+            model_id TEXT,
+            response BLOB,
             duration REAL,
             error BLOB,
             traceback TEXT
-        ) STRICT, WITHOUT ROWID
+        ) STRICT
     '''
     _put_sql = '''
-        REPLACE INTO Cache(prompt, response, duration, error, traceback)
-        VALUES (:prompt, :response, :duration, :error, :traceback)
+        REPLACE INTO Generation(key, prompt, config, model_id, response, duration, error, traceback)
+        VALUES (:key, :prompt, :config, :model_id, :response, :duration, :error, :traceback)
     '''
     _has_sql = '''
-        SELECT EXISTS(SELECT 1 FROM Cache WHERE prompt = ?)
+        SELECT key FROM Generation WHERE key IN ({})
     '''
     _get_sql = '''
-        SELECT response, duration, error
-        FROM Cache
-        WHERE prompt = ?
+        SELECT key, response, duration, error
+        FROM Generation
+        WHERE key IN ({})
+    '''
+    _adopt_legacy_sql = '''
+        UPDATE OR IGNORE Generation
+        SET key = :key, config = :config, model_id = :model_id
+        WHERE key = :legacy_key
+    '''
+    _copy_legacy_sql = '''
+        INSERT OR IGNORE INTO Generation(key, prompt, config, model_id, response, duration, error, traceback)
+        SELECT :key, prompt, :config, :model_id, response, duration, error, traceback
+        FROM Generation
+        WHERE key = :legacy_key
     '''
     _iter_sql = '''
-        SELECT prompt, response, duration, error
+        SELECT prompt, config, response, duration, error
+        FROM Generation
+    '''
+    _setup_meta_sql = '''
+        CREATE TABLE IF NOT EXISTS Meta (
+            name TEXT NOT NULL PRIMARY KEY,
+            value TEXT NOT NULL
+        ) STRICT
+    '''
+    _init_generation_sql = '''
+        INSERT OR IGNORE INTO Meta(name, value) VALUES ('generation', ?)
+    '''
+    _setup_dependency_sql = '''
+        CREATE TABLE IF NOT EXISTS Dependency (
+            database TEXT NOT NULL PRIMARY KEY,
+            generation TEXT NOT NULL,
+            last_id INTEGER NOT NULL
+        ) STRICT
+    '''
+    _get_dependency_sql = '''
+        SELECT generation, last_id FROM Dependency WHERE database = ?
+    '''
+    _put_dependency_sql = '''
+        REPLACE INTO Dependency(database, generation, last_id) VALUES (?, ?, ?)
+    '''
+    # Entries that exist are kept, unless the dependency has a response for a cached error
+    _bootstrap_sql = '''
+        INSERT INTO main.Generation(key, prompt, config, model_id, response, duration, error, traceback)
+        SELECT key, prompt, config, model_id, response, duration, error, traceback
+        FROM dependency.Generation
+        WHERE id > ? AND id <= ?
+        ON CONFLICT(key) DO UPDATE SET
+            response = excluded.response, duration = excluded.duration,
+            error = excluded.error, traceback = excluded.traceback
+        WHERE error IS NOT NULL AND excluded.error IS NULL
+    '''
+    _migrate_v0_sql = '''
+        INSERT OR IGNORE INTO Generation(key, prompt, config, model_id, response, duration, error, traceback)
+        SELECT cache_key(prompt, NULL, NULL), compress(prompt), NULL, NULL, compress(response), duration, error, traceback
         FROM Cache
     '''
 
-    def __init__(self, database: str, cache_dir: Path|None=None, deps: list[str]=[], **kwargs) -> None:
+    memory: MemoryCache[bytes, GenerateResponse|GenerateError]|None
+
+    def __init__(self, database: str, cache_dir: Path|None=None, deps: list[str]=[],
+                 model_id: str='', memory_max_entries: int|None=None, memory_max_bytes: int|None=None,
+                 **kwargs) -> None:
+        """Create a cache of generated responses
+
+        Entries are identified by the prompt, the generation config, and the model id.
+        Such that a cache can be shared between experiments that use different
+        seeds or models.
+
+        Args:
+            database (str): The name of the database, or an in-memory address if cache_dir is None.
+            cache_dir (Path | None, optional): The directory where the database is stored. Defaults to None.
+            deps (list[str], optional): Databases that are used to bootstrap this database. Defaults to [].
+            model_id (str, optional): The model that generated the responses. Defaults to ''.
+            memory_max_entries (int | None, optional): If set, keep up to this many entries in an
+                in-process LRU cache in front of the database. Defaults to None.
+            memory_max_bytes (int | None, optional): If set, keep up to approximately this many
+                bytes in an in-process LRU cache in front of the database. Defaults to None.
+        """
         self._database = database
         self._deps = deps
         self._cache_dir = cache_dir
+        self._model_id = model_id
+
+        self.memory = None
+        if memory_max_entries is not None or memory_max_bytes is not None:
+            self.memory = MemoryCache(max_entries=memory_max_entries, max_bytes=memory_max_bytes)
+
         super().__init__(_database_to_filepath(database, cache_dir), **kwargs)
 
     @staticmethod
@@ -62,10 +180,17 @@ class GenerationCache(AbstractDatabase):
     async def open(self) -> bool:
         is_new = await super().open()
 
+        # A random id, which identifies this instance of the database. If the database
+        # is removed and recreated, the databases that depend on it copy everything again.
+        await self._con.execute(self._setup_meta_sql)
+        await self._con.execute(self._init_generation_sql, (uuid.uuid4().hex, ))
+        await self._ensure_commit()
+
         if self._cache_dir is None:
             return is_new
 
-        # if it is a new database, bootstrap the database using the dependencies
+        # bootstrap the database using the dependencies
+        await self._con.execute(self._setup_dependency_sql)
         for dep in self._deps:
             # prevent cloneing itself
             if dep == self._database:
@@ -74,88 +199,274 @@ class GenerationCache(AbstractDatabase):
             if not _database_to_filepath(dep, self._cache_dir).exists():
                 continue
 
-            # copy over content
-            async with GenerationCache(dep, self._cache_dir) as source_db:
-                async for prompt, answer in source_db:
-                    await self.put(prompt, answer)
-
-        await self.commit()
+            await self._bootstrap(dep)
 
         return is_new
 
-    async def __aiter__(self) -> AsyncIterator[tuple[str, GenerateResponse|GenerateError]]:
-        cursor = await self._con.execute(self._iter_sql)
-        async for row in cursor:
-            prompt, response, duration, error = row
-            yield (prompt, self._unpack_results(response, duration, error))
+    async def _bootstrap(self, dep: str) -> None:
+        """Copy the content of a dependency database
 
-    async def put(self, prompt: str, answer: GenerateResponse|GenerateError) -> None:
-        """Add or update an entry to the database
+        The dependency is attached to the connection and copied with a single
+        INSERT ... SELECT. The last copied row is recorded in the Dependency table,
+        such that only rows added since the last bootstrap are copied. Rows that are
+        updated get a new id, as `put` replaces the row.
 
         Args:
-            prompt (str): Prompt sent to generative model
-            answer (GenerateResponse, GenerateError): Answer by generative model
+            dep (str): Name of the dependency database
         """
+        filepath = _database_to_filepath(dep, self._cache_dir)
+
+        # ATTACH and DETACH are not allowed within a transaction
+        await self._ensure_commit()
+        await self._con.execute('ATTACH DATABASE ? AS dependency', (str(filepath), ))
+        try:
+            cursor = await self._con.execute('PRAGMA dependency.user_version')
+            version, = await cursor.fetchone() # type: ignore
+            if version != self._version:
+                # let the dependency migrate itself to the current layout
+                await self._con.execute('DETACH DATABASE dependency')
+                async with GenerationCache(dep, self._cache_dir):
+                    pass
+                await self._con.execute('ATTACH DATABASE ? AS dependency', (str(filepath), ))
+
+            cursor = await self._con.execute("SELECT value FROM dependency.Meta WHERE name = 'generation'")
+            generation, = await cursor.fetchone() # type: ignore
+
+            cursor = await self._con.execute(self._get_dependency_sql, (dep, ))
+            row = await cursor.fetchone()
+            # the dependency is new or was recreated, copy everything
+            last_id = 0 if row is None or row[0] != generation else row[1]
+
+            cursor = await self._con.execute('SELECT IFNULL(MAX(id), 0) FROM dependency.Generation')
+            max_id, = await cursor.fetchone() # type: ignore
+
+            if max_id != last_id:
+                await self._con.execute(self._bootstrap_sql, (last_id, max_id))
+                await self._con.execute(self._put_dependency_sql, (dep, generation, max_id))
+                await self._ensure_commit()
+        finally:
+            await self._con.execute('DETACH DATABASE dependency')
+
+    async def _migrate(self) -> None:
+        """Convert a database from a previous layout to the current layout.
+
+        Rows from version 0 are keyed on just the prompt. They are moved into the
+        `Generation` table without a config or model id, and are adopted by the
+        first request for the same prompt, see `get`.
+        """
+        cursor = await self._con.execute('PRAGMA user_version')
+        version, = await cursor.fetchone() # type: ignore
+        if version == self._version:
+            return
+
+        cursor = await self._con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = set(name for name, in await cursor.fetchall())
+
+        await self._con.create_function('cache_key', 3, _cache_key, deterministic=True)
+        await self._con.create_function('compress', 1, _compress, deterministic=True)
+
+        if 'Cache' in tables:
+            await self._con.execute(self._setup_sql)
+            await self._con.execute(self._migrate_v0_sql)
+            await self._con.execute('DROP TABLE Cache')
+
+        await self._con.execute(f'PRAGMA user_version = {self._version}')
+
+    async def __aiter__(self) -> AsyncIterator[tuple[str, GenerateConfig|None, GenerateResponse|GenerateError]]:
+        cursor = await self._con.execute(self._iter_sql)
+        async for row in cursor:
+            prompt, config, response, duration, error = row
+            yield (
+                _decompress(prompt),
+                None if config is None else json.loads(config),
+                self._unpack_results(response, duration, error)
+            )
+
+    def _make_put_parameters(self, prompt: str, config: GenerateConfig,
+                             answer: GenerateResponse|GenerateError) -> dict[str, str|bytes|float|None]:
+        normalized_config = _normalize_config(config)
+        key = _cache_key(prompt, normalized_config, self._model_id)
+
         match answer:
             case GenerateError():
-                await self._con.execute(self._put_sql, {
-                    'prompt': prompt,
+                return {
+                    'key': key,
+                    'prompt': _compress(prompt),
+                    'config': normalized_config,
+                    'model_id': self._model_id,
                     'response': None,
                     'duration': None,
                     'error': pickle.dumps(answer),
                     'traceback': ''.join(format_exception(answer)),
-                })
+                }
 
             case _:
-                await self._con.execute(self._put_sql, {
-                    'prompt': prompt,
-                    'response': answer['response'],
+                return {
+                    'key': key,
+                    'prompt': _compress(prompt),
+                    'config': normalized_config,
+                    'model_id': self._model_id,
+                    'response': _compress(answer['response']),
                     'duration': answer['duration'],
                     'error': None,
                     'traceback': None
-                })
+                }
+
+    async def put(self, prompt: str, config: GenerateConfig, answer: GenerateResponse|GenerateError) -> None:
+        """Add or update an entry to the database
+
+        Concurrent calls to `put` are written to the database as one batch.
 
-        self._transactions_queued += 1
-        self._maybe_commit()
+        Args:
+            prompt (str): Prompt sent to generative model
+            config (GenerateConfig): The config used to generate the answer
+            answer (GenerateResponse, GenerateError): Answer by generative model
+        """
+        await self.put_many([(prompt, config, answer)])
+
+    async def put_many(self, entries: Sequence[tuple[str, GenerateConfig, GenerateResponse|GenerateError]]) -> None:
+        """Add or update multiple entries to the database
 
-    async def has(self, prompt: str) -> bool:
+        Args:
+            entries (Sequence[tuple[str, GenerateConfig, GenerateResponse|GenerateError]]):
+                List of (prompt, config, answer) tuples.
+        """
+        writes = []
+        for prompt, config, answer in entries:
+            parameters = self._make_put_parameters(prompt, config, answer)
+            if self.memory is not None:
+                self.memory.put(parameters['key'], answer, _answer_size(answer))
+            writes.append((self._put_sql, parameters))
+
+        await self._write(writes)
+
+    async def has(self, prompt: str, config: GenerateConfig) -> bool:
         """Check if observation exists
 
         Args:
             prompt (str): Prompt sent to generative model
+            config (GenerateConfig): The config used to generate the answer
 
         Returns:
             bool: True if the observation exists.
         """
-        cursor = await self._con.execute(self._has_sql, (prompt, ))
-        exists, = await cursor.fetchone() # type: ignore
-        return exists == 1
+        exists, = await self.has_many([(prompt, config)])
+        return exists
+
+    async def has_many(self, entries: Sequence[tuple[str, GenerateConfig]]) -> list[bool]:
+        """Check if multiple observations exists
+
+        Args:
+            entries (Sequence[tuple[str, GenerateConfig]]): List of (prompt, config) tuples.
+
+        Returns:
+            list[bool]: For each entry, True if the observation exists.
+        """
+        keys = [_cache_key(prompt, _normalize_config(config), self._model_id) for prompt, config in entries]
 
-    async def get(self, prompt: str) -> GenerateResponse|GenerateError|None:
-        """Get entry by index
+        missing_keys = keys
+        if self.memory is not None:
+            missing_keys = [key for key in keys if key not in self.memory]
+
+        found_keys = set(key for key, in await self._select_in(self._has_sql, missing_keys))
+        return [
+            key in found_keys or (self.memory is not None and key in self.memory)
+            for key in keys
+        ]
+
+    async def get(self, prompt: str, config: GenerateConfig) -> GenerateResponse|GenerateError|None:
+        """Get entry by prompt and config
+
+        If there is no entry, but there is a legacy entry for the prompt (without a config),
+        then the legacy entry is adopted by this config and returned.
+
+        If the in-process LRU cache is enabled, it is checked before the database.
 
         Args:
             prompt (str): Prompt sent to generative model
+            config (GenerateConfig): The config used to generate the answer
+
+        Returns:
+            GenerateResponse|GenerateError|None: If the entry exists, return
+                the answer. Otherwise, return None.
+        """
+        answer, = await self.get_many([(prompt, config)])
+        return answer
+
+    async def get_many(self, entries: Sequence[tuple[str, GenerateConfig]]) -> list[GenerateResponse|GenerateError|None]:
+        """Get multiple entries by prompt and config
+
+        See `get` for details.
+
+        Args:
+            entries (Sequence[tuple[str, GenerateConfig]]): List of (prompt, config) tuples.
 
         Returns:
-            tuple[str, float]|None: If the entry exists, return
-                a (answer, duration) tuple.
-                Otherwise, return None.
+            list[GenerateResponse|GenerateError|None]: For each entry, the answer if it exists.
+                Otherwise, None.
         """
-        cursor = await self._con.execute(self._get_sql, (prompt, ))
-        results = await cursor.fetchone()
-        if results is None:
-            return None
+        normalized_configs = [_normalize_config(config) for _, config in entries]
+        keys = [
+            _cache_key(prompt, normalized_config, self._model_id)
+            for (prompt, _), normalized_config in zip(entries, normalized_configs)
+        ]
+        answers: dict[bytes, GenerateResponse|GenerateError] = {}
+
+        # read from memory
+        if self.memory is not None:
+            for key in keys:
+                answer = self.memory.get(key)
+                if answer is not None:
+                    answers[key] = answer
+
+        # read from database
+        missing_keys = [key for key in keys if key not in answers]
+        for key, response, duration, error in await self._select_in(self._get_sql, missing_keys):
+            answers[key] = self._unpack_results(response, duration, error)
+            if self.memory is not None:
+                self.memory.put(key, answers[key], _answer_size(answers[key]))
+
+        # read and adopt legacy entries
+        missing = [
+            (key, _cache_key(prompt, None, None), normalized_config)
+            for key, (prompt, _), normalized_config in zip(keys, entries, normalized_configs)
+            if key not in answers
+        ]
+        if len(missing) > 0:
+            # the same prompt can be requested with several configs
+            legacy_to_keys: dict[bytes, dict[bytes, str]] = {}
+            for key, legacy_key, normalized_config in missing:
+                legacy_to_keys.setdefault(legacy_key, {})[key] = normalized_config
+
+            # The legacy entry is adopted by the first config, the other configs get a copy.
+            # The copies are written first, as the adoption changes the key of the legacy entry.
+            copy, adopt = [], []
+            for legacy_key, response, duration, error in await self._select_in(self._get_sql, list(legacy_to_keys.keys())):
+                for i, (key, normalized_config) in enumerate(legacy_to_keys[legacy_key].items()):
+                    answers[key] = self._unpack_results(response, duration, error)
+                    if self.memory is not None:
+                        self.memory.put(key, answers[key], _answer_size(answers[key]))
+                    parameters = {
+                        'key': key,
+                        'config': normalized_config,
+                        'model_id': self._model_id,
+                        'legacy_key': legacy_key
+                    }
+                    if i == 0:
+                        adopt.append((self._adopt_legacy_sql, parameters))
+                    else:
+                        copy.append((self._copy_legacy_sql, parameters))
+            await self._write(copy + adopt)
 
-        return self._unpack_results(*results)
+        return [answers.get(key) for key in keys]
 
-    def _unpack_results(self, response: str|None, duration: float|None, error: bytes|None) -> GenerateResponse|GenerateError:
+    def _unpack_results(self, response: bytes|None, duration: float|None, error: bytes|None) -> GenerateResponse|GenerateError:
         if error is not None:
             return pickle.loads(error)
         if response is None or duration is None:
             raise IOError(f'unexpected database content: {response=}, {duration=}')
 
         return {
-            'response': response,
+            'response': _decompress(response), # type: ignore
             'duration': duration
         }
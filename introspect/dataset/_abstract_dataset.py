@@ -1,4 +1,6 @@
 import pathlib
+import os
+import shutil
 from functools import cached_property
 from abc import ABCMeta, abstractmethod
 from typing import Any, TypeVar, Sequence, Generic
@@ -15,6 +17,11 @@ class AbstractDataset(Generic[ObservationType], metaclass=ABCMeta):
 
     _persistent_dir: pathlib.Path
     _features: datasets.Features
+    _processed: dict[DatasetSplits, datasets.Dataset]
+    _idx_to_row: dict[DatasetSplits, dict[int, int]]
+
+    # Increment when _restructure changes, to invalidate the processed splits stored on disk
+    _restructure_version: int = 1
 
     _split_train: str
     _split_valid: str
@@ -30,6 +37,8 @@ class AbstractDataset(Generic[ObservationType], metaclass=ABCMeta):
         self._builder_cache = self._builder(cache_dir=persistent_dir / 'cache' / 'datasets')
         self._persistent_dir = persistent_dir
         self._seed = seed
+        self._processed = {}
+        self._idx_to_row = {}
 
         if not isinstance(self.info.features, datasets.Features):
             raise ValueError('this dataset does not have features defined')
@@ -57,13 +66,58 @@ class AbstractDataset(Generic[ObservationType], metaclass=ABCMeta):
         """
         self._builder_cache.download_and_prepare()
 
-    def _process_dataset(self, dataset: datasets.Dataset) -> Sequence[ObservationType]:
+    def _processed_filepath(self, split: DatasetSplits) -> pathlib.Path:
+        return self._persistent_dir / 'cache' / 'processed' / f'{self.name}_p-{split}_s-{self._seed}_v-{self._restructure_version}'
+
+    def _process_dataset(self, dataset: datasets.Dataset) -> datasets.Dataset:
         return dataset \
             .map(self._restructure, with_indices=True, features=self._features, remove_columns=dataset.column_names) \
-            .shuffle(seed=self._seed) # type: ignore
+            .shuffle(seed=self._seed) \
+            .flatten_indices()
+
+    def _load_split(self, split: DatasetSplits, dataset_idx: int) -> Sequence[ObservationType]:
+        """Get the restructured and shuffled split
+
+        The processed split is stored as an Arrow file in the persistent directory, and is
+        memory-mapped on subsequent calls. The shuffled order is written to disk
+        (flatten_indices), such that iteration is sequential. Without a seed the
+        shuffle is random, so the processed split is not stored.
+        """
+        if split in self._processed:
+            return self._processed[split] # type: ignore
+
+        filepath = self._processed_filepath(split)
+        if self._seed is not None and filepath.exists():
+            processed = datasets.load_from_disk(str(filepath))
+        else:
+            processed = self._process_dataset(self._datasets[dataset_idx])
+
+            if self._seed is not None:
+                # Save to a temporary directory first, such that concurrent jobs
+                # never observe a partially written dataset.
+                tmp_filepath = filepath.with_name(f'{filepath.name}.tmp-{os.getpid()}')
+                processed.save_to_disk(str(tmp_filepath))
+                try:
+                    os.rename(tmp_filepath, filepath)
+                except OSError:
+                    # another job already stored the processed dataset
+                    shutil.rmtree(tmp_filepath, ignore_errors=True)
+                processed = datasets.load_from_disk(str(filepath))
+
+        self._processed[split] = processed # type: ignore
+        return processed # type: ignore
+
+    def num_examples(self, split: DatasetSplits, shard: tuple[int, int]|None = None):
+        """Number of observations for a given split
+
+        Args:
+            split (DatasetSplits): Dataset split
+            shard (tuple[int, int] | None, optional): Only count a shard of the split, see `split`.
+                Defaults to None.
+        """
+        if shard is not None:
+            return len(self.split(split, shard))
 
-    def num_examples(self, split: DatasetSplits):
-        """Number of observations for a given split"""
         match split:
             case 'train':
                 return self.train_num_examples
@@ -74,22 +128,80 @@ class AbstractDataset(Generic[ObservationType], metaclass=ABCMeta):
             case _:
                 raise ValueError(f'split {split} is not supported')
 
-    def split(self, split: DatasetSplits) -> Sequence[ObservationType]:
-        """Get observations for a given split"""
+    def split(self, split: DatasetSplits, shard: tuple[int, int]|None = None) -> Sequence[ObservationType]:
+        """Get observations for a given split
+
+        Args:
+            split (DatasetSplits): Dataset split
+            shard (tuple[int, int] | None, optional): If provided, only return the (index, count) shard.
+                The shards are contiguous partitions of the shuffled split, so they are deterministic
+                given the seed. Defaults to None.
+        """
         match split:
             case 'train':
-                return self.train()
+                observations = self.train()
             case 'valid':
-                return self.valid()
+                observations = self.valid()
             case 'test':
-                return self.test()
+                observations = self.test()
             case _:
                 raise ValueError(f'split {split} is not supported')
 
+        if shard is None:
+            return observations
+
+        index, count = shard
+        return observations.shard(num_shards=count, index=index, contiguous=True) # type: ignore
+
+    def _split_index(self, split: DatasetSplits) -> dict[int, int]:
+        if split not in self._idx_to_row:
+            self._idx_to_row[split] = {
+                idx: row for row, idx in enumerate(self.split(split)['idx']) # type: ignore
+            }
+        return self._idx_to_row[split]
+
+    def get(self, split: DatasetSplits, idx: int) -> ObservationType:
+        """Get an observation by its index
+
+        Args:
+            split (DatasetSplits): Dataset split
+            idx (int): Observation index
+
+        Raises:
+            ValueError: If the observation does not exist.
+
+        Returns:
+            ObservationType: The observation
+        """
+        observation, = self.get_many(split, [idx])
+        return observation
+
+    def get_many(self, split: DatasetSplits, idxs: Sequence[int]) -> list[ObservationType]:
+        """Get multiple observations by their index
+
+        Args:
+            split (DatasetSplits): Dataset split
+            idxs (Sequence[int]): Observation indices
+
+        Raises:
+            ValueError: If an observation does not exist.
+
+        Returns:
+            list[ObservationType]: The observations, in the same order as idxs.
+        """
+        index = self._split_index(split)
+        rows = []
+        for idx in idxs:
+            if idx not in index:
+                raise ValueError(f'observation with idx {idx} does not exist in the {split} split')
+            rows.append(index[idx])
+
+        return list(self.split(split).select(rows)) # type: ignore
+
     def train(self) -> Sequence[ObservationType]:
         """Get training dataset
         """
-        return self._process_dataset(self._datasets[0])
+        return self._load_split(DatasetSplits.TRAIN, 0)
 
     @property
     def train_num_examples(self) -> int:
@@ -100,7 +212,7 @@ class AbstractDataset(Generic[ObservationType], metaclass=ABCMeta):
     def valid(self) -> Sequence[ObservationType]:
         """Validation dataset
         """
-        return self._process_dataset(self._datasets[1])
+        return self._load_split(DatasetSplits.VALID, 1)
     @property
     def valid_num_examples(self) -> int:
         """Number of validation obsevations
@@ -110,7 +222,7 @@ class AbstractDataset(Generic[ObservationType], metaclass=ABCMeta):
     def test(self) -> Sequence[ObservationType]:
         """Test dataset
         """
-        return self._process_dataset(self._datasets[2])
+        return self._load_split(DatasetSplits.TEST, 2)
 
     @property
     def test_num_examples(self) -> int:
@@ -1,5 +1,6 @@
 
 from abc import ABCMeta, abstractmethod
+from typing import Callable
 
 from ..types import ChatHistory, GenerateConfig, GenerateResponse, SystemMessage
 from ..client import AbstractClient
@@ -79,7 +80,7 @@ class AbstractModel(metaclass=ABCMeta):
     def _render_prompt(self, history: ChatHistory) -> str:
         ...
 
-    async def generate_text(self, history: ChatHistory) -> GenerateResponse:
+    async def generate_text(self, history: ChatHistory, early_stop: Callable[[str], bool]|None = None) -> GenerateResponse:
         """Run inference, using the prompt generated from the message history.
 
         If the prompt is in the cache, the cache is used.
@@ -87,6 +88,9 @@ class AbstractModel(metaclass=ABCMeta):
         Args:
             history (ChatHistory): A structured history. See `help(self.render_prompt)`
                 for details.
+            early_stop (Callable[[str], bool] | None, optional): Stop the generation when
+                this returns True for the generated text. Only used if the client streams.
+                Defaults to None.
 
         Raises:
             RuntimeError: If a `client` was not provided to the constructor and the
@@ -97,7 +101,7 @@ class AbstractModel(metaclass=ABCMeta):
         """
         prompt = self.render_prompt(history)
 
-        answer = await self._client.generate(prompt, self.config)
+        answer = await self._client.generate(prompt, self.config, early_stop=early_stop)
 
         if self._debug:
             print(f'PROMPT: 「{prompt}」')
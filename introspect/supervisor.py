@@ -0,0 +1,346 @@
+
+# The supervisor is started before the python environment is created, so it
+# runs with the system python. It therefore only uses the standard library and
+# avoids syntax that is not supported by older python versions.
+#
+# Example:
+#   python -m introspect.supervisor --max-restarts 5 \
+#       --endpoint http://127.0.0.1:8080 --state-file tgi-state.json \
+#       -- bash tgi-sing/tgi-server-mila.sh
+
+from typing import Dict, List, Optional, Sequence
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+SUPERVISOR_STATES = ('starting', 'ready', 'restarting', 'stopped', 'failed')
+
+# TGI metrics, which are used to detect a hang
+TGI_COMPLETED_METRICS = ('tgi_request_success', 'tgi_request_failure')
+TGI_PENDING_METRICS = ('tgi_queue_size', 'tgi_batch_current_size')
+
+def read_supervisor_state(filepath: 'os.PathLike[str]|str') -> Optional[Dict]:
+    """Read the state published by the supervisor
+
+    Args:
+        filepath (os.PathLike | str): The state file of the supervisor.
+
+    Returns:
+        Optional[Dict]: The state, or None if the supervisor has not published a state yet.
+    """
+    try:
+        with open(filepath, 'r') as fp:
+            return json.load(fp)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def parse_prometheus_text(text: str) -> Dict[str, float]:
+    """Parse metrics in the Prometheus text format
+
+    Samples with the same metric name, but different labels, are summed.
+
+    Args:
+        text (str): The metrics in the Prometheus text format.
+
+    Returns:
+        Dict[str, float]: The summed value of each metric.
+    """
+    metrics = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if len(line) == 0 or line.startswith('#'):
+            continue
+
+        if '{' in line:
+            name, rest = line.split('{', 1)
+            rest = rest.rsplit('}', 1)[1]
+        else:
+            name, rest = line.split(None, 1)
+
+        try:
+            value = float(rest.split()[0])
+        except (IndexError, ValueError):
+            continue
+        metrics[name] = metrics.get(name, 0.0) + value
+    return metrics
+
+class Supervisor:
+    """Runs the inference server, and restarts it when it crashes or hangs
+
+    The server is considered ready once /health responds. It is restarted if:
+    * The command exits, for example because of an OOM error.
+    * /health does not respond within startup_timeout_sec after starting.
+    * /health stops responding for unhealthy_timeout_sec.
+    * /metrics reports pending requests, but no requests completed for hang_timeout_sec.
+
+    Between restarts, there is an exponential backoff. The state of the supervisor
+    is written to a JSON file, such that clients can pause sending requests while
+    the server is restarting.
+
+    A SIGINT or SIGTERM is forwarded as a SIGTERM to the command, which is then
+    not restarted.
+    """
+    def __init__(self, command: Sequence[str], endpoint: str, state_file: Optional[str] = None,
+                 max_restarts: int=5, poll_interval_sec: float=5,
+                 startup_timeout_sec: float=60*60, unhealthy_timeout_sec: float=60,
+                 hang_timeout_sec: Optional[float] = 10*60, request_timeout_sec: float=10,
+                 min_backoff_sec: float=1, max_backoff_sec: float=60, kill_timeout_sec: float=30) -> None:
+        """Create a supervisor
+
+        Args:
+            command (Sequence[str]): The command that runs the inference server.
+            endpoint (str): The url of the server. For example: "http://localhost:8080"
+            state_file (Optional[str], optional): Where the state is published. Defaults to None.
+            max_restarts (int, optional): The number of times the server is restarted. Defaults to 5.
+            poll_interval_sec (float, optional): How often the server is checked. Defaults to 5.
+            startup_timeout_sec (float, optional): How long the server can take to become healthy. Defaults to 60*60.
+            unhealthy_timeout_sec (float, optional): How long a ready server can fail the health check. Defaults to 60.
+            hang_timeout_sec (Optional[float], optional): How long requests can be pending without any request
+                completing. If None, hangs are not detected. Defaults to 10*60.
+            request_timeout_sec (float, optional): Timeout of the /health and /metrics requests. Defaults to 10.
+            min_backoff_sec (float, optional): Delay before the first restart. Defaults to 1.
+            max_backoff_sec (float, optional): Maximum delay before a restart. Defaults to 60.
+            kill_timeout_sec (float, optional): How long to wait after SIGTERM, before sending SIGKILL. Defaults to 30.
+        """
+        self._command = list(command)
+        self._endpoint = endpoint.rstrip('/')
+        self._state_file = state_file
+        self._max_restarts = max_restarts
+        self._poll_interval_sec = poll_interval_sec
+        self._startup_timeout_sec = startup_timeout_sec
+        self._unhealthy_timeout_sec = unhealthy_timeout_sec
+        self._hang_timeout_sec = hang_timeout_sec
+        self._request_timeout_sec = request_timeout_sec
+        self._min_backoff_sec = min_backoff_sec
+        self._max_backoff_sec = max_backoff_sec
+        self._kill_timeout_sec = kill_timeout_sec
+
+        self.state = 'starting'
+        self.restarts = 0
+        self._process = None # type: Optional[subprocess.Popen]
+        self._stopping = threading.Event()
+        self._last_completed = None # type: Optional[float]
+        self._last_progress_time = 0.0
+
+    def _log(self, message: str) -> None:
+        print('[supervisor] ' + message, flush=True)
+
+    def _publish(self, state: str, reason: Optional[str] = None) -> None:
+        """Write the state atomically, such that a partial file is never read"""
+        self.state = state
+        self._log('state is ' + state + ('' if reason is None else ': ' + reason))
+        if self._state_file is None:
+            return
+
+        tmp_filepath = os.path.join(os.path.dirname(os.path.abspath(self._state_file)),
+                                    '.' + os.path.basename(self._state_file) + '.tmp')
+        with open(tmp_filepath, 'w') as fp:
+            json.dump({
+                'state': state,
+                'reason': reason,
+                'restarts': self.restarts,
+                'pid': None if self._process is None else self._process.pid,
+                'time': time.time()
+            }, fp)
+        os.replace(tmp_filepath, self._state_file)
+
+    def _request(self, path: str) -> Optional[str]:
+        try:
+            with urllib.request.urlopen(self._endpoint + path, timeout=self._request_timeout_sec) as response:
+                return response.read().decode('utf-8')
+        except (urllib.error.URLError, OSError, ValueError):
+            return None
+
+    def _is_healthy(self) -> bool:
+        return self._request('/health') is not None
+
+    def _is_hanging(self, now: float) -> bool:
+        """Check if requests are pending, but no requests are completing
+
+        If the server does not expose the TGI metrics, a hang is never detected.
+        """
+        if self._hang_timeout_sec is None:
+            return False
+
+        text = self._request('/metrics')
+        if text is None:
+            return False
+        metrics = parse_prometheus_text(text)
+        if not any(name in metrics for name in TGI_PENDING_METRICS):
+            return False
+
+        completed = sum(metrics.get(name, 0.0) for name in TGI_COMPLETED_METRICS)
+        pending = sum(metrics.get(name, 0.0) for name in TGI_PENDING_METRICS)
+        if completed != self._last_completed or pending == 0:
+            self._last_completed = completed
+            self._last_progress_time = now
+            return False
+
+        return now - self._last_progress_time > self._hang_timeout_sec
+
+    def _start(self) -> None:
+        # The command gets its own process group, such that the entire
+        # process tree (e.g. the TGI launcher and its shards) can be terminated.
+        self._process = subprocess.Popen(self._command, start_new_session=True)
+        self._last_completed = None
+        self._last_progress_time = time.monotonic()
+        self._publish('starting')
+
+    def _watch(self) -> Optional[str]:
+        """Wait until the server should be restarted
+
+        Returns:
+            Optional[str]: Why the server should be restarted, or None if the supervisor is stopping.
+        """
+        assert self._process is not None
+        start_time = time.monotonic()
+        last_healthy_time = start_time
+        is_ready = False
+
+        while not self._stopping.is_set():
+            exit_code = self._process.poll()
+            if exit_code is not None:
+                if exit_code < 0:
+                    return 'the command was killed by signal ' + str(-exit_code)
+                return 'the command exited with code ' + str(exit_code)
+
+            now = time.monotonic()
+            if self._is_healthy():
+                last_healthy_time = now
+                if not is_ready:
+                    is_ready = True
+                    self._publish('ready')
+                if self._is_hanging(now):
+                    return 'no requests completed for ' + str(self._hang_timeout_sec) + ' seconds'
+            elif not is_ready and now - start_time > self._startup_timeout_sec:
+                return 'the server did not become healthy within ' + str(self._startup_timeout_sec) + ' seconds'
+            elif is_ready and now - last_healthy_time > self._unhealthy_timeout_sec:
+                return 'the server was unhealthy for ' + str(self._unhealthy_timeout_sec) + ' seconds'
+
+            self._stopping.wait(self._poll_interval_sec)
+
+        return None
+
+    def _terminate(self) -> None:
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            try:
+                os.killpg(self._process.pid, signal.SIGTERM)
+                self._process.wait(timeout=self._kill_timeout_sec)
+            except subprocess.TimeoutExpired:
+                self._log('the command did not terminate, sending SIGKILL')
+                os.killpg(self._process.pid, signal.SIGKILL)
+                self._process.wait()
+            except ProcessLookupError:
+                self._process.wait()
+
+    def stop(self) -> None:
+        """Stop the server, and do not restart it"""
+        self._stopping.set()
+
+    def _handle_signal(self, signum, frame) -> None:
+        self._log('received signal ' + str(signum) + ', terminating the command')
+        self.stop()
+
+    def run(self) -> int:
+        """Run the server until it is stopped, or the restarts are exhausted
+
+        Returns:
+            int: Exit code, 0 if stopped and 1 if the restarts were exhausted.
+        """
+        previous_handlers = {
+            signum: signal.signal(signum, self._handle_signal)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+
+        # consecutive restarts, where the server did not become ready
+        attempt = 0
+        try:
+            while True:
+                self._start()
+                reason = self._watch()
+                if self.state == 'ready':
+                    attempt = 0
+                self._terminate()
+
+                if self._stopping.is_set():
+                    self._publish('stopped')
+                    return 0
+                if self.restarts >= self._max_restarts:
+                    self._publish('failed', reason)
+                    return 1
+
+                self._publish('restarting', reason)
+                delay = min(self._min_backoff_sec * 2 ** attempt, self._max_backoff_sec)
+                attempt += 1
+                self.restarts += 1
+                if self._stopping.wait(delay):
+                    self._publish('stopped')
+                    return 0
+        finally:
+            self._terminate()
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Run an inference server, and restart it when it crashes or hangs')
+    parser.add_argument('--endpoint',
+                        action='store',
+                        default='http://127.0.0.1:' + os.environ.get('PORT', '8080'),
+                        type=str,
+                        help='The url of the server, used for /health and /metrics')
+    parser.add_argument('--state-file',
+                        action='store',
+                        default=os.environ.get('SUPERVISOR_STATE_FILE'),
+                        type=str,
+                        help='Where the supervisor state is published, clients pause while the server is not ready')
+    parser.add_argument('--max-restarts',
+                        action='store',
+                        default=5,
+                        type=int,
+                        help='The number of times the server is restarted')
+    parser.add_argument('--poll-interval',
+                        action='store',
+                        default=5,
+                        type=float,
+                        help='How often the server is checked, in seconds')
+    parser.add_argument('--startup-timeout',
+                        action='store',
+                        default=60*60,
+                        type=float,
+                        help='How long the server can take to become healthy, in seconds')
+    parser.add_argument('--unhealthy-timeout',
+                        action='store',
+                        default=60,
+                        type=float,
+                        help='How long a ready server can fail the health check, in seconds')
+    parser.add_argument('--hang-timeout',
+                        action='store',
+                        default=10*60,
+                        type=float,
+                        help='How long requests can be pending without any completing, in seconds. 0 disables hang detection')
+    parser.add_argument('command',
+                        nargs=argparse.REMAINDER,
+                        help='The command that runs the server, optionally preceded by --')
+    args = parser.parse_args(argv)
+
+    command = args.command[1:] if len(args.command) > 0 and args.command[0] == '--' else args.command
+    if len(command) == 0:
+        parser.error('a command is required')
+
+    supervisor = Supervisor(command, args.endpoint, state_file=args.state_file,
+                            max_restarts=args.max_restarts, poll_interval_sec=args.poll_interval,
+                            startup_timeout_sec=args.startup_timeout, unhealthy_timeout_sec=args.unhealthy_timeout,
+                            hang_timeout_sec=args.hang_timeout if args.hang_timeout > 0 else None)
+    return supervisor.run()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -34,10 +34,11 @@ class AbstractTask(Generic[DatasetType, ObservationType, PartialTaskResultType,
         a task (answerable, counterfactual, or redacted). In addition to the overall
         task, additional configurations can be provided with the config option.
 
-        A task will query the provided model, possibly several times. However, the
-        queries are resicted to one query at a time. This is such that higher level
-        paralization routines, can make accuate assumptions about the number of
-        parallel queries.
+        A task will query the provided model, possibly several times. Queries that do
+        not depend on each other are sent concurrently, see `RequestCapture.step`.
+        Higher level paralization routines should therefore not assume one query at
+        a time per task. Instead, the number of parallel queries is limited by the
+        client, see the `max_connections` and `concurrency` arguments of the client.
 
         Args:
             model (AbstractModel): The model which is used to query prompts.
@@ -96,7 +97,10 @@ class AbstractTask(Generic[DatasetType, ObservationType, PartialTaskResultType,
             IntrospectResult | FaithfulResult: the task response.
         """
         capture = RequestCapture(self._model)
-        partial_result = await self._task(observation, capture)
+        try:
+            partial_result = await self._task(observation, capture)
+        finally:
+            await capture.close()
         return self._make_task_result(partial_result, {
             'label': observation['label'],
             'duration': capture.duration
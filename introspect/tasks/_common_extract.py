@@ -14,6 +14,11 @@ def extract_ability(source: str) -> Literal['yes', 'no']|None:
             ability = None
     return ability
 
+def is_ability_definitive(source: str) -> bool:
+    """Returns True when more generated text can not change the result of `extract_ability`"""
+    source = source.strip().lower()
+    return not any(option.startswith(source) for option in ('yes', 'yes.', 'no', 'no.'))
+
 def _remove_html(paragraph: str) -> str:
     # Remove HTML, primarily by Falcon
     paragraph = replace_contains((
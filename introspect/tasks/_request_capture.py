@@ -1,13 +1,48 @@
 
+import asyncio
+from typing import Any, Callable, Coroutine, TypeVar
+
 from introspect.types import ChatHistory
 from introspect.model import AbstractModel
 
+StepType = TypeVar('StepType')
+
 class RequestCapture:
+    _steps: list[asyncio.Task]
+
     def __init__(self, model: AbstractModel) -> None:
         self.duration: float = 0
         self._model = model
+        self._steps = []
 
-    async def __call__(self, history: ChatHistory) -> str:
-        answer = await self._model.generate_text(history)
+    async def __call__(self, history: ChatHistory, early_stop: Callable[[str], bool]|None = None) -> str:
+        answer = await self._model.generate_text(history, early_stop=early_stop)
         self.duration += answer['duration']
         return answer['response'].strip()
+
+    def step(self, query: Coroutine[Any, Any, StepType]) -> asyncio.Task[StepType]:
+        """Start a generation step, which runs concurrently with the rest of the task
+
+        The steps of a task form a dependency graph, where a step that depends on
+        another step awaits it. Independent steps, such as classifying the paragraph
+        and generating the explanation, are then sent to the server concurrently.
+
+        The task must await the step. If the task fails before that, the step
+        is cancelled by `close`.
+
+        Args:
+            query (Coroutine[Any, Any, StepType]): The generation step.
+
+        Returns:
+            asyncio.Task[StepType]: The running step.
+        """
+        step = asyncio.create_task(query)
+        self._steps.append(step)
+        return step
+
+    async def close(self) -> None:
+        """Cancel the steps that have not completed"""
+        for step in self._steps:
+            step.cancel()
+        await asyncio.gather(*self._steps, return_exceptions=True)
+        self._steps = []
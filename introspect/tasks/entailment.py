@@ -16,7 +16,7 @@ from ._abstract_tasks import \
     ClassifyTask, IntrospectTask, FaithfulTask, \
     TaskResultType, PartialTaskResultType
 from ._request_capture import RequestCapture
-from ._common_extract import extract_ability, extract_paragraph, extract_list_content
+from ._common_extract import extract_ability, is_ability_definitive, extract_paragraph, extract_list_content
 from ._common_process import process_redact_words
 from ._common_match import match_contains
 
@@ -148,9 +148,7 @@ class EntailmentAnswerableTask(IntrospectTask[EntailmentDataset, EntailmentObser
         hypothesis = observation['hypothesis']
         paragraph = observation['paragraph']
 
-        entailment_prompt, entailment_answer = await self._query_entailment(hypothesis, paragraph, generate_text)
-        entailment = self._extract_entailment(entailment_answer)
-        correct = self._process_is_correct(observation, entailment)
+        predict_step = generate_text.step(self._query_entailment(hypothesis, paragraph, generate_text))
 
         ability_prompt = ''
         if self._is_enabled('i-persona-you'):
@@ -174,8 +172,12 @@ class EntailmentAnswerableTask(IntrospectTask[EntailmentDataset, EntailmentObser
                 'user': ability_prompt,
                 'assistant': None
             }
-        ])
+        ], early_stop=is_ability_definitive)
         ability = extract_ability(ability_answer)
+
+        entailment_prompt, entailment_answer = await predict_step
+        entailment = self._extract_entailment(entailment_answer)
+        correct = self._process_is_correct(observation, entailment)
         introspect = self._process_is_introspect(ability, entailment)
 
         return {
@@ -198,9 +200,7 @@ class EntailmentCounterfactualTask(FaithfulTask[EntailmentDataset, EntailmentObs
         hypothesis = observation['hypothesis']
         paragraph = observation['paragraph']
 
-        entailment_prompt, entailment_answer = await self._query_entailment(hypothesis, paragraph, generate_text)
-        entailment = self._extract_entailment(entailment_answer)
-        correct = self._process_is_correct(observation, entailment)
+        predict_step = generate_text.step(self._query_entailment(hypothesis, paragraph, generate_text))
 
         opposite_entailment = self._make_counterfactual_entailment(observation['label'])
         counterfactual_prompt = ''
@@ -245,6 +245,10 @@ class EntailmentCounterfactualTask(FaithfulTask[EntailmentDataset, EntailmentObs
         if counterfactual_entailment is not None:
             faithful = counterfactual_entailment == opposite_entailment
 
+        entailment_prompt, entailment_answer = await predict_step
+        entailment = self._extract_entailment(entailment_answer)
+        correct = self._process_is_correct(observation, entailment)
+
         return {
             'debug': f'Hypothesis: {hypothesis}\nParagraph: {paragraph}.',
             'predict_prompt': entailment_prompt,
@@ -268,9 +272,7 @@ class EntailmentRedactedTask(FaithfulTask[EntailmentDataset, EntailmentObservati
         hypothesis = observation['hypothesis']
         paragraph = observation['paragraph']
 
-        entailment_prompt, entailment_answer = await self._query_entailment(hypothesis, paragraph, generate_text)
-        entailment = self._extract_entailment(entailment_answer)
-        correct = self._process_is_correct(observation, entailment)
+        predict_step = generate_text.step(self._query_entailment(hypothesis, paragraph, generate_text))
 
         redacted_prompt = ''
         if self._is_enabled('e-short'):
@@ -319,6 +321,10 @@ class EntailmentRedactedTask(FaithfulTask[EntailmentDataset, EntailmentObservati
         if redacted_entailment is not None:
             faithful = redacted_entailment == 'unknown' or redacted_entailment == 'neutral'
 
+        entailment_prompt, entailment_answer = await predict_step
+        entailment = self._extract_entailment(entailment_answer)
+        correct = self._process_is_correct(observation, entailment)
+
         return {
             'debug': f'Statement: {hypothesis}\nParagraph: {paragraph}.',
             'predict_prompt': entailment_prompt,
@@ -342,9 +348,7 @@ class EntailmentImportanceTask(FaithfulTask[EntailmentDataset, EntailmentObserva
         hypothesis = observation['hypothesis']
         paragraph = observation['paragraph']
 
-        entailment_prompt, entailment_answer = await self._query_entailment(hypothesis, paragraph, generate_text)
-        entailment = self._extract_entailment(entailment_answer)
-        correct = self._process_is_correct(observation, entailment)
+        predict_step = generate_text.step(self._query_entailment(hypothesis, paragraph, generate_text))
 
         importance_prompt = ''
         importance_prompt += f'List the most important words in the following paragraph, for determining if the statement "{hypothesis}" entails from it,'
@@ -385,6 +389,10 @@ class EntailmentImportanceTask(FaithfulTask[EntailmentDataset, EntailmentObserva
         if important_words is not None and redacted is not None:
             explain = json.dumps(important_words) + '\n\n' + redacted
 
+        entailment_prompt, entailment_answer = await predict_step
+        entailment = self._extract_entailment(entailment_answer)
+        correct = self._process_is_correct(observation, entailment)
+
         return {
             'debug': f'Hypothesis: {hypothesis}\nParagraph: {paragraph}.',
             'predict_prompt': entailment_prompt,
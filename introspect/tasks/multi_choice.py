@@ -16,7 +16,7 @@ from ..types import \
     PartialClassifyResult, ClassifyResult, \
     PartialIntrospectResult, IntrospectResult, \
     PartialFaithfulResult, FaithfulResult
-from ._common_extract import extract_ability, extract_paragraph, extract_list_content
+from ._common_extract import extract_ability, is_ability_definitive, extract_paragraph, extract_list_content
 from ._common_process import process_redact_words
 from ._common_match import match_contains
 
@@ -157,9 +157,7 @@ class MultiChoiceAnswerableTask(IntrospectTask[MultiChoiceDataset, MultiChoiceOb
         choices = observation['choices']
         paragraph = observation['paragraph']
 
-        choice_prompt, choice_answer = await self._query_choice(question, choices, paragraph, generate_text)
-        choice = self._extract_choice(observation['choices'], choice_answer)
-        correct = self._process_is_correct(observation, choice)
+        predict_step = generate_text.step(self._query_choice(question, choices, paragraph, generate_text))
 
         ability_prompt = ''
         if self._is_enabled('i-persona-you'):
@@ -183,8 +181,12 @@ class MultiChoiceAnswerableTask(IntrospectTask[MultiChoiceDataset, MultiChoiceOb
                 'user': ability_prompt,
                 'assistant': None
             }
-        ])
+        ], early_stop=is_ability_definitive)
         ability = extract_ability(ability_answer)
+
+        choice_prompt, choice_answer = await predict_step
+        choice = self._extract_choice(observation['choices'], choice_answer)
+        correct = self._process_is_correct(observation, choice)
         introspect = self._process_is_introspect(ability, choice)
 
         return {
@@ -208,9 +210,7 @@ class MultiChoiceCounterfactualTask(FaithfulTask[MultiChoiceDataset, MultiChoice
         choices = observation['choices']
         paragraph = observation['paragraph']
 
-        choice_prompt, choice_answer = await self._query_choice(question, choices, paragraph, generate_text)
-        choice = self._extract_choice(observation['choices'], choice_answer)
-        correct = self._process_is_correct(observation, choice)
+        predict_step = generate_text.step(self._query_choice(question, choices, paragraph, generate_text))
 
         alternative_choice = self._make_alternative_choice(choices, observation['label'])
 
@@ -260,6 +260,10 @@ class MultiChoiceCounterfactualTask(FaithfulTask[MultiChoiceDataset, MultiChoice
             else:
                 faithful = counterfactual_choice == alternative_choice
 
+        choice_prompt, choice_answer = await predict_step
+        choice = self._extract_choice(observation['choices'], choice_answer)
+        correct = self._process_is_correct(observation, choice)
+
         return {
             'debug': f'Question: {question}.\nOptions: {choices}\nAlternative: {alternative_choice}\nParagraph: {paragraph}',
             'predict_prompt': choice_prompt,
@@ -284,9 +288,7 @@ class MultiChoiceRedactedTask(FaithfulTask[MultiChoiceDataset, MultiChoiceObserv
         choices = observation['choices']
         paragraph = observation['paragraph']
 
-        choice_prompt, choice_answer = await self._query_choice(question, choices, paragraph, generate_text)
-        choice = self._extract_choice(observation['choices'], choice_answer)
-        correct = self._process_is_correct(observation, choice)
+        predict_step = generate_text.step(self._query_choice(question, choices, paragraph, generate_text))
 
         redacted_prompt = ''
         if self._is_enabled('e-short'):
@@ -334,6 +336,10 @@ class MultiChoiceRedactedTask(FaithfulTask[MultiChoiceDataset, MultiChoiceObserv
         if redacted_choice is not None:
             faithful = redacted_choice == 'unknown'
 
+        choice_prompt, choice_answer = await predict_step
+        choice = self._extract_choice(observation['choices'], choice_answer)
+        correct = self._process_is_correct(observation, choice)
+
         return {
             'debug': f'Question: {question}.\nParagraph: {paragraph}',
             'predict_prompt': choice_prompt,
@@ -358,9 +364,7 @@ class MultiChoiceImportanceTask(FaithfulTask[MultiChoiceDataset, MultiChoiceObse
         choices = observation['choices']
         paragraph = observation['paragraph']
 
-        choice_prompt, choice_answer = await self._query_choice(question, choices, paragraph, generate_text)
-        choice = self._extract_choice(observation['choices'], choice_answer)
-        correct = self._process_is_correct(observation, choice)
+        predict_step = generate_text.step(self._query_choice(question, choices, paragraph, generate_text))
 
         importance_prompt = ''
         importance_prompt += f'List the most important words for answering "{question}" given the following paragraph,'
@@ -401,6 +405,10 @@ class MultiChoiceImportanceTask(FaithfulTask[MultiChoiceDataset, MultiChoiceObse
         if important_words is not None and redacted is not None:
             explain = json.dumps(important_words) + '\n\n' + redacted
 
+        choice_prompt, choice_answer = await predict_step
+        choice = self._extract_choice(observation['choices'], choice_answer)
+        correct = self._process_is_correct(observation, choice)
+
         return {
             'debug': f'Question: {question}.\nParagraph: {paragraph}',
             'predict_prompt': choice_prompt,
@@ -15,7 +15,7 @@ from ._abstract_tasks import \
     ClassifyTask, IntrospectTask, FaithfulTask, \
     TaskResultType, PartialTaskResultType
 from ._request_capture import RequestCapture
-from ._common_extract import extract_ability, extract_paragraph, extract_list_content
+from ._common_extract import extract_ability, is_ability_definitive, extract_paragraph, extract_list_content
 from ._common_process import process_redact_words
 from ._common_match import match_contains, match_pair_match, match_startwith
 
@@ -164,9 +164,7 @@ class SentimentAnswerableTask(IntrospectTask[SentimentDataset, SentimentObservat
     async def _task(self, observation: SentimentObservation, generate_text: RequestCapture) -> PartialIntrospectSentimentResult:
         paragraph = observation['text']
 
-        sentiment_prompt, sentiment_answer = await self._query_sentiment(paragraph, generate_text)
-        sentiment = self._extract_sentiment(sentiment_answer)
-        correct = self._process_is_correct(observation, sentiment)
+        predict_step = generate_text.step(self._query_sentiment(paragraph, generate_text))
 
         ability_prompt = ''
         if self._is_enabled('i-persona-you'):
@@ -190,8 +188,12 @@ class SentimentAnswerableTask(IntrospectTask[SentimentDataset, SentimentObservat
                 'user': ability_prompt,
                 'assistant': None
             }
-        ])
+        ], early_stop=is_ability_definitive)
         ability = extract_ability(ability_answer)
+
+        sentiment_prompt, sentiment_answer = await predict_step
+        sentiment = self._extract_sentiment(sentiment_answer)
+        correct = self._process_is_correct(observation, sentiment)
         introspect = self._process_is_introspect(ability, sentiment)
 
         return {
@@ -213,9 +215,7 @@ class SentimentCounterfactualTask(FaithfulTask[SentimentDataset, SentimentObserv
     async def _task(self, observation: SentimentObservation, generate_text: RequestCapture) -> PartialFaithfulSentimentResult:
         paragraph = observation['text']
 
-        sentiment_prompt, sentiment_answer = await self._query_sentiment(paragraph, generate_text)
-        sentiment = self._extract_sentiment(sentiment_answer)
-        correct = self._process_is_correct(observation, sentiment)
+        predict_step = generate_text.step(self._query_sentiment(paragraph, generate_text))
 
         opposite_sentiment = self._make_counterfactual_sentiment(observation['label'])
         counterfactual_prompt = ''
@@ -259,6 +259,10 @@ class SentimentCounterfactualTask(FaithfulTask[SentimentDataset, SentimentObserv
         if counterfactual_sentiment is not None:
             faithful = counterfactual_sentiment == opposite_sentiment
 
+        sentiment_prompt, sentiment_answer = await predict_step
+        sentiment = self._extract_sentiment(sentiment_answer)
+        correct = self._process_is_correct(observation, sentiment)
+
         return {
             'debug': paragraph,
             'predict_prompt': sentiment_prompt,
@@ -281,9 +285,7 @@ class SentimentRedactedTask(FaithfulTask[SentimentDataset, SentimentObservation]
     async def _task(self, observation: SentimentObservation, generate_text: RequestCapture) -> PartialFaithfulSentimentResult:
         paragraph = observation['text']
 
-        sentiment_prompt, sentiment_answer = await self._query_sentiment(paragraph, generate_text)
-        sentiment = self._extract_sentiment(sentiment_answer)
-        correct = self._process_is_correct(observation, sentiment)
+        predict_step = generate_text.step(self._query_sentiment(paragraph, generate_text))
 
         redacted_prompt = ''
         if self._is_enabled('e-short'):
@@ -332,6 +334,10 @@ class SentimentRedactedTask(FaithfulTask[SentimentDataset, SentimentObservation]
         if redacted_sentiment is not None:
             faithful = redacted_sentiment == 'unknown' or redacted_sentiment == 'neutral'
 
+        sentiment_prompt, sentiment_answer = await predict_step
+        sentiment = self._extract_sentiment(sentiment_answer)
+        correct = self._process_is_correct(observation, sentiment)
+
         return {
             'debug': paragraph,
             'predict_prompt': sentiment_prompt,
@@ -354,9 +360,7 @@ class SentimentImportanceTask(FaithfulTask[SentimentDataset, SentimentObservatio
     async def _task(self, observation: SentimentObservation, generate_text: RequestCapture) -> PartialFaithfulSentimentResult:
         paragraph = observation['text']
 
-        sentiment_prompt, sentiment_answer = await self._query_sentiment(paragraph, generate_text)
-        sentiment = self._extract_sentiment(sentiment_answer)
-        correct = self._process_is_correct(observation, sentiment)
+        predict_step = generate_text.step(self._query_sentiment(paragraph, generate_text))
 
         importance_prompt = ''
         importance_prompt += 'List the most important words for determining the sentiment of the following paragraph,'
@@ -397,6 +401,10 @@ class SentimentImportanceTask(FaithfulTask[SentimentDataset, SentimentObservatio
         if important_words is not None and redacted is not None:
             explain = json.dumps(important_words) + '\n\n' + redacted
 
+        sentiment_prompt, sentiment_answer = await predict_step
+        sentiment = self._extract_sentiment(sentiment_answer)
+        correct = self._process_is_correct(observation, sentiment)
+
         return {
             'debug': paragraph,
             'predict_prompt': sentiment_prompt,
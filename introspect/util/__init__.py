@@ -1,11 +1,12 @@
 
-__all__ = ['AsyncMap', 'generate_experiment_id',
+__all__ = ['AsyncMap', 'generate_experiment_id', 'parse_shard',
            'default_model_id', 'default_model_type', 'default_system_message',
-           'cancel_eventloop_on_signal']
+           'cancel_eventloop_on_signal', 'MetricsExporter']
 
 import sys as _sys
 
 from .experiment_id import generate_experiment_id
+from .shard import parse_shard
 from .default_args import default_model_id, default_model_type, default_system_message
 
 # On the login node, python is not new enough to support some features
@@ -15,3 +16,4 @@ from .default_args import default_model_id, default_model_type, default_system_m
 if _sys.version_info >= (3, 11):
     from .async_map import AsyncMapIterable as AsyncMap
     from .signal_handler import cancel_eventloop_on_signal
+    from .metrics_exporter import MetricsExporter
@@ -1,7 +1,10 @@
 
 import asyncio
+import heapq
+import itertools
 from typing import Any, TypeVar, Callable
 from asyncio import Task
+from collections import deque
 from collections.abc import AsyncIterable, AsyncIterator, Iterator, Iterable, Sized, Coroutine
 
 YieldInType = TypeVar('YieldInType')
@@ -10,8 +13,15 @@ YieldOutType = TypeVar('YieldOutType')
 class AsyncMapIterable(AsyncIterable[YieldOutType]):
     def __init__(self,
                  worker: Callable[[YieldInType], Coroutine[Any, Any, YieldOutType]],
-                 queue: Iterable[YieldInType],
-                 max_tasks: int=8) -> None:
+                 queue: Iterable[YieldInType]|AsyncIterable[YieldInType],
+                 max_tasks: int=8,
+                 ordered: bool=False,
+                 reorder_buffer: int|None = None,
+                 priority: Callable[[YieldInType], Any]|None = None,
+                 priority_window: int|None = None,
+                 prefetch: int|None = None,
+                 timeout: float|None = None,
+                 return_exceptions: bool=False) -> None:
         """Maps over the queue using the async worker. It runs `max_tasks` workers in parallel.
 
         Example:
@@ -21,16 +31,55 @@ class AsyncMapIterable(AsyncIterable[YieldOutType]):
         Args:
             worker (Callable[[YieldInType], Awaitable[YieldOutType]): An async map function,
                 this maps from YieldInType to YieldOutType
-            queue (Iterable[YieldInType]): An regular iterable which describes the jobs.
+            queue (Iterable[YieldInType] | AsyncIterable[YieldInType]): An regular or async iterable
+                which describes the jobs.
             max_tasks (int, optional): The maximum number of async workers to run in parallel.
                 Defaults to 8.
+            ordered (bool, optional): Yield the results in the order of the queue, instead of the
+                order they complete. Defaults to False.
+            reorder_buffer (int | None, optional): When ordered, the number of completed results that
+                can wait for an earlier job. When the buffer is full, no new jobs are started until the
+                earliest job completes. Defaults to None (max_tasks).
+            priority (Callable[[YieldInType], Any] | None, optional): Start the jobs with the lowest
+                priority(job) first, instead of in the order of the queue. Defaults to None.
+            priority_window (int | None, optional): The number of upcoming jobs, that are ordered by
+                priority. Defaults to None (the entire queue).
+            prefetch (int | None, optional): For an async iterable, the number of jobs that are read
+                ahead of the workers. When the prefetch buffer is full, the async iterable is not
+                advanced until a worker takes a job. Defaults to None (max_tasks).
+            timeout (float | None, optional): The maximum duration of each job. A job that takes
+                longer fails with a TimeoutError. Defaults to None (no timeout).
+            return_exceptions (bool, optional): Yield the exception of a failed job as its result,
+                instead of cancelling all jobs and raising the exception. Defaults to False.
         """
+        if ordered and priority is not None:
+            raise ValueError('ordered and priority can not be used together')
+        if priority is not None and isinstance(queue, AsyncIterable):
+            raise ValueError('priority can not be used with an async iterable')
+
         self._queue = queue
         self._worker = worker
         self._max_tasks = max_tasks
+        self._ordered = ordered
+        self._reorder_buffer = max_tasks if reorder_buffer is None else reorder_buffer
+        self._priority = priority
+        self._priority_window = priority_window
+        self._prefetch = max_tasks if prefetch is None else prefetch
+        self._timeout = timeout
+        self._return_exceptions = return_exceptions
 
     def __aiter__(self):
-        return AsyncMapIterator(self._worker, iter(self._queue), max_tasks=self._max_tasks)
+        if isinstance(self._queue, AsyncIterable):
+            queue = aiter(self._queue)
+        else:
+            queue = iter(self._queue)
+            if self._priority is not None:
+                queue = PriorityIterator(queue, self._priority, window=self._priority_window)
+
+        return AsyncMapIterator(self._worker, queue, max_tasks=self._max_tasks,
+                                ordered=self._ordered, reorder_buffer=self._reorder_buffer,
+                                prefetch=self._prefetch, timeout=self._timeout,
+                                return_exceptions=self._return_exceptions)
 
     def __len__(self):
         if isinstance(self._queue, Sized):
@@ -38,30 +87,102 @@ class AsyncMapIterable(AsyncIterable[YieldOutType]):
         else:
             raise NotImplementedError
 
+class PriorityIterator(Iterator[YieldInType]):
+    _heap: list[tuple[Any, int, YieldInType]]
+
+    def __init__(self, queue: Iterator[YieldInType], priority: Callable[[YieldInType], Any],
+                 window: int|None = None) -> None:
+        """Yields the jobs with the lowest priority first
+
+        Jobs with the same priority are yielded in the order of the queue.
+
+        Args:
+            queue (Iterator[YieldInType]): The jobs.
+            priority (Callable[[YieldInType], Any]): The priority of a job, lower is first.
+            window (int | None, optional): The number of upcoming jobs, that are ordered by
+                priority. Defaults to None (the entire queue).
+        """
+        self._queue = queue
+        self._priority = priority
+        self._window = window
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __next__(self) -> YieldInType:
+        for job in itertools.islice(self._queue, None if self._window is None else self._window - len(self._heap)):
+            heapq.heappush(self._heap, (self._priority(job), next(self._counter), job))
+
+        if len(self._heap) == 0:
+            raise StopIteration
+        _, _, job = heapq.heappop(self._heap)
+        return job
+
 class AsyncMapIterator(AsyncIterator[YieldOutType]):
     _tasks: set[Task[YieldOutType]]
+    _done: asyncio.Queue[Task[YieldOutType]|None]
+    _order: deque[Task[YieldOutType]]
+    _jobs: asyncio.Queue[YieldInType]
 
     def __init__(self,
                  worker: Callable[[YieldInType], Coroutine[Any, Any, YieldOutType]],
-                 queue: Iterator[YieldInType],
-                 max_tasks: int=8) -> None:
-        self._queue: Iterator[YieldInType] = queue
+                 queue: Iterator[YieldInType]|AsyncIterator[YieldInType],
+                 max_tasks: int=8,
+                 ordered: bool=False,
+                 reorder_buffer: int=0,
+                 prefetch: int=8,
+                 timeout: float|None = None,
+                 return_exceptions: bool=False) -> None:
         self._worker = worker
         self._max_tasks = max_tasks
+        self._ordered = ordered
+        # When unordered, completed results are yielded immediately, so there is nothing to buffer
+        self._reorder_buffer = reorder_buffer if ordered else 0
+        self._timeout = timeout
+        self._return_exceptions = return_exceptions
         self._tasks = set()
+        # Finished tasks are pushed by a done-callback, in completion order. This avoids
+        # asyncio.wait, which adds and removes a callback on every pending task for every result.
+        # None is pushed when the producer has read a job from an async iterable, or is exhausted.
+        self._done = asyncio.Queue()
+        # When ordered, the tasks in the order they were started
+        self._order = deque()
+        self._running = 0
         self._is_canceled = False
+        self._is_exhausted = False
 
-        for _ in range(self._max_tasks):
-            self._start_next_task()
+        # An async iterable is read by a producer task, into a bounded queue of jobs
+        self._producer = None
+        if isinstance(queue, AsyncIterator):
+            self._queue = iter([])
+            self._jobs = asyncio.Queue(maxsize=max(prefetch, 1))
+            self._producer = asyncio.create_task(self._produce(queue))
+        else:
+            self._queue: Iterator[YieldInType] = queue
+
+        self._fill()
+
+    async def _produce(self, queue: AsyncIterator[YieldInType]) -> None:
+        try:
+            async for job in queue:
+                # blocks while the prefetch buffer is full
+                await self._jobs.put(job)
+                self._fill()
+                self._done.put_nowait(None)
+        finally:
+            self._done.put_nowait(None)
 
     def _cancel(self) -> None:
         self._is_canceled = True
         # dereference queue to prevent memory leaks
         self._queue = [] # type: ignore
+        if self._producer is not None:
+            self._producer.cancel()
+            self._producer = None
 
         for task in self._tasks:
             task.cancel()
         self._tasks = set()
+        self._order = deque()
 
     def _collect_exceptions(self) -> Exception|None:
         all_exceptions = []
@@ -81,38 +202,128 @@ class AsyncMapIterator(AsyncIterator[YieldOutType]):
             case _:
                 return ExceptionGroup('AsyncMap detected multiple exceptions', all_exceptions)
 
-    def _start_next_task(self) -> None:
+    def _on_done(self, task: Task[YieldOutType]) -> None:
+        self._running -= 1
+        self._done.put_nowait(task)
+
+    def _next_job(self) -> tuple[bool, YieldInType|None]:
+        if self._producer is None:
             try:
-                job = next(self._queue)
+                return (True, next(self._queue))
             except StopIteration:
-                return
+                self._is_exhausted = True
+                return (False, None)
 
-            self._tasks.add(asyncio.create_task(self._worker(job)))
+        try:
+            return (True, self._jobs.get_nowait())
+        except asyncio.QueueEmpty:
+            self._is_exhausted = self._producer.done()
+            return (False, None)
 
-    async def __anext__(self) -> YieldOutType:
-        if len(self._tasks) == 0 or self._is_canceled:
-            raise StopAsyncIteration
+    def _start_next_task(self) -> bool:
+            has_job, job = self._next_job()
+            if not has_job:
+                return False
+
+            if self._timeout is None:
+                task = asyncio.create_task(self._worker(job)) # type: ignore
+            else:
+                task = asyncio.create_task(asyncio.wait_for(self._worker(job), self._timeout)) # type: ignore
+            task.add_done_callback(self._on_done)
+            self._tasks.add(task)
+            self._running += 1
+            if self._ordered:
+                self._order.append(task)
+            return True
+
+    def _fill(self) -> None:
+        """Start jobs until max_tasks are running, or the reorder buffer is full"""
+        while self._running < self._max_tasks and \
+              len(self._tasks) < self._max_tasks + self._reorder_buffer and \
+              self._start_next_task():
+            pass
 
-        done, _ = await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
-        finished_task = done.pop()
-        has_exception = finished_task.exception() is not None
+    def _raise_if_failed(self, task: Task[YieldOutType]|None) -> None:
+        if task is None:
+            # The producer read a job, or stopped. If it stopped because
+            # the async iterable raised an exception, stop the map.
+            if self._producer is not None and self._producer.done() and \
+               not self._producer.cancelled() and self._producer.exception() is not None:
+                exception = self._producer.exception()
+                self._cancel()
+                raise exception # type: ignore
+            self._fill()
+            return
 
         # An true exception happend or the task is cancelled (CancelledError)
-        if has_exception:
-            exception = self._collect_exceptions()
-            self._cancel()
+        if self._return_exceptions or (not task.cancelled() and task.exception() is None):
+            return
+
+        exception = self._collect_exceptions()
+        self._cancel()
+
+        # There are no exceptions from any tasks, so just raise the CancelledError
+        if exception is None:
+            task.result()
+
+        # There is at least one exception, so raise it/them
+        raise exception # type: ignore
+
+    async def _next_started(self) -> None:
+        """Wait until a job is started, or raise StopAsyncIteration if all jobs are completed"""
+        while len(self._tasks) == 0:
+            if self._is_canceled or self._is_exhausted:
+                raise StopAsyncIteration
+            self._raise_if_failed(await self._done.get())
+            self._fill()
 
-            # There are no exceptions from any tasks, so just raise the CancelledError
-            if exception is None:
-                return await finished_task
+    async def _next_completed(self) -> Task[YieldOutType]:
+        while True:
+            finished_task = await self._done.get()
+            self._raise_if_failed(finished_task)
+            if finished_task is not None:
+                return finished_task
 
-            # There is at least one exception, so raise it/them
-            raise exception
+    async def _next_ordered(self) -> Task[YieldOutType]:
+        head = self._order[0]
+        while True:
+            # Drain the completed tasks, such that failures are detected early
+            while not self._done.empty():
+                self._raise_if_failed(self._done.get_nowait())
+            if head.done():
+                break
+
+            # Completed tasks that are not the head, wait in the reorder buffer. Since they
+            # are no longer running, more jobs can be started if the buffer is not full.
+            self._fill()
+            self._raise_if_failed(await self._done.get())
+
+        self._raise_if_failed(head)
+        self._order.popleft()
+        return head
+
+    def _result(self, task: Task[YieldOutType]) -> YieldOutType:
+        if self._return_exceptions:
+            if task.cancelled():
+                return asyncio.CancelledError() # type: ignore
+            if task.exception() is not None:
+                return task.exception() # type: ignore
+        return task.result()
+
+    async def __anext__(self) -> YieldOutType:
+        if self._is_canceled:
+            raise StopAsyncIteration
+        await self._next_started()
+
+        if self._ordered:
+            finished_task = await self._next_ordered()
+        else:
+            finished_task = await self._next_completed()
 
         # Not cancelled, no exception from task. Continue.
         # Note, other tasks may still have exceptions, but we will learn about
         # those in the next iteration.
         self._tasks.remove(finished_task)
-        self._start_next_task()
+        self._fill()
 
-        return await finished_task
+        return self._result(finished_task)
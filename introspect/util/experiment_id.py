@@ -1,11 +1,11 @@
 
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 def generate_experiment_id(name: str,
                            model: Optional[str] = None, system_message: Optional[str] = None,
                            dataset: Optional[str] = None, split: Optional[str] = None,
                            task: Optional[str] = None, task_config: Optional[List[str]] = None,
-                           seed: Optional[int] = None):
+                           seed: Optional[int] = None, shard: Optional[Tuple[int, int]] = None):
     """Creates a standardized experiment name.
 
     The format is
@@ -21,6 +21,7 @@ def generate_experiment_id(name: str,
         task (str, optional): the task to run.
         task_config (list[str], optional): the configuration options for this task.
         seed (int, optional): the generation seed.
+        shard (tuple[int, int], optional): the (index, count) of the dataset shard.
     Returns:
         str: the experiment identifier
     """
@@ -39,5 +40,7 @@ def generate_experiment_id(name: str,
         experiment_id += f"_c-{'-'.join(sorted(task_config))}"
     if isinstance(seed, int):
         experiment_id += f"_s-{seed}"
+    if isinstance(shard, tuple):
+        experiment_id += f"_h-{shard[0]}of{shard[1]}"
 
     return experiment_id.lower()
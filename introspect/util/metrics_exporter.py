@@ -0,0 +1,179 @@
+
+import asyncio
+import os
+import pathlib
+from typing import Self
+from timeit import default_timer as timer
+
+from aiohttp import web
+
+from ..client import AbstractClient
+from ..client._metrics import Histogram
+from ..tasks._aggregator import AbstractAggregator
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if len(labels) == 0:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + '}'
+
+class MetricsExporter:
+    """Exposes the progress of one or more experiments in the Prometheus text format
+
+    The metrics can be served over HTTP at /metrics, and/or be written periodically
+    to a textfile, which can be collected by the node-exporter textfile collector.
+    If neither a port nor a textfile is provided, the exporter does nothing.
+    """
+    _lines: list[str]
+
+    def __init__(self, client: AbstractClient, aggregators: dict[str, AbstractAggregator],
+                 labels: dict[str, str] = {}, port: int|None = None,
+                 textfile: pathlib.Path|None = None, interval_sec: float=15) -> None:
+        """Create a metrics exporter
+
+        Args:
+            client (AbstractClient): The client, used for request and cache metrics.
+            aggregators (dict[str, AbstractAggregator]): The aggregators by experiment id, used for
+                observation metrics. The experiment id is added as the "experiment" label.
+            labels (dict[str, str], optional): Labels added to all metrics. Defaults to {}.
+            port (int | None, optional): Serve the metrics over HTTP on this port. Defaults to None.
+            textfile (pathlib.Path | None, optional): Write the metrics to this file. Defaults to None.
+            interval_sec (float, optional): How often the textfile is written. Defaults to 15.
+        """
+        self._client = client
+        self._aggregators = aggregators
+        self._labels = labels
+        self._port = port
+        self._textfile = textfile
+        self._interval_sec = interval_sec
+
+        self._runner = None
+        self._writer = None
+        self._last_totals = {}
+        self._last_time = None
+        self._rates = {}
+
+    def _metric(self, name: str, kind: str, help: str, values: list[tuple[dict[str, str], float|int]]) -> None:
+        self._lines.append(f'# HELP {name} {help}')
+        self._lines.append(f'# TYPE {name} {kind}')
+        for labels, value in values:
+            self._lines.append(f'{name}{_format_labels({**self._labels, **labels})} {value}')
+
+    def _histogram(self, name: str, help: str, histogram: Histogram) -> None:
+        self._lines.append(f'# HELP {name} {help}')
+        self._lines.append(f'# TYPE {name} histogram')
+        cumulative = 0
+        for upper_bound, count in zip(histogram.buckets, histogram.bucket_counts):
+            cumulative += count
+            self._lines.append(f'{name}_bucket{_format_labels({**self._labels, "le": f"{upper_bound:g}"})} {cumulative}')
+        self._lines.append(f'{name}_bucket{_format_labels({**self._labels, "le": "+Inf"})} {histogram.count}')
+        self._lines.append(f'{name}_sum{_format_labels(self._labels)} {histogram.sum}')
+        self._lines.append(f'{name}_count{_format_labels(self._labels)} {histogram.count}')
+
+    def _update_rates(self, totals: dict[str, int]) -> dict[str, float]:
+        now = timer()
+        if self._last_time is not None and now > self._last_time:
+            self._rates = {
+                experiment: (total - self._last_totals[experiment]) / (now - self._last_time)
+                for experiment, total in totals.items()
+            }
+        self._last_totals = totals
+        self._last_time = now
+        return { experiment: self._rates.get(experiment, 0.0) for experiment in totals }
+
+    def render(self) -> str:
+        """Render the current metrics in the Prometheus text format"""
+        self._lines = []
+        metrics = self._client.metrics
+        all_results = {
+            experiment: {
+                name: value for name, value in aggregator.results.items()
+                if isinstance(value, int)
+            }
+            for experiment, aggregator in self._aggregators.items()
+        }
+        rates = self._update_rates({ experiment: results['total'] for experiment, results in all_results.items() })
+
+        self._metric('introspect_observations_total', 'counter', 'Number of processed observations',
+                     [({'experiment': experiment}, results['total']) for experiment, results in all_results.items()])
+        self._metric('introspect_observations_per_second', 'gauge', 'Processed observations per second, since the last scrape',
+                     [({'experiment': experiment}, rate) for experiment, rate in rates.items()])
+        self._metric('introspect_results', 'gauge', 'Aggregated result counts, such as correct, missmatch, and error',
+                     [({'experiment': experiment, 'result': name}, value)
+                      for experiment, results in all_results.items() for name, value in results.items()])
+
+        self._metric('introspect_client_inflight', 'gauge', 'Number of requests currently sent to the server',
+                     [({}, metrics.inflight)])
+        for name, help, value in [
+            ('requests', 'Number of generate requests', metrics.requests),
+            ('cache_hits', 'Requests answered by the cache', metrics.cache_hits),
+            ('cache_misses', 'Requests not in the cache', metrics.cache_misses),
+            ('coalesced', 'Requests that shared a concurrent identical generation', metrics.coalesced),
+            ('generated', 'Requests sent to the server', metrics.generated),
+            ('early_stops', 'Generations that were stopped early', metrics.early_stops),
+            ('errors', 'Generations that failed with a GenerateError', metrics.errors),
+            ('retries', 'Generations that were retried because the server disconnected', metrics.retries),
+            ('reconnects', 'Number of times the connection was lost', metrics.reconnects)
+        ]:
+            self._metric(f'introspect_client_{name}_total', 'counter', help, [({}, value)])
+
+        self._histogram('introspect_client_latency_seconds', 'Request latency', metrics.latency)
+        self._histogram('introspect_client_queue_seconds', 'Server queue time', metrics.queue_time)
+        self._histogram('introspect_client_wait_seconds', 'Client-side wait for limits', metrics.client_wait)
+
+        return '\n'.join(self._lines) + '\n'
+
+    def write_textfile(self) -> None:
+        """Write the metrics to the textfile, atomically such a partial file is never collected"""
+        if self._textfile is None:
+            return
+        tmp_filepath = self._textfile.with_name(f'.{self._textfile.name}.tmp')
+        with open(tmp_filepath, 'w') as fp:
+            fp.write(self.render())
+        os.replace(tmp_filepath, self._textfile)
+
+    async def _write_periodically(self) -> None:
+        while True:
+            self.write_textfile()
+            await asyncio.sleep(self._interval_sec)
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self) -> None:
+        """Start the HTTP server and textfile writer
+
+        Likely this should not be used directly. Instead, use `async with`.
+        """
+        if self._port is not None:
+            app = web.Application()
+            app.router.add_get('/metrics', self._handle_metrics)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, port=self._port).start()
+
+        if self._textfile is not None:
+            self._writer = asyncio.create_task(self._write_periodically())
+
+    async def stop(self) -> None:
+        """Stop the HTTP server and textfile writer, the textfile is written a final time
+
+        Likely this should not be used directly. Instead, use `async with`.
+        """
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+            self.write_textfile()
+
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
@@ -0,0 +1,26 @@
+import argparse
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """Parses a shard definition
+
+    The format is "{index}/{count}", where index is zero-based. For example,
+    "0/4" is the first of four shards.
+
+    Args:
+        shard (str): the shard definition.
+
+    Raises:
+        argparse.ArgumentTypeError: if the definition is invalid.
+
+    Returns:
+        tuple[int, int]: (index, count) tuple.
+    """
+    try:
+        index, count = map(int, shard.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'shard "{shard}" must have the format "index/count"')
+
+    if count < 1 or not (0 <= index < count):
+        raise argparse.ArgumentTypeError(f'shard "{shard}" must satisfy 0 <= index < count')
+
+    return (index, count)
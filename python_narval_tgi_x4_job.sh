@@ -30,11 +30,12 @@ declare -A model_id=( ["llama2-70b"]="meta-llama/Llama-2-70b-chat-hf"
 tgi_port=$(expr 10000 + $(echo -n $SLURM_JOBID | tail -c 4))
 model_name=$(python -c 'import argparse; p = argparse.ArgumentParser(); p.add_argument("--model-name"); print(p.parse_known_args()[0].model_name)' "${@:2}")
 
-# start TGI as a background process
+# start TGI as a background process, the supervisor restarts it if it crashes or hangs
+export SUPERVISOR_STATE_FILE=$SLURM_TMPDIR/tgi-supervisor.json
 MAX_CONCURRENT_REQUESTS=1024  MAX_INPUT_LENGTH=2048 MAX_TOTAL_TOKENS=4096 MAX_BATCH_TOTAL_TOKENS=49152 \
     VALIDATION_WORKERS=4 PORT=$tgi_port \
     MODEL_ID="${model_id[$model_name]}" \
-    MAX_RESTARTS=5 bash monitor.sh bash tgi-sing/tgi-server-cc.sh &> ${LOGDIR}/${SLURM_JOB_NAME}.${SLURM_JOB_ID}.tgi &
+    python -u -m introspect.supervisor --max-restarts 4 --endpoint "http://127.0.0.1:${tgi_port}" -- bash tgi-sing/tgi-server-cc.sh &> ${LOGDIR}/${SLURM_JOB_NAME}.${SLURM_JOB_ID}.tgi &
 TGI_PID=$!
 
 # Create enviorment
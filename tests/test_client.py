@@ -1,10 +1,15 @@
 
+import asyncio
+import json
+
 from pytest_httpserver import HTTPServer
 import pytest
 
 from introspect.database import GenerationCache
 from introspect.types import OfflineError, GenerateResponse
-from introspect.client import OfflineClient, TGIClient, VLLMClient
+from introspect.client import OfflineClient, TGIClient, VLLMClient, BalancedClient, TestClient as CreateTestClient
+from introspect.client._abstract_client import RetryRequest
+from introspect.tasks._common_extract import is_ability_definitive, extract_ability
 
 @pytest.mark.asyncio
 async def test_client_offline_error():
@@ -20,9 +25,8 @@ async def test_client_offline_cache():
     }
 
     async with GenerationCache(':memory:') as cache:
-        await cache.put('USER MESSAGE PROMPT', cached_answer)
-
         client = OfflineClient(cache=cache)
+        await cache.put('USER MESSAGE PROMPT', client.config_with_defaults({}), cached_answer)
 
         # Return cache if exists
         answer = await client.generate('USER MESSAGE PROMPT', {})
@@ -32,6 +36,54 @@ async def test_client_offline_cache():
         with pytest.raises(OfflineError):
             await client.generate('MISSING USER MESSAGE PROMPT: ', {})
 
+@pytest.mark.asyncio
+async def test_client_close_cancels_inflight():
+    started = asyncio.Event()
+
+    async def response(prompt):
+        started.set()
+        await asyncio.sleep(10)
+        return 'RESPONSE'
+
+    async with GenerationCache(':memory:') as cache:
+        client = CreateTestClient(response, cache=cache)
+        request = asyncio.create_task(client.generate('PROMPT', {}))
+        await started.wait()
+
+        # the shared generation continues after the request is cancelled, until the client is closed
+        request.cancel()
+        inflight, = client._inflight.values()
+        await client.close()
+        assert inflight.cancelled()
+        assert client._inflight == {}
+
+@pytest.mark.asyncio
+async def test_client_coalesce_inflight_requests():
+    calls: list[str] = []
+
+    async def response(prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.01)
+        return f'RESPONSE TO {prompt}'
+
+    client = CreateTestClient(response)
+    answer_1, answer_2, answer_3 = await asyncio.gather(
+        client.generate('PROMPT A', {}),
+        client.generate('PROMPT A', {}),
+        client.generate('PROMPT B', {})
+    )
+
+    assert calls == ['PROMPT A', 'PROMPT B']
+    assert answer_1 == answer_2 == { 'response': 'RESPONSE TO PROMPT A', 'duration': 0 }
+    assert answer_3 == { 'response': 'RESPONSE TO PROMPT B', 'duration': 0 }
+
+    # a different config is a different request
+    await asyncio.gather(
+        client.generate('PROMPT A', { 'seed': 0 }),
+        client.generate('PROMPT A', { 'seed': 1 })
+    )
+    assert calls == ['PROMPT A', 'PROMPT B', 'PROMPT A', 'PROMPT A']
+
 @pytest.mark.asyncio
 async def test_client_tgi_request(httpserver: HTTPServer):
     httpserver.expect_request("/health").respond_with_data('')
@@ -41,12 +93,34 @@ async def test_client_tgi_request(httpserver: HTTPServer):
         'X-Inference-Time': '12'
     })
 
-    client = TGIClient(httpserver.url_for(""))
-    answer = await client.generate('MISSING USER MESSAGE PROMPT: ', {})
-    assert answer == {
-        'response': 'MOCK RESPONSE',
-        'duration': 12
-    }
+    async with TGIClient(httpserver.url_for("")) as client:
+        answer = await client.generate('MISSING USER MESSAGE PROMPT: ', {})
+        assert answer == {
+            'response': 'MOCK RESPONSE',
+            'duration': 12
+        }
+
+@pytest.mark.asyncio
+async def test_client_tgi_session_reuse(httpserver: HTTPServer):
+    httpserver.expect_request("/health").respond_with_data('')
+    httpserver.expect_request("/").respond_with_json([{
+        'generated_text': 'MOCK RESPONSE'
+    }], headers={
+        'X-Inference-Time': '12'
+    })
+
+    async with TGIClient(httpserver.url_for(""), max_connections=4) as client:
+        await client.connect()
+        session = client._session
+        assert session is not None
+
+        await client.generate('USER MESSAGE PROMPT 1', {})
+        await client.generate('USER MESSAGE PROMPT 2', {})
+        assert client._session is session
+
+    # the session is closed when leaving the context
+    assert session.closed
+    assert client._session is None
 
 @pytest.mark.asyncio
 async def test_client_tgi_info(httpserver: HTTPServer):
@@ -55,10 +129,10 @@ async def test_client_tgi_info(httpserver: HTTPServer):
         'model_id': 'mock'
     })
 
-    client = TGIClient(httpserver.url_for(""))
-    assert await client.info() == {
-        'model_id': 'mock'
-    }
+    async with TGIClient(httpserver.url_for("")) as client:
+        assert await client.info() == {
+            'model_id': 'mock'
+        }
 
 @pytest.mark.asyncio
 async def test_client_vllm_request(httpserver: HTTPServer):
@@ -66,16 +140,170 @@ async def test_client_vllm_request(httpserver: HTTPServer):
         'text': ['MISSING USER MESSAGE PROMPT: MOCK RESPONSE']
     })
 
-    client = VLLMClient(httpserver.url_for(""))
-    answer = await client.generate('MISSING USER MESSAGE PROMPT: ', {})
-    assert answer == {
-        'response': 'MOCK RESPONSE',
-        'duration': answer['duration']
-    }
-    assert answer['duration'] > 0
+    async with VLLMClient(httpserver.url_for("")) as client:
+        answer = await client.generate('MISSING USER MESSAGE PROMPT: ', {})
+        assert answer == {
+            'response': 'MOCK RESPONSE',
+            'duration': answer['duration']
+        }
+        assert answer['duration'] > 0
 
 @pytest.mark.asyncio
 async def test_client_vllm_info(httpserver: HTTPServer):
-    client = VLLMClient(httpserver.url_for(""))
     httpserver.expect_request("/generate").respond_with_json({ 'text': [''] })
-    assert await client.info() == { }
+    async with VLLMClient(httpserver.url_for("")) as client:
+        assert await client.info() == { }
+
+@pytest.mark.asyncio
+async def test_client_balanced_least_outstanding():
+    calls: list[tuple[str, str]] = []
+
+    def make_response(name):
+        async def response(prompt):
+            calls.append((name, prompt))
+            await asyncio.sleep(0.01)
+            return f'{name} RESPONSE'
+        return response
+
+    async with BalancedClient([
+        CreateTestClient(make_response('A')),
+        CreateTestClient(make_response('B'))
+    ]) as client:
+        await client.connect()
+        answers = await asyncio.gather(*(client.generate(f'PROMPT {i}', {}) for i in range(4)))
+
+        assert sorted(answer['response'] for answer in answers) == ['A RESPONSE'] * 2 + ['B RESPONSE'] * 2
+        assert client.outstanding_requests == [0, 0]
+
+@pytest.mark.asyncio
+async def test_client_balanced_eject_and_recover():
+    is_down = True
+
+    async def failing_response(prompt):
+        if is_down:
+            raise RetryRequest('server crashed')
+        return 'A RESPONSE'
+
+    async def response(prompt):
+        return 'B RESPONSE'
+
+    async with BalancedClient([
+        CreateTestClient(failing_response),
+        CreateTestClient(response)
+    ], health_check_interval_sec=0.01) as client:
+        await client.connect()
+        assert client.healthy == [True, True]
+
+        # the failed request is retried on the healthy endpoint
+        answer = await client.generate('PROMPT 1', {})
+        assert answer['response'] == 'B RESPONSE'
+        assert client.healthy == [False, True]
+
+        # the endpoint is re-admitted when it passes the health check
+        is_down = False
+        await asyncio.sleep(0.05)
+        assert client.healthy == [True, True]
+
+@pytest.mark.asyncio
+async def test_client_tgi_stream(httpserver: HTTPServer):
+    events = [
+        {'token': {'text': 'Yes', 'special': False}},
+        {'token': {'text': ',', 'special': False}},
+        {'token': {'text': ' because', 'special': False}},
+        {'token': {'text': '</s>', 'special': True}}
+    ]
+    httpserver.expect_request("/health").respond_with_data('')
+    httpserver.expect_request("/generate_stream").respond_with_data(
+        ''.join(f'data:{json.dumps(event)}\n\n' for event in events),
+        content_type='text/event-stream'
+    )
+
+    async with TGIClient(httpserver.url_for("")) as client:
+        assert [chunk async for chunk in client.stream('PROMPT', {})] == ['Yes', ',', ' because']
+
+    async with GenerationCache(':memory:') as cache:
+        async with TGIClient(httpserver.url_for(""), cache, stream=True) as client:
+            answer = await client.generate('PROMPT', {}, early_stop=lambda text: text.endswith(','))
+            assert answer['response'] == 'Yes,'
+
+            # early stopped responses are cached separately from complete responses
+            assert await cache.get('PROMPT', client.config_with_defaults({})) is None
+            assert await cache.get('PROMPT', { **client.config_with_defaults({}), 'early_stop': True }) == answer
+
+@pytest.mark.asyncio
+async def test_client_early_stop_requires_stream():
+    consumed: list[str] = []
+
+    class StreamingTestClient(CreateTestClient):
+        async def _generate_stream(self, prompt, config):
+            for chunk in ['No', '.', ' The', ' paragraph']:
+                consumed.append(chunk)
+                yield chunk
+
+    def early_stop(text):
+        return text.endswith('The')
+
+    client = StreamingTestClient({'PROMPT': 'No. The paragraph'})
+    answer = await client.generate('PROMPT', {}, early_stop=early_stop)
+    assert answer['response'] == 'No. The paragraph'
+    assert consumed == []
+
+    client = StreamingTestClient({'PROMPT': 'No. The paragraph'}, stream=True)
+    answer = await client.generate('PROMPT', {}, early_stop=early_stop)
+    assert answer['response'] == 'No. The'
+    assert consumed == ['No', '.', ' The']
+
+@pytest.mark.asyncio
+async def test_client_early_stop_stop_sequence():
+    class StreamingTestClient(CreateTestClient):
+        async def _generate_stream(self, prompt, config):
+            for chunk in self._chunks:
+                yield chunk
+
+    # the partial stop sequence "User" is not passed to early_stop
+    client = StreamingTestClient({'PROMPT': 'Yes\n'}, stream=True)
+    client._chunks = ['Yes', '\n', 'User', ':']
+    answer = await client.generate('PROMPT', { 'stop': ['User:'] }, early_stop=is_ability_definitive)
+    assert answer['response'] == 'Yes\n'
+    assert extract_ability(answer['response'].strip()) == 'yes'
+    assert client.metrics.early_stops == 0
+
+    # text that only looked like the start of a stop sequence is kept
+    client = StreamingTestClient({'PROMPT': 'No, Username'}, stream=True)
+    client._chunks = ['No', ',', ' User', 'name']
+    answer = await client.generate('PROMPT', { 'stop': ['User:'] }, early_stop=lambda text: text.endswith('name'))
+    assert answer['response'] == 'No, Username'
+    assert client.metrics.early_stops == 1
+
+@pytest.mark.asyncio
+async def test_client_early_stop_duration():
+    class StreamingTestClient(CreateTestClient):
+        async def _generate_stream(self, prompt, config):
+            # the request waits in the server queue, before the first token
+            await asyncio.sleep(0.2)
+            for chunk in ['No', '.', ' The', ' paragraph']:
+                yield chunk
+
+    client = StreamingTestClient({'PROMPT': 'No. The paragraph'}, stream=True)
+    answer = await client.generate('PROMPT', {}, early_stop=lambda text: text.endswith('The'))
+    assert answer['response'] == 'No. The'
+    assert answer['duration'] < 0.1
+
+@pytest.mark.asyncio
+async def test_client_early_stop_coalesce_by_predicate():
+    class StreamingTestClient(CreateTestClient):
+        async def _generate_stream(self, prompt, config):
+            for chunk in ['No', '.', ' The', ' paragraph']:
+                await asyncio.sleep(0)
+                yield chunk
+
+    client = StreamingTestClient({'PROMPT': 'No. The paragraph'}, stream=True)
+    answer_1, answer_2, answer_3 = await asyncio.gather(
+        client.generate('PROMPT', {}, early_stop=lambda text: text.endswith('.')),
+        client.generate('PROMPT', {}, early_stop=lambda text: text.endswith('The')),
+        client.generate('PROMPT', {})
+    )
+    assert answer_1['response'] == 'No.'
+    assert answer_2['response'] == 'No. The'
+    assert answer_3['response'] == 'No. The paragraph'
+    assert client.metrics.coalesced == 0
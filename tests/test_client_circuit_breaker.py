@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from introspect.client import TestClient as CreateTestClient
+from introspect.client._abstract_client import RetryRequest
+from introspect.client._circuit_breaker import CircuitBreaker, backoff_delay
+
+def test_backoff_delay():
+    assert backoff_delay(0, 1, 60, jitter=0) == 1
+    assert backoff_delay(3, 1, 60, jitter=0) == 8
+    assert backoff_delay(10, 1, 60, jitter=0) == 60
+    assert 30 <= backoff_delay(10, 1, 60, jitter=0.5) <= 60
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_states():
+    server_is_up = False
+    probes = 0
+
+    async def probe():
+        nonlocal probes
+        probes += 1
+        return server_is_up
+
+    breaker = CircuitBreaker(probe, min_backoff_sec=0.001, max_backoff_sec=0.001)
+    await breaker.acquire()
+    assert breaker.failure() == True
+    assert breaker.failure() == False
+    assert breaker.state == 'open'
+
+    # requests wait while the server is down
+    waiting = [asyncio.create_task(breaker.acquire()) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    assert not any(task.done() for task in waiting)
+    assert probes > 1
+
+    # when the probe succeeds, exactly one request is allowed
+    server_is_up = True
+    await asyncio.sleep(0.05)
+    assert breaker.state == 'half-open'
+    assert sum(task.done() for task in waiting) == 1
+
+    # when that request succeeds, the circuit closes
+    breaker.success()
+    await asyncio.wait_for(asyncio.gather(*waiting), timeout=1)
+    assert breaker.state == 'closed'
+    assert breaker.opens == 1
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_probe_raises():
+    probes = 0
+
+    async def probe():
+        nonlocal probes
+        probes += 1
+        if probes == 1:
+            raise ConnectionResetError('the server disconnected')
+        return True
+
+    breaker = CircuitBreaker(probe, min_backoff_sec=0.001, max_backoff_sec=0.001)
+    breaker.failure()
+
+    # the exception counts as a failed probe, and the recovery continues
+    await asyncio.wait_for(breaker.acquire(), timeout=1)
+    assert probes == 2
+    assert breaker.state == 'half-open'
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_max_opens():
+    async def probe():
+        return True
+
+    breaker = CircuitBreaker(probe, min_backoff_sec=0.001, max_opens=0)
+    breaker.failure()
+    with pytest.raises(IOError):
+        await asyncio.wait_for(breaker.acquire(), timeout=1)
+
+@pytest.mark.asyncio
+async def test_client_retry_after_disconnect():
+    failures = 2
+    calls = 0
+
+    async def response(prompt):
+        nonlocal failures, calls
+        calls += 1
+        if failures > 0:
+            failures -= 1
+            raise RetryRequest('server crashed')
+        return 'RESPONSE'
+
+    client = CreateTestClient(response)
+    client._breaker = CircuitBreaker(client._try_connect, min_backoff_sec=0.001)
+
+    answer = await client.generate('PROMPT', {})
+    assert answer['response'] == 'RESPONSE'
+    assert calls == 3
+    assert client.metrics.retries == 2
+    assert client.metrics.reconnects == 2
+
+@pytest.mark.asyncio
+async def test_client_bounded_retries():
+    async def response(prompt):
+        raise RetryRequest('server crashed')
+
+    async with CreateTestClient(response, max_request_retries=2) as client:
+        client._breaker = CircuitBreaker(client._try_connect, min_backoff_sec=0.001)
+
+        with pytest.raises(IOError):
+            await client.generate('PROMPT', {})
+        assert client.metrics.retries == 3
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from introspect.client import AdaptiveConcurrency, TestClient as CreateTestClient
+
+async def _fill(concurrency: AdaptiveConcurrency):
+    for _ in range(concurrency.limit):
+        await concurrency.acquire()
+
+async def _drain(concurrency: AdaptiveConcurrency, latency: float, duration: float):
+    for _ in range(concurrency.inflight):
+        concurrency.observe(latency, duration)
+        await concurrency.release()
+
+@pytest.mark.asyncio
+async def test_concurrency_slow_start_and_backoff():
+    concurrency = AdaptiveConcurrency(min_limit=1, max_limit=10, max_queue_time_sec=1, backoff=0.5)
+    assert concurrency.limit == 1
+
+    # slow start, increase by one per saturated request
+    for limit in [2, 3, 4]:
+        await _fill(concurrency)
+        await _drain(concurrency, 0.5, 0.5)
+        assert concurrency.limit == limit
+
+    # queueing on the server decreases the limit
+    await _fill(concurrency)
+    concurrency.observe(3, 1)
+    assert concurrency.limit == 2
+    for _ in range(concurrency.inflight):
+        await concurrency.release()
+
+    # additive increase, after slow start
+    assert concurrency.limit == 2
+    for _ in range(4):
+        await _fill(concurrency)
+        await _drain(concurrency, 0.5, 0.5)
+    assert concurrency.limit == 3
+
+@pytest.mark.asyncio
+async def test_concurrency_bounds():
+    concurrency = AdaptiveConcurrency(min_limit=2, max_limit=3)
+    for _ in range(5):
+        await _fill(concurrency)
+        await _drain(concurrency, 0, 0)
+    assert concurrency.limit == 3
+
+    for _ in range(20):
+        concurrency.observe_overload()
+    assert concurrency.limit == 2
+
+@pytest.mark.asyncio
+async def test_concurrency_client_limits_inflight():
+    inflight = 0
+    max_inflight = 0
+
+    async def response(prompt):
+        nonlocal inflight, max_inflight
+        inflight += 1
+        max_inflight = max(max_inflight, inflight)
+        await asyncio.sleep(0.01)
+        inflight -= 1
+        return None
+
+    concurrency = AdaptiveConcurrency(min_limit=1, max_limit=2, max_queue_time_sec=1)
+    client = CreateTestClient(response, concurrency=concurrency)
+    await asyncio.gather(*(client.generate(f'PROMPT {i}', {}) for i in range(6)))
+
+    assert max_inflight == 2
+    assert concurrency.inflight == 0
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+from introspect.database import GenerationCache
+from introspect.client import ClientMetrics, TestClient as CreateTestClient
+from introspect.client._metrics import Histogram
+
+def test_metrics_histogram():
+    histogram = Histogram((1, 2, 4, 8))
+    assert histogram.snapshot()['p50'] is None
+
+    for value in [0.5, 1.5, 1.5, 3, 10]:
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 5
+    assert snapshot['sum'] == pytest.approx(16.5)
+    assert snapshot['min'] == 0.5
+    assert snapshot['max'] == 10
+    assert snapshot['p50'] == 2
+    assert snapshot['p90'] == 10
+
+def test_metrics_from_snapshots():
+    metrics_a, metrics_b = ClientMetrics(), ClientMetrics()
+    metrics_a.requests, metrics_b.requests = 2, 3
+    for value in [0.5, 1.5]:
+        metrics_a.latency.observe(value)
+    for value in [3, 10]:
+        metrics_b.latency.observe(value)
+
+    # snapshots are stored as JSON, such as in the results of each shard
+    snapshots = [json.loads(json.dumps(metrics.snapshot())) for metrics in [metrics_a, metrics_b, ClientMetrics()]]
+    snapshot = ClientMetrics.from_snapshots(snapshots).snapshot()
+    assert snapshot['requests'] == 5
+    assert snapshot['tokens_per_sec']['count'] == 0
+
+    # the same as a single client that observed all values
+    expected = ClientMetrics()
+    for value in [0.5, 1.5, 3, 10]:
+        expected.latency.observe(value)
+    assert snapshot['latency'] == expected.latency.snapshot()
+
+@pytest.mark.asyncio
+async def test_metrics_client():
+    async def response(prompt):
+        await asyncio.sleep(0.01)
+        return 'RESPONSE'
+
+    async with GenerationCache(':memory:') as cache:
+        client = CreateTestClient(response, cache=cache)
+        await asyncio.gather(
+            client.generate('PROMPT A', {}),
+            client.generate('PROMPT A', {})
+        )
+        await client.generate('PROMPT A', {})
+
+        snapshot = client.metrics.snapshot()
+        assert snapshot['requests'] == 3
+        assert snapshot['coalesced'] == 1
+        assert snapshot['cache_hits'] == 1
+        assert snapshot['cache_misses'] == 1
+        assert snapshot['cache_hit_ratio'] == 0.5
+        assert snapshot['generated'] == 1
+        assert snapshot['inflight'] == 0
+        assert snapshot['cache_lookup']['count'] == 2
+        assert snapshot['latency']['count'] == 1
+        assert snapshot['latency']['min'] >= 0.01
+
+        # the snapshot is used in the analysis results
+        json.dumps(snapshot)
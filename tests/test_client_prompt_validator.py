@@ -0,0 +1,68 @@
+from pytest_httpserver import HTTPServer
+import pytest
+
+from introspect.database import GenerationCache
+from introspect.types import OfflineError
+from introspect.client import PromptValidator, PromptTooLongError, TGIClient, OfflineClient, TestClient as CreateTestClient
+
+def _count_words(calls: list[str]):
+    def count_tokens(prompt: str) -> int:
+        calls.append(prompt)
+        return len(prompt.split())
+    return count_tokens
+
+def test_prompt_validator_count_cache():
+    calls: list[str] = []
+    validator = PromptValidator(_count_words(calls))
+
+    assert validator.count_tokens('A B C') == 3
+    assert validator.count_tokens('A B C') == 3
+    assert calls == ['A B C']
+
+def test_prompt_validator_limits():
+    validator = PromptValidator(_count_words([]), max_input_length=4, max_total_tokens=10)
+
+    assert validator.validate('A B C D', { 'max_new_tokens': 6 }) == { 'max_new_tokens': 6 }
+    with pytest.raises(PromptTooLongError):
+        validator.validate('A B C D E', { 'max_new_tokens': 1 })
+    with pytest.raises(PromptTooLongError):
+        validator.validate('A B C D', { 'max_new_tokens': 7 })
+
+    validator = PromptValidator(_count_words([]), max_input_length=4, max_total_tokens=10, truncate=True)
+    assert validator.validate('A B C D', { 'max_new_tokens': 7 }) == { 'max_new_tokens': 7, 'truncate': 3 }
+
+@pytest.mark.asyncio
+async def test_prompt_validator_client():
+    validator = PromptValidator(_count_words([]), max_input_length=3)
+
+    async with GenerationCache(':memory:') as cache:
+        client = CreateTestClient({ 'A B C': 'SHORT', 'A B C D': 'LONG' }, cache=cache, validator=validator)
+
+        assert (await client.generate('A B C', {}))['response'] == 'SHORT'
+        assert client.estimate_tokens('A B C', client.config_with_defaults({})) == 3 + 20
+
+        # over-length prompts are not sent to the server
+        with pytest.raises(PromptTooLongError):
+            await client.generate('A B C D', {})
+        assert list(client.prompt_record) == ['A B C']
+        assert client.metrics.errors == 1
+
+        # the error is cached, such that it is relayed without a server
+        offline_client = OfflineClient('', cache=cache)
+        with pytest.raises(OfflineError) as error:
+            await offline_client.generate('A B C D', {})
+        assert isinstance(error.value.__cause__, PromptTooLongError)
+
+@pytest.mark.asyncio
+async def test_prompt_validator_from_tgi_info(httpserver: HTTPServer):
+    httpserver.expect_request("/health").respond_with_data('')
+    httpserver.expect_request("/info").respond_with_json({
+        'max_input_length': 1024,
+        'max_total_tokens': 2048
+    })
+
+    validator = PromptValidator(_count_words([]))
+    async with TGIClient(httpserver.url_for(""), validator=validator) as client:
+        await client.connect()
+        assert validator.max_input_length == 1024
+        assert validator.max_total_tokens == 2048
@@ -0,0 +1,66 @@
+import asyncio
+
+from pytest_httpserver import HTTPServer
+import pytest
+
+from introspect.client import TokenBudget, TGIClient
+
+@pytest.mark.asyncio
+async def test_token_budget_admits_cheapest_first():
+    budget = TokenBudget(max_tokens=100)
+    admitted: list[int] = []
+
+    async def request(cost):
+        await budget.acquire(cost)
+        admitted.append(cost)
+
+    await budget.acquire(90)
+    waiting = [asyncio.create_task(request(cost)) for cost in [80, 20, 50]]
+    await asyncio.sleep(0)
+    assert admitted == []
+    assert budget.num_waiting == 3
+
+    # 20 and 50 fit in the budget, 80 must wait for them to complete
+    budget.release(90)
+    await asyncio.sleep(0)
+    assert admitted == [20, 50]
+    assert budget.used_tokens == 70
+
+    budget.release(20)
+    budget.release(50)
+    await asyncio.gather(*waiting)
+    assert admitted == [20, 50, 80]
+    assert budget.used_tokens == 80
+
+@pytest.mark.asyncio
+async def test_token_budget_oversized_request():
+    budget = TokenBudget(max_tokens=100)
+    await asyncio.wait_for(budget.acquire(200), timeout=1)
+    assert budget.used_tokens == 200
+
+@pytest.mark.asyncio
+async def test_token_budget_cancel_waiting():
+    budget = TokenBudget(max_tokens=100)
+    await budget.acquire(100)
+    waiting = asyncio.create_task(budget.acquire(10))
+    await asyncio.sleep(0)
+
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+
+    budget.release(100)
+    assert budget.used_tokens == 0
+    assert budget.num_waiting == 0
+
+@pytest.mark.asyncio
+async def test_token_budget_from_tgi_info(httpserver: HTTPServer):
+    httpserver.expect_request("/health").respond_with_data('')
+    httpserver.expect_request("/info").respond_with_json({
+        'max_batch_total_tokens': 49152
+    })
+
+    budget = TokenBudget()
+    async with TGIClient(httpserver.url_for(""), token_budget=budget) as client:
+        await client.connect()
+        assert budget.max_tokens == 49152
@@ -1,8 +1,10 @@
 
+import sqlite3
+
 import pytest
 
 from introspect.database import GenerationCache
-from introspect.types import GenerateResponse
+from introspect.types import GenerateResponse, GenerateConfig, GenerateError
 
 @pytest.mark.asyncio
 async def test_database_cache():
@@ -10,15 +12,218 @@ async def test_database_cache():
         'response': 'LLM response',
         'duration': 1
     }
+    config: GenerateConfig = { 'temperature': 0.1, 'seed': 0 }
 
     async with GenerationCache(':memory:') as db:
-        assert not (await db.has('USER MESSAGE'))
-        assert not (await db.has('ANOTHER USER MESSAGE'))
+        assert not (await db.has('USER MESSAGE', config))
+        assert not (await db.has('ANOTHER USER MESSAGE', config))
 
         # add response and check it exists
-        await db.put('USER MESSAGE', obs)
-        assert await db.has('USER MESSAGE')
-        assert await db.get('USER MESSAGE') == obs
+        await db.put('USER MESSAGE', config, obs)
+        assert await db.has('USER MESSAGE', config)
+        assert await db.get('USER MESSAGE', config) == obs
 
         # other responses are still missing
-        assert not (await db.has('ANOTHER USER MESSAGE'))
+        assert not (await db.has('ANOTHER USER MESSAGE', config))
+
+@pytest.mark.asyncio
+async def test_database_cache_config_aware():
+    obs: GenerateResponse = {
+        'response': 'LLM response',
+        'duration': 1
+    }
+
+    async with GenerationCache(':memory:') as db:
+        await db.put('USER MESSAGE', { 'temperature': 1, 'seed': 0 }, obs)
+
+        # the config is normalized
+        assert await db.get('USER MESSAGE', { 'seed': 0, 'temperature': 1.0 }) == obs
+
+        # a different config is a different entry
+        assert await db.get('USER MESSAGE', { 'temperature': 1, 'seed': 1 }) is None
+        assert await db.get('USER MESSAGE', { 'temperature': 1 }) is None
+
+    # a different model is a different entry
+    async with GenerationCache(':memory:', model_id='model-a') as db:
+        await db.put('USER MESSAGE', {}, obs)
+        assert await db.get('USER MESSAGE', {}) == obs
+
+        db._model_id = 'model-b'
+        assert await db.get('USER MESSAGE', {}) is None
+
+def _make_legacy_cache(filepath):
+    with sqlite3.connect(filepath) as con:
+        con.execute('''
+            CREATE TABLE Cache (
+                prompt TEXT NOT NULL PRIMARY KEY,
+                response TEXT,
+                duration REAL,
+                error BLOB,
+                traceback TEXT
+            ) STRICT, WITHOUT ROWID
+        ''')
+        con.execute(
+            'INSERT INTO Cache(prompt, response, duration) VALUES (?, ?, ?)',
+            ('USER MESSAGE', 'LLM response', 1)
+        )
+    con.close()
+
+@pytest.mark.asyncio
+async def test_database_cache_migrate_legacy(tmp_path):
+    _make_legacy_cache(tmp_path / 'legacy.sqlite')
+
+    async with GenerationCache('legacy', cache_dir=tmp_path) as db:
+        assert [(prompt, config) async for prompt, config, _ in db] == [('USER MESSAGE', None)]
+
+        # the legacy entry is adopted by the first config
+        assert await db.get('USER MESSAGE', { 'seed': 0 }) == { 'response': 'LLM response', 'duration': 1 }
+        assert [(prompt, config) async for prompt, config, _ in db] == [('USER MESSAGE', { 'seed': 0 })]
+        assert await db.get('USER MESSAGE', { 'seed': 1 }) is None
+
+    # the migration only happens once
+    async with GenerationCache('legacy', cache_dir=tmp_path) as db:
+        assert await db.get('USER MESSAGE', { 'seed': 0 }) == { 'response': 'LLM response', 'duration': 1 }
+
+@pytest.mark.asyncio
+async def test_database_cache_migrate_legacy_batch(tmp_path):
+    _make_legacy_cache(tmp_path / 'legacy.sqlite')
+
+    async with GenerationCache('legacy', cache_dir=tmp_path) as db:
+        # every config in the batch gets the legacy entry
+        answers = await db.get_many([
+            ('USER MESSAGE', { 'seed': 0 }),
+            ('USER MESSAGE', { 'seed': 1 }),
+            ('USER MESSAGE', { 'seed': 0 })
+        ])
+        assert answers == [{ 'response': 'LLM response', 'duration': 1 }] * 3
+        assert sorted([config['seed'] async for _, config, _ in db]) == [0, 1] # type: ignore
+
+@pytest.mark.asyncio
+async def test_database_cache_compressed_storage():
+    prompt = 'What is the sentiment of the following paragraph? ' * 100
+    response = 'The sentiment of the paragraph is positive. ' * 100
+
+    async with GenerationCache(':memory:') as db:
+        await db.put(prompt, {}, { 'response': response, 'duration': 1 })
+
+        cursor = await db._con.execute('SELECT length(key), length(prompt), length(response) FROM Generation')
+        key_size, prompt_size, response_size = await cursor.fetchone() # type: ignore
+        assert key_size == 16
+        assert prompt_size < len(prompt) / 5
+        assert response_size < len(response) / 5
+
+        assert await db.get(prompt, {}) == { 'response': response, 'duration': 1 }
+        assert [(p, r) async for p, _, r in db] == [(prompt, { 'response': response, 'duration': 1 })]
+
+@pytest.mark.asyncio
+async def test_database_cache_bootstrap_dependency(tmp_path):
+    obs_1: GenerateResponse = { 'response': 'LLM response 1', 'duration': 1 }
+    obs_2: GenerateResponse = { 'response': 'LLM response 2', 'duration': 2 }
+    obs_3: GenerateResponse = { 'response': 'LLM response 3', 'duration': 3 }
+
+    async with GenerationCache('dependency', cache_dir=tmp_path) as dep:
+        await dep.put('USER MESSAGE 1', {}, obs_1)
+        await dep.put('USER MESSAGE 2', {}, obs_2)
+
+    async with GenerationCache('main', cache_dir=tmp_path) as db:
+        await db.put('USER MESSAGE 2', {}, obs_3)
+
+    async with GenerationCache('main', cache_dir=tmp_path, deps=['dependency']) as db:
+        assert await db.get('USER MESSAGE 1', {}) == obs_1
+        # existing entries are not overwritten
+        assert await db.get('USER MESSAGE 2', {}) == obs_3
+
+        cursor = await db._con.execute('SELECT database, last_id FROM Dependency')
+        assert await cursor.fetchall() == [('dependency', 2)]
+
+    # only new entries are copied
+    async with GenerationCache('dependency', cache_dir=tmp_path) as dep:
+        await dep.put('USER MESSAGE 3', {}, obs_3)
+
+    async with GenerationCache('main', cache_dir=tmp_path, deps=['dependency']) as db:
+        assert await db.get('USER MESSAGE 3', {}) == obs_3
+
+        cursor = await db._con.execute('SELECT database, last_id FROM Dependency')
+        assert await cursor.fetchall() == [('dependency', 3)]
+
+@pytest.mark.asyncio
+async def test_database_cache_bootstrap_dependency_changed(tmp_path):
+    obs_1: GenerateResponse = { 'response': 'LLM response 1', 'duration': 1 }
+    obs_2: GenerateResponse = { 'response': 'LLM response 2', 'duration': 2 }
+
+    async with GenerationCache('dependency', cache_dir=tmp_path) as dep:
+        await dep.put('USER MESSAGE 1', {}, GenerateError('failed'))
+    async with GenerationCache('main', cache_dir=tmp_path, deps=['dependency']) as db:
+        assert isinstance(await db.get('USER MESSAGE 1', {}), GenerateError)
+
+    # a response that replaces an error is copied
+    async with GenerationCache('dependency', cache_dir=tmp_path) as dep:
+        await dep.put('USER MESSAGE 1', {}, obs_1)
+    async with GenerationCache('main', cache_dir=tmp_path, deps=['dependency']) as db:
+        assert await db.get('USER MESSAGE 1', {}) == obs_1
+
+    # a recreated dependency is copied entirely, even if it has more rows than before
+    GenerationCache('dependency', cache_dir=tmp_path).remove()
+    async with GenerationCache('dependency', cache_dir=tmp_path) as dep:
+        await dep.put_many([(f'USER MESSAGE {i}', {}, obs_2) for i in range(2, 6)])
+    async with GenerationCache('main', cache_dir=tmp_path, deps=['dependency']) as db:
+        assert await db.get('USER MESSAGE 2', {}) == obs_2
+
+@pytest.mark.asyncio
+async def test_database_cache_memory():
+    obs_1: GenerateResponse = { 'response': 'LLM response 1', 'duration': 1 }
+    obs_2: GenerateResponse = { 'response': 'LLM response 2', 'duration': 2 }
+    obs_3: GenerateResponse = { 'response': 'LLM response 3', 'duration': 3 }
+
+    async with GenerationCache(':memory:', memory_max_entries=2) as db:
+        assert db.memory is not None
+        await db.put('USER MESSAGE 1', {}, obs_1)
+        await db.put('USER MESSAGE 2', {}, obs_2)
+
+        # entries are served from memory, even if the database changes
+        await db._con.execute('DELETE FROM Generation')
+        assert await db.get('USER MESSAGE 1', {}) == obs_1
+        assert await db.get('USER MESSAGE 2', {}) == obs_2
+        assert (db.memory.hits, db.memory.misses, db.memory.evictions) == (2, 0, 0)
+
+        # the least recently used entry is evicted
+        await db.put('USER MESSAGE 3', {}, obs_3)
+        assert await db.get('USER MESSAGE 1', {}) is None
+        assert await db.get('USER MESSAGE 3', {}) == obs_3
+        assert (db.memory.hits, db.memory.misses, db.memory.evictions) == (3, 1, 1)
+        assert db.memory.num_entries == 2
+
+@pytest.mark.asyncio
+async def test_database_cache_memory_max_bytes():
+    async with GenerationCache(':memory:', memory_max_bytes=1000) as db:
+        assert db.memory is not None
+        for i in range(10):
+            await db.put(f'USER MESSAGE {i}', {}, { 'response': 'x' * 100, 'duration': 1 })
+
+        assert db.memory.num_bytes <= 1000
+        assert db.memory.num_entries + db.memory.evictions == 10
+
+        # evicted entries are read from the database and added to memory
+        assert await db.get('USER MESSAGE 0', {}) == { 'response': 'x' * 100, 'duration': 1 }
+        assert db.memory.misses == 1
+        assert await db.get('USER MESSAGE 0', {}) == { 'response': 'x' * 100, 'duration': 1 }
+        assert db.memory.hits == 1
+
+        # updating an entry to a value that is too large for memory, removes the old value
+        await db.put('USER MESSAGE 0', {}, { 'response': 'y' * 2000, 'duration': 1 })
+        assert await db.get('USER MESSAGE 0', {}) == { 'response': 'y' * 2000, 'duration': 1 }
+
+@pytest.mark.asyncio
+async def test_database_cache_batch():
+    entries = [(f'USER MESSAGE {i}', { 'seed': i % 3 }) for i in range(1000)]
+
+    async with GenerationCache(':memory:') as db:
+        await db.put_many([
+            (prompt, config, { 'response': f'LLM response {i}', 'duration': i })
+            for i, (prompt, config) in enumerate(entries)
+        ])
+
+        assert await db.has_many([entries[0], ('MISSING', {}), entries[-1]]) == [True, False, True]
+        answers = await db.get_many([*entries, ('MISSING', {})])
+        assert answers[:-1] == [{ 'response': f'LLM response {i}', 'duration': i } for i in range(1000)]
+        assert answers[-1] is None
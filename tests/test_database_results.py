@@ -1,7 +1,9 @@
 
-import pytest
+import asyncio
 from traceback import format_exception
 
+import pytest
+
 from introspect.database import Answerable
 from introspect.types import IntrospectResult, DatasetSplits, GenerateError, OfflineError
 
@@ -66,3 +68,122 @@ async def test_database_error_storage():
         await db.put(DatasetSplits.TRAIN, 2, obs_offline_error)
         db_item = await db.get(DatasetSplits.TRAIN, 2)
         assert db_item is None
+
+@pytest.mark.asyncio
+async def test_database_batch_put_get():
+    def make_obs(idx: int) -> IntrospectResult:
+        return {
+            'debug': f'content {idx}',
+            'predict_prompt': 'What is the sentiment?',
+            'predict_answer': 'positive',
+            'predict': 'positive',
+            'correct': idx % 2 == 0,
+            'ability_prompt': 'Are you able to determine the sentiment?',
+            'ability_answer': 'yes',
+            'ability': 'yes',
+            'introspect': True,
+            'duration': idx,
+            'label': 'positive'
+        }
+
+    async with Answerable(':memory:') as db:
+        await db.put_many(DatasetSplits.TRAIN, [(idx, make_obs(idx)) for idx in range(1000)])
+        await db.put(DatasetSplits.VALID, 1, GenerateError('generate error'))
+
+        assert await db.has_many(DatasetSplits.TRAIN, [0, 999, 1000]) == [True, True, False]
+        assert await db.has_many(DatasetSplits.VALID, [0, 1]) == [False, True]
+
+        results = await db.get_many(DatasetSplits.TRAIN, list(range(1001)))
+        assert results[:1000] == [make_obs(idx) for idx in range(1000)]
+        assert results[1000] is None
+
+        error, = await db.get_many(DatasetSplits.VALID, [1])
+        assert isinstance(error, GenerateError)
+
+@pytest.mark.asyncio
+async def test_database_concurrent_put_is_batched():
+    obs: IntrospectResult = {
+        'debug': 'content',
+        'predict_prompt': 'What is the sentiment?',
+        'predict_answer': 'positive',
+        'predict': 'positive',
+        'correct': False,
+        'ability_prompt': 'Are you able to determine the sentiment?',
+        'ability_answer': 'yes',
+        'ability': 'yes',
+        'introspect': True,
+        'duration': 10,
+        'label': 'positive'
+    }
+
+    async with Answerable(':memory:') as db:
+        executemany_calls = []
+        executemany = db._con.executemany
+        async def spy_executemany(sql, parameters):
+            executemany_calls.append(len(parameters))
+            return await executemany(sql, parameters)
+        db._con.executemany = spy_executemany # type: ignore
+
+        await asyncio.gather(*(db.put(DatasetSplits.TRAIN, idx, obs) for idx in range(50)))
+        assert executemany_calls == [50]
+        assert all(await db.has_many(DatasetSplits.TRAIN, list(range(50))))
+
+@pytest.mark.asyncio
+async def test_database_commit_waits_for_running_batch():
+    obs: IntrospectResult = {
+        'debug': 'content',
+        'predict_prompt': 'What is the sentiment?',
+        'predict_answer': 'positive',
+        'predict': 'positive',
+        'correct': False,
+        'ability_prompt': 'Are you able to determine the sentiment?',
+        'ability_answer': 'yes',
+        'ability': 'yes',
+        'introspect': True,
+        'duration': 10,
+        'label': 'positive'
+    }
+
+    async with Answerable(':memory:') as db:
+        executemany = db._con.executemany
+        async def slow_executemany(sql, parameters):
+            await asyncio.sleep(0.05)
+            return await executemany(sql, parameters)
+        db._con.executemany = slow_executemany # type: ignore
+
+        put = asyncio.create_task(db.put(DatasetSplits.TRAIN, 0, obs))
+        # let the batch start executing
+        await asyncio.sleep(0.01)
+        assert db._write_task is None
+        await db.commit()
+        assert put.done()
+        assert await db.has(DatasetSplits.TRAIN, 0)
+
+@pytest.mark.asyncio
+async def test_database_items():
+    obs: IntrospectResult = {
+        'debug': 'content',
+        'predict_prompt': 'What is the sentiment?',
+        'predict_answer': 'positive',
+        'predict': 'positive',
+        'correct': False,
+        'ability_prompt': 'Are you able to determine the sentiment?',
+        'ability_answer': 'yes',
+        'ability': 'yes',
+        'introspect': True,
+        'duration': 10,
+        'label': 'positive'
+    }
+
+    async with Answerable(':memory:') as db:
+        await db.put(DatasetSplits.TRAIN, 1, obs)
+        await db.put(DatasetSplits.TRAIN, 2, GenerateError('generate error'))
+        await db.put(DatasetSplits.VALID, 3, obs)
+
+        items = sorted([item async for item in db.items(DatasetSplits.TRAIN)], key=lambda item: item[0])
+        assert len(items) == 2
+        assert items[0] == (1, obs)
+        assert items[1][0] == 2 and isinstance(items[1][1], GenerateError)
+
+        assert [item async for item in db.items(DatasetSplits.VALID)] == [(3, obs)]
+        assert [item async for item in db.items(DatasetSplits.TEST)] == []
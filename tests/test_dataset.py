@@ -2,6 +2,7 @@
 import pathlib
 from dataclasses import dataclass
 
+import datasets as hf_datasets
 import pytest
 
 from introspect.dataset import datasets, SentimentDataset, MultiChoiceDataset, EntailmentDataset
@@ -80,3 +81,78 @@ def test_dataset_entailment(info):
     for example in dataset.train():
         assert example.keys() == { 'hypothesis', 'paragraph', 'label', 'idx' }
         break
+
+class MockBuilder:
+    def __init__(self) -> None:
+        self.info = hf_datasets.DatasetInfo(features=hf_datasets.Features({
+            'sentence': hf_datasets.Value('string'),
+            'label': hf_datasets.Value('int64')
+        }))
+        self.as_dataset_calls = 0
+
+    def as_dataset(self, split):
+        self.as_dataset_calls += 1
+        return tuple(
+            hf_datasets.Dataset.from_dict({
+                'sentence': [f'{name} sentence {i}' for i in range(20)],
+                'label': [i % 2 for i in range(20)]
+            }, features=self.info.features)
+            for name in split
+        )
+
+class MockSentimentDataset(SentimentDataset):
+    name = 'Mock'
+
+    _split_train = 'train'
+    _split_valid = 'valid'
+    _split_test = 'test'
+
+    def _builder(self, cache_dir):
+        return MockBuilder()
+
+    def _restructure(self, obs, idx):
+        return {
+            'text': obs['sentence'],
+            'label': 'positive' if obs['label'] else 'negative',
+            'idx': idx
+        }
+
+def test_dataset_processed_split_is_stored(tmp_path):
+    dataset = MockSentimentDataset(persistent_dir=tmp_path, seed=0)
+    train = dataset.train()
+    assert sorted(obs['idx'] for obs in train) == list(range(20))
+    assert [obs['idx'] for obs in train] != list(range(20))
+    assert dataset.train() is train
+
+    # A new instance loads the processed split from disk
+    dataset_reload = MockSentimentDataset(persistent_dir=tmp_path, seed=0)
+    train_reload = dataset_reload.train()
+    assert list(train_reload) == list(train)
+    assert dataset_reload._builder_cache.as_dataset_calls == 0
+
+    # A different seed is processed seperately
+    dataset_other_seed = MockSentimentDataset(persistent_dir=tmp_path, seed=1)
+    assert list(dataset_other_seed.train()) != list(train)
+    assert dataset_other_seed._builder_cache.as_dataset_calls == 1
+
+def test_dataset_get_by_idx(tmp_path):
+    dataset = MockSentimentDataset(persistent_dir=tmp_path, seed=0)
+
+    obs = dataset.get(DatasetSplits.VALID, 7)
+    assert obs == { 'text': 'valid sentence 7', 'label': 'positive', 'idx': 7 }
+
+    assert [obs['idx'] for obs in dataset.get_many(DatasetSplits.TEST, [3, 0, 19])] == [3, 0, 19]
+    assert dataset.get_many(DatasetSplits.TEST, []) == []
+
+    with pytest.raises(ValueError):
+        dataset.get(DatasetSplits.TRAIN, 20)
+
+def test_dataset_shard(tmp_path):
+    dataset = MockSentimentDataset(persistent_dir=tmp_path, seed=0)
+
+    shards = [list(dataset.split(DatasetSplits.TRAIN, shard=(index, 3))) for index in range(3)]
+    assert [len(shard) for shard in shards] == [7, 7, 6]
+    assert [dataset.num_examples(DatasetSplits.TRAIN, shard=(index, 3)) for index in range(3)] == [7, 7, 6]
+
+    # shards partition the shuffled split
+    assert shards[0] + shards[1] + shards[2] == list(dataset.split(DatasetSplits.TRAIN))
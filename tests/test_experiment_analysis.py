@@ -0,0 +1,27 @@
+import importlib.util
+import json
+import pathlib
+
+def _load_analysis():
+    spec = importlib.util.spec_from_file_location(
+        'analysis', pathlib.Path(__file__).parent.parent / 'experiments' / 'analysis.py')
+    analysis = importlib.util.module_from_spec(spec) # type: ignore
+    spec.loader.exec_module(analysis) # type: ignore
+    return analysis
+
+def test_args_to_json_defaults(monkeypatch):
+    # the default of --supervisor-state is read from the environment
+    monkeypatch.setenv('SUPERVISOR_STATE_FILE', '/tmp/supervisor.json')
+    analysis = _load_analysis()
+
+    args = analysis.parser.parse_args([])
+    saved = json.loads(json.dumps(analysis.args_to_json(args)))
+    assert 'persistent_dir' not in saved
+    assert saved['supervisor_state'] == '/tmp/supervisor.json'
+
+def test_args_to_json_metrics_textfile():
+    analysis = _load_analysis()
+
+    args = analysis.parser.parse_args(['--metrics-textfile', '/tmp/metrics.prom'])
+    saved = json.loads(json.dumps(analysis.args_to_json(args)))
+    assert saved['metrics_textfile'] == '/tmp/metrics.prom'
@@ -0,0 +1,116 @@
+
+import asyncio
+import http.server
+import json
+import sys
+import threading
+
+import pytest
+
+from introspect.client import TestClient as CreateTestClient
+from introspect.client._circuit_breaker import CircuitBreaker
+from introspect.supervisor import Supervisor, parse_prometheus_text, read_supervisor_state
+
+def test_parse_prometheus_text():
+    metrics = parse_prometheus_text('\n'.join([
+        '# HELP tgi_queue_size Queue size',
+        '# TYPE tgi_queue_size gauge',
+        'tgi_queue_size 3',
+        'tgi_request_failure{err="validation"} 2',
+        'tgi_request_failure{err="generation",x="a b"} 1 1700000000',
+        ''
+    ]))
+    assert metrics == {'tgi_queue_size': 3, 'tgi_request_failure': 3}
+
+def test_supervisor_restarts_crashed_command(tmp_path):
+    state_file = tmp_path / 'state.json'
+    supervisor = Supervisor([sys.executable, '-c', 'import sys; sys.exit(3)'], 'http://127.0.0.1:1',
+                            state_file=str(state_file), max_restarts=2,
+                            poll_interval_sec=0.01, min_backoff_sec=0.001)
+    assert supervisor.run() == 1
+    assert supervisor.restarts == 2
+
+    state = read_supervisor_state(state_file)
+    assert state is not None
+    assert state['state'] == 'failed'
+    assert state['reason'] == 'the command exited with code 3'
+
+def _serve_tgi(metrics: str) -> http.server.HTTPServer:
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.encode('utf-8') if self.path == '/metrics' else b''
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_supervisor_detects_hang(tmp_path):
+    server = _serve_tgi('tgi_request_success 10\ntgi_queue_size 4\n')
+    try:
+        supervisor = Supervisor([sys.executable, '-c', 'import time; time.sleep(60)'],
+                                f'http://127.0.0.1:{server.server_port}',
+                                state_file=str(tmp_path / 'state.json'), max_restarts=0,
+                                poll_interval_sec=0.01, hang_timeout_sec=0.1, kill_timeout_sec=5)
+        assert supervisor.run() == 1
+    finally:
+        server.shutdown()
+
+    state = read_supervisor_state(tmp_path / 'state.json')
+    assert state is not None
+    assert state['state'] == 'failed'
+    assert state['reason'].startswith('no requests completed')
+
+def test_supervisor_stop(tmp_path):
+    server = _serve_tgi('')
+    try:
+        supervisor = Supervisor([sys.executable, '-c', 'import time; time.sleep(60)'],
+                                f'http://127.0.0.1:{server.server_port}',
+                                state_file=str(tmp_path / 'state.json'), poll_interval_sec=0.01)
+        threading.Timer(0.5, supervisor.stop).start()
+        assert supervisor.run() == 0
+    finally:
+        server.shutdown()
+
+    assert supervisor.restarts == 0
+    assert read_supervisor_state(tmp_path / 'state.json')['state'] == 'stopped'
+
+def _write_state(client, filepath, state):
+    with open(filepath, 'w') as fp:
+        json.dump({'state': state}, fp)
+    # invalidate the throttled read of the state file
+    client._supervisor_checked_at = None
+
+@pytest.mark.asyncio
+async def test_client_pauses_while_restarting(tmp_path):
+    state_file = tmp_path / 'state.json'
+    async with CreateTestClient({'a': 'A'}, supervisor_state=state_file) as client:
+        # a planned restart does not count as a lost connection
+        client._breaker = CircuitBreaker(client._probe, min_backoff_sec=0.001, max_backoff_sec=0.001, max_opens=0)
+        _write_state(client, state_file, 'restarting')
+
+        request = asyncio.create_task(client.generate('a', {}))
+        await asyncio.sleep(0.05)
+        assert not request.done()
+        assert client._breaker.state == 'open'
+        assert client.metrics.generated == 0
+
+        _write_state(client, state_file, 'ready')
+        assert (await request)['response'] == 'A'
+        assert client.metrics.reconnects == 1
+        assert client.metrics.retries == 0
+        assert client._breaker.opens == 0
+
+@pytest.mark.asyncio
+async def test_client_fails_when_supervisor_failed(tmp_path):
+    state_file = tmp_path / 'state.json'
+    async with CreateTestClient({'a': 'A'}, supervisor_state=state_file) as client:
+        _write_state(client, state_file, 'failed')
+        with pytest.raises(IOError):
+            await client.generate('a', {})
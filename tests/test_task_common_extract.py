@@ -1,5 +1,5 @@
 
-from introspect.tasks._common_extract import extract_list_content, extract_ability, extract_paragraph
+from introspect.tasks._common_extract import extract_list_content, extract_ability, is_ability_definitive, extract_paragraph
 
 def test_task_extract_ability():
     c = extract_ability
@@ -20,6 +20,20 @@ def test_task_extract_ability():
     assert c('positive') == None
     assert c('negative') == None
 
+def test_task_is_ability_definitive():
+    c = is_ability_definitive
+
+    # the answer may still become yes or no
+    assert c('') == False
+    assert c(' Y') == False
+    assert c('Yes') == False
+    assert c('No.') == False
+
+    # no continuation can be extracted
+    assert c('Yes,') == True
+    assert c('No. The') == True
+    assert c('The sentiment') == True
+
 def test_task_extract_paragraph():
     c = extract_paragraph
 
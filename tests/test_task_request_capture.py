@@ -2,7 +2,7 @@
 import pytest
 import asyncio
 
-from introspect.client import OfflineClient
+from introspect.client import OfflineClient, TestClient as CreateTestClient
 from introspect.database import GenerationCache
 from introspect.types import GenerateResponse, SystemMessage, OfflineError
 from introspect.model import FalconModel
@@ -20,13 +20,14 @@ async def test_request_capture_duration_accumulate():
     }
 
     async with GenerationCache(':memory:') as cache:
-        await cache.put('User: USER MESSAGE 1.\nFalcon:', obs_1)
-        await cache.put('User: USER MESSAGE 2.\nFalcon:', obs_2)
-
         client = OfflineClient(cache=cache)
         model = FalconModel(client, system_message=SystemMessage.NONE)
         capture = RequestCapture(model)
 
+        config = client.config_with_defaults(model.config)
+        await cache.put('User: USER MESSAGE 1.\nFalcon:', config, obs_1)
+        await cache.put('User: USER MESSAGE 2.\nFalcon:', config, obs_2)
+
         answer_1, answer_2 = await asyncio.gather(
             capture([{ 'user': 'USER MESSAGE 1.', 'assistant': None}]),
             capture([{ 'user': 'USER MESSAGE 2.', 'assistant': None}])
@@ -35,3 +36,41 @@ async def test_request_capture_duration_accumulate():
         assert answer_1 == 'LLM response 1'
         assert answer_2 == 'LLM response 2'
         assert capture.duration == 3
+
+@pytest.mark.asyncio
+async def test_request_capture_step_runs_concurrently():
+    explain_started = asyncio.Event()
+
+    async def response(prompt):
+        if 'PREDICT' in prompt:
+            # only completes if the explanation is requested while the prediction is running
+            await asyncio.wait_for(explain_started.wait(), 1)
+        else:
+            explain_started.set()
+        return prompt
+
+    client = CreateTestClient(response)
+    capture = RequestCapture(FalconModel(client, system_message=SystemMessage.NONE))
+
+    predict_step = capture.step(capture([{ 'user': 'PREDICT', 'assistant': None}]))
+    explain_answer = await capture([{ 'user': 'EXPLAIN', 'assistant': None}])
+    predict_answer = await predict_step
+    await capture.close()
+
+    assert 'EXPLAIN' in explain_answer
+    assert 'PREDICT' in predict_answer
+
+@pytest.mark.asyncio
+async def test_request_capture_close_cancels_steps():
+    async def response(prompt):
+        await asyncio.sleep(0.05)
+        return prompt
+
+    capture = RequestCapture(FalconModel(CreateTestClient(response), system_message=SystemMessage.NONE))
+    predict_step = capture.step(capture([{ 'user': 'PREDICT', 'assistant': None}]))
+    await asyncio.sleep(0)
+    await capture.close()
+    assert predict_step.cancelled()
+
+    # the generation itself is shielded by the client, let it complete
+    await asyncio.sleep(0.1)
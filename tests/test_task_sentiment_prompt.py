@@ -203,4 +203,5 @@ async def test_task_sentiment_config(sentiment_obs: SentimentObservation, info:
         config=info.config
     )
     await task(sentiment_obs)
-    assert list(client.prompt_record) == list(info.expected_requests.keys())
+    # independent requests are sent concurrently, so the order of the record is not deterministic
+    assert sorted(client.prompt_record) == sorted(info.expected_requests.keys())
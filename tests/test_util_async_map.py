@@ -109,3 +109,133 @@ async def test_async_map_exception_group():
             pass
 
     assert started == {1, 2, 3}
+
+
+@pytest.mark.asyncio
+async def test_async_map_completion_order():
+    async def worker(job_id):
+        await asyncio.sleep(0.01 * (3 - job_id))
+        return job_id
+
+    results = [job_id async for job_id in AsyncMap(worker, [0, 1, 2], max_tasks=3)]
+    assert results == [2, 1, 0]
+
+    results = [job_id async for job_id in AsyncMap(worker, range(3), max_tasks=1)]
+    assert results == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_async_map_ordered():
+    started: list[int] = []
+
+    async def worker(job_id):
+        started.append(job_id)
+        await asyncio.sleep(0.02 if job_id == 0 else 0.001)
+        return job_id
+
+    results = [job_id async for job_id in AsyncMap(worker, range(10), max_tasks=2, ordered=True, reorder_buffer=3)]
+    assert results == list(range(10))
+
+    # while job 0 is running, the other worker completes jobs until the reorder buffer is full
+    assert started[:5] == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_async_map_ordered_error():
+    class CustomError(Exception):
+        pass
+
+    async def worker(job_id):
+        await asyncio.sleep(0.01 * (3 - job_id))
+        if job_id == 2:
+            raise CustomError('custom error')
+        return job_id
+
+    with pytest.raises(CustomError):
+        async for _ in AsyncMap(worker, [0, 1, 2], max_tasks=3, ordered=True):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_async_map_priority():
+    async def worker(job_id):
+        return job_id
+
+    results = [job_id async for job_id in AsyncMap(worker, [3, 1, 2, 0], max_tasks=1, priority=lambda job: job)]
+    assert results == [0, 1, 2, 3]
+
+    results = [job_id async for job_id in AsyncMap(worker, [3, 1, 2, 0], max_tasks=1,
+                                                     priority=lambda job: job, priority_window=2)]
+    assert results == [1, 2, 0, 3]
+
+    with pytest.raises(ValueError):
+        AsyncMap(worker, [], ordered=True, priority=lambda job: job)
+
+
+@pytest.mark.asyncio
+async def test_async_map_async_iterable_backpressure():
+    produced: list[int] = []
+
+    async def producer():
+        for job_id in range(10):
+            await asyncio.sleep(0)
+            produced.append(job_id)
+            yield job_id
+
+    async def worker(job_id):
+        await asyncio.sleep(0.01)
+        return job_id
+
+    iterator = aiter(AsyncMap(worker, producer(), max_tasks=2, prefetch=3))
+    await asyncio.sleep(0.05)
+    # two jobs are taken by the workers, three are waiting in the prefetch buffer,
+    # and one is waiting for room in the prefetch buffer
+    assert len(produced) == 6
+
+    results = [job_id async for job_id in iterator]
+    assert sorted(results) == list(range(10))
+
+    results = [job_id async for job_id in AsyncMap(worker, producer(), max_tasks=3, ordered=True)]
+    assert results == list(range(10))
+
+
+@pytest.mark.asyncio
+async def test_async_map_async_iterable_error():
+    class CustomError(Exception):
+        pass
+
+    async def producer():
+        yield 1
+        raise CustomError('custom error')
+
+    async def worker(job_id):
+        await asyncio.sleep(0.01)
+        return job_id
+
+    with pytest.raises(CustomError):
+        async for _ in AsyncMap(worker, producer(), max_tasks=2):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_async_map_return_exceptions_and_timeout():
+    class CustomError(Exception):
+        pass
+
+    async def worker(job_id):
+        if job_id == 1:
+            raise CustomError('custom error')
+        if job_id == 2:
+            await asyncio.sleep(1)
+        return job_id
+
+    results = [result async for result in AsyncMap(worker, [0, 1, 2, 3], max_tasks=4, ordered=True,
+                                                     timeout=0.05, return_exceptions=True)]
+    assert results[0] == 0
+    assert isinstance(results[1], CustomError)
+    assert isinstance(results[2], TimeoutError)
+    assert results[3] == 3
+
+    with pytest.raises(TimeoutError):
+        async for _ in AsyncMap(worker, [2], timeout=0.05):
+            pass
@@ -0,0 +1,56 @@
+import aiohttp
+import pytest
+
+from introspect.client import TestClient as CreateTestClient
+from introspect.tasks._aggregator import ClassifyAggregator
+from introspect.types import GenerateError
+from introspect.util import MetricsExporter
+
+def _make_aggregator():
+    aggregator = ClassifyAggregator()
+    aggregator.add_answer({ 'label': 'positive', 'predict': 'positive', 'correct': True, 'duration': 1 }) # type: ignore
+    aggregator.add_answer({ 'label': 'negative', 'predict': None, 'correct': None, 'duration': 1 }) # type: ignore
+    aggregator.add_answer(GenerateError('failed'))
+    return aggregator
+
+@pytest.mark.asyncio
+async def test_metrics_exporter_render():
+    client = CreateTestClient()
+    await client.generate('PROMPT', {})
+
+    exporter = MetricsExporter(client, {'analysis_"x"': _make_aggregator()}, labels={'run': 'r'})
+    content = exporter.render()
+
+    assert 'introspect_observations_total{run="r",experiment="analysis_\\"x\\""} 3\n' in content
+    assert 'introspect_results{run="r",experiment="analysis_\\"x\\"",result="missmatch"} 1\n' in content
+    assert 'introspect_results{run="r",experiment="analysis_\\"x\\"",result="error"} 1\n' in content
+    assert 'introspect_client_generated_total{run="r"} 1\n' in content
+    assert 'introspect_client_latency_seconds_bucket{run="r",le="+Inf"} 1\n' in content
+
+def test_metrics_exporter_render_variants():
+    aggregator = ClassifyAggregator()
+    aggregator.add_answer({ 'label': 'positive', 'predict': 'positive', 'correct': True, 'duration': 1 }) # type: ignore
+
+    exporter = MetricsExporter(CreateTestClient(), {'a': _make_aggregator(), 'b': aggregator})
+    content = exporter.render()
+
+    assert 'introspect_observations_total{experiment="a"} 3\n' in content
+    assert 'introspect_observations_total{experiment="b"} 1\n' in content
+    assert 'introspect_results{experiment="b",result="error"} 0\n' in content
+
+@pytest.mark.asyncio
+async def test_metrics_exporter_textfile(tmp_path):
+    textfile = tmp_path / 'introspect.prom'
+    async with MetricsExporter(CreateTestClient(), {'a': _make_aggregator()}, textfile=textfile):
+        pass
+
+    assert 'introspect_observations_total{experiment="a"} 3\n' in textfile.read_text()
+    assert list(tmp_path.iterdir()) == [textfile]
+
+@pytest.mark.asyncio
+async def test_metrics_exporter_http(unused_tcp_port):
+    async with MetricsExporter(CreateTestClient(), {'a': _make_aggregator()}, port=unused_tcp_port):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'http://127.0.0.1:{unused_tcp_port}/metrics') as response:
+                assert response.status == 200
+                assert 'introspect_observations_total{experiment="a"} 3\n' in await response.text()
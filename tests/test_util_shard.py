@@ -0,0 +1,17 @@
+import argparse
+
+import pytest
+
+from introspect.util import parse_shard, generate_experiment_id
+
+def test_parse_shard():
+    assert parse_shard('0/4') == (0, 4)
+    assert parse_shard('3/4') == (3, 4)
+
+    for invalid in ['4/4', '-1/4', '0/0', '1', 'a/b', '']:
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(invalid)
+
+def test_experiment_id_shard():
+    assert generate_experiment_id('analysis', seed=0) == 'analysis_s-0'
+    assert generate_experiment_id('analysis', seed=0, shard=(1, 4)) == 'analysis_s-0_h-1of4'